@@ -0,0 +1,413 @@
+"""
+API HTTP/JSON local do SmartCommerce, sobre a mesma camada de serviços do app.
+
+Uso:
+    python api.py --porta 8502
+
+Rotas:
+    GET  /produtos
+    GET  /produtos/busca           ?q=&limite=  (nome, marca, SKU ou código de barras)
+    GET  /produtos/<id>
+    POST /produtos                 {"nome", "marca", "quantidade", "preco_custo", "preco_venda", "sku"}
+    POST /estoque/entradas         {"produto_id", "quantidade", "preco_custo"}
+    GET  /estoque/posicao          ?data=AAAA-MM-DD&produto_id=  (sem produto_id: inventário inteiro)
+    POST /vendas                   {"itens": [{"produto_id", "quantidade", "valor_total"?}]}
+    GET  /vendas                   ?tamanho=&apos_data=&apos_id=&produto_id=&inicio=&fim=
+    GET  /vendas/<id>
+    POST /vendas/<id>/estorno
+    GET  /relatorios/kpis          ?inicio=AAAA-MM-DD&fim=AAAA-MM-DD
+    GET  /relatorios/serie-diaria  ?inicio=&fim=
+    GET  /relatorios/serie         ?inicio=&fim=&max_pontos=  (dia/semana/mês/ano conforme o período)
+    GET  /relatorios/composicao-estoque  ?limite=
+    GET  /relatorios/ranking       ?inicio=&fim=&limite=&metrica=quantidade|faturamento|lucro
+    GET  /lojas
+    GET  /rede/kpis                ?inicio=&fim=  (todas as lojas, com o parcial de cada uma)
+    GET  /rede/serie               ?inicio=&fim=&max_pontos=
+    GET  /rede/ranking             ?inicio=&fim=&limite=&metrica=
+
+Qualquer rota aceita ?loja=<nome> (padrão: loja principal); as de /rede
+ignoram a loja.
+"""
+import argparse
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import servicos
+
+
+class ErroRequisicao(Exception):
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _registros(df):
+    return df.to_dict('records')
+
+
+def _periodo(params, rede=False):
+    # Sem filtro, vale o histórico inteiro
+    inicio, fim = servicos.periodo_rede() if rede else servicos.periodo_vendas()
+    return (_data(params.get('inicio'), 'inicio') or inicio or '0001-01-01',
+            _data(params.get('fim'), 'fim') or fim or '9999-12-31')
+
+
+def _inteiro(valor, campo):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ErroRequisicao(f"Campo '{campo}' deve ser inteiro.")
+
+
+def _numero(valor, campo):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        raise ErroRequisicao(f"Campo '{campo}' deve ser numérico.")
+
+
+def _texto(valor, campo):
+    if valor is not None and not isinstance(valor, str):
+        raise ErroRequisicao(f"Campo '{campo}' deve ser texto.")
+    return valor
+
+
+def _data(valor, campo):
+    # Confere o formato aqui, e não no SQL/pandas lá embaixo (que daria 500)
+    if valor is None:
+        return None
+    try:
+        datetime.fromisoformat(valor)
+    except ValueError:
+        raise ErroRequisicao(f"Campo '{campo}' deve ser uma data (AAAA-MM-DD).")
+    return valor
+
+# ============================================
+# HANDLERS
+# ============================================
+
+def listar_produtos(params, corpo):
+    return 200, _registros(servicos.listar_produtos())
+
+
+def buscar_produtos(params, corpo):
+    limite = _inteiro(params.get('limite', 10), 'limite')
+    return 200, _registros(servicos.buscar_produtos(params.get('q', ''), limite))
+
+
+def buscar_produto(params, corpo, produto_id):
+    produto = servicos.buscar_produto(int(produto_id))
+    if produto is None:
+        raise ErroRequisicao("Produto não encontrado.", 404)
+    return 200, produto
+
+
+def cadastrar_produto(params, corpo):
+    sucesso, msg, novo_id = servicos.cadastrar_produto(
+        _texto(corpo.get('nome'), 'nome'),
+        _texto(corpo.get('marca', ''), 'marca'),
+        _inteiro(corpo.get('quantidade', 0), 'quantidade'),
+        _numero(corpo.get('preco_custo', 0), 'preco_custo'),
+        _numero(corpo.get('preco_venda', 0), 'preco_venda'),
+        _texto(corpo.get('sku'), 'sku'),
+    )
+    if not sucesso:
+        raise ErroRequisicao(msg)
+    return 201, {'id': novo_id, 'mensagem': msg}
+
+
+def registrar_entrada(params, corpo):
+    sucesso, msg = servicos.registrar_entrada(
+        _inteiro(corpo.get('produto_id'), 'produto_id'),
+        _inteiro(corpo.get('quantidade'), 'quantidade'),
+        _numero(corpo.get('preco_custo'), 'preco_custo'),
+    )
+    if not sucesso:
+        raise ErroRequisicao(msg)
+    return 201, {'mensagem': msg}
+
+
+def posicao_estoque(params, corpo):
+    if 'data' not in params:
+        raise ErroRequisicao("Informe 'data' (AAAA-MM-DD).")
+    data = _data(params['data'], 'data')
+    if 'produto_id' in params:
+        return 200, servicos.estoque_em(_inteiro(params['produto_id'], 'produto_id'), data)
+    df = servicos.inventario_em(data)
+    return 200, {'data': data, 'valor_total': float(df['valor'].sum()),
+                 'itens': _registros(df)}
+
+
+def fechar_venda(params, corpo):
+    itens = corpo.get('itens')
+    if not isinstance(itens, list) or not itens:
+        raise ErroRequisicao("Informe 'itens' com ao menos um produto.")
+
+    tuplas = []
+    for item in itens:
+        if not isinstance(item, dict):
+            raise ErroRequisicao("Cada item deve ser um objeto JSON.")
+        valor = item.get('valor_total')
+        tuplas.append((
+            _inteiro(item.get('produto_id'), 'produto_id'),
+            _inteiro(item.get('quantidade'), 'quantidade'),
+            None if valor is None else _numero(valor, 'valor_total'),
+        ))
+
+    sucesso, msg, resultados = servicos.fechar_venda(tuplas)
+    status = 201 if sucesso else 409
+    return status, {'sucesso': sucesso, 'mensagem': msg, 'itens': resultados}
+
+
+def historico_vendas(params, corpo):
+    apos = None
+    if 'apos_data' in params and 'apos_id' in params:
+        apos = (_data(params['apos_data'], 'apos_data'), _inteiro(params['apos_id'], 'apos_id'))
+    produto_id = params.get('produto_id')
+    tamanho = _inteiro(params.get('tamanho', 50), 'tamanho')
+    if tamanho < 1:
+        raise ErroRequisicao("Campo 'tamanho' deve ser ao menos 1.")
+
+    df, proximo = servicos.historico_vendas(
+        tamanho,
+        apos,
+        None if produto_id is None else _inteiro(produto_id, 'produto_id'),
+        _data(params.get('inicio'), 'inicio'),
+        _data(params.get('fim'), 'fim'),
+    )
+    return 200, {
+        'vendas': _registros(df),
+        'proximo': None if proximo is None else {'apos_data': proximo[0], 'apos_id': proximo[1]},
+    }
+
+
+def buscar_venda(params, corpo, venda_id):
+    venda = servicos.buscar_venda(int(venda_id))
+    if venda is None:
+        raise ErroRequisicao("Venda não encontrada.", 404)
+    return 200, venda
+
+
+def estornar_venda(params, corpo, venda_id):
+    sucesso, msg = servicos.estornar_venda(int(venda_id))
+    if not sucesso:
+        raise ErroRequisicao(msg, 409)
+    return 200, {'mensagem': msg}
+
+
+def relatorio_kpis(params, corpo):
+    inicio, fim = _periodo(params)
+    return 200, servicos.kpis_periodo(inicio, fim)
+
+
+def relatorio_serie(params, corpo):
+    inicio, fim = _periodo(params)
+    return 200, _registros(servicos.serie_diaria(inicio, fim))
+
+
+def relatorio_serie_agrupada(params, corpo):
+    inicio, fim = _periodo(params)
+    df, granularidade = servicos.serie_vendas(
+        inicio, fim, _inteiro(params.get('max_pontos', 120), 'max_pontos')
+    )
+    return 200, {'granularidade': granularidade, 'pontos': _registros(df)}
+
+
+def relatorio_composicao(params, corpo):
+    limite = _inteiro(params.get('limite', 10), 'limite')
+    return 200, _registros(servicos.composicao_estoque(limite))
+
+
+def relatorio_ranking(params, corpo):
+    inicio, fim = _periodo(params)
+    limite = params.get('limite')
+    try:
+        df = servicos.ranking_produtos(
+            inicio, fim, None if limite is None else _inteiro(limite, 'limite'),
+            params.get('metrica', 'quantidade')
+        )
+    except ValueError as e:
+        raise ErroRequisicao(str(e))
+    return 200, _registros(df)
+
+
+def listar_lojas(params, corpo):
+    return 200, servicos.listar_lojas()
+
+
+def rede_kpis(params, corpo):
+    inicio, fim = _periodo(params, rede=True)
+    return 200, servicos.kpis_rede(inicio, fim)
+
+
+def rede_serie(params, corpo):
+    inicio, fim = _periodo(params, rede=True)
+    df, granularidade = servicos.serie_rede(
+        inicio, fim, _inteiro(params.get('max_pontos', 120), 'max_pontos')
+    )
+    return 200, {'granularidade': granularidade, 'pontos': _registros(df)}
+
+
+def rede_ranking(params, corpo):
+    inicio, fim = _periodo(params, rede=True)
+    try:
+        df = servicos.ranking_rede(
+            inicio, fim, _inteiro(params.get('limite', 10), 'limite'),
+            params.get('metrica', 'quantidade')
+        )
+    except ValueError as e:
+        raise ErroRequisicao(str(e))
+    return 200, _registros(df)
+
+
+ROTAS = [
+    ('GET', r'/produtos', listar_produtos),
+    ('GET', r'/produtos/busca', buscar_produtos),
+    ('GET', r'/produtos/(\d+)', buscar_produto),
+    ('POST', r'/produtos', cadastrar_produto),
+    ('POST', r'/estoque/entradas', registrar_entrada),
+    ('GET', r'/estoque/posicao', posicao_estoque),
+    ('GET', r'/vendas', historico_vendas),
+    ('POST', r'/vendas', fechar_venda),
+    ('GET', r'/vendas/(\d+)', buscar_venda),
+    ('POST', r'/vendas/(\d+)/estorno', estornar_venda),
+    ('GET', r'/relatorios/kpis', relatorio_kpis),
+    ('GET', r'/relatorios/serie-diaria', relatorio_serie),
+    ('GET', r'/relatorios/serie', relatorio_serie_agrupada),
+    ('GET', r'/relatorios/composicao-estoque', relatorio_composicao),
+    ('GET', r'/relatorios/ranking', relatorio_ranking),
+    ('GET', r'/lojas', listar_lojas),
+    ('GET', r'/rede/kpis', rede_kpis),
+    ('GET', r'/rede/serie', rede_serie),
+    ('GET', r'/rede/ranking', rede_ranking),
+]
+ROTAS = [(metodo, re.compile(padrao + '$'), handler) for metodo, padrao, handler in ROTAS]
+
+# ============================================
+# SERVIDOR
+# ============================================
+
+TEMPO_OCIOSO = 5  # segundos que uma conexão keep-alive parada segura o worker
+
+
+class RequisicaoAPI(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive para clientes com muitas requisições
+    # Sem timeout, um cliente keep-alive parado (leitor, aba aberta) prende
+    # um worker do pool para sempre em rfile.readline()
+    timeout = TEMPO_OCIOSO
+
+    def _responder(self, status, dados):
+        corpo = json.dumps(dados, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        if self.server.tem_fila():
+            # Há conexões esperando worker: esta dá a vez em vez de continuar aberta
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _despachar(self, metodo):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            tamanho = _inteiro(self.headers.get('Content-Length') or 0, 'Content-Length')
+            corpo = json.loads(self.rfile.read(tamanho) or b'{}') if tamanho else {}
+            if not isinstance(corpo, dict):
+                raise ErroRequisicao("O corpo deve ser um objeto JSON.")
+
+            loja = params.pop('loja', None)
+            try:
+                # A thread do worker volta à loja principal ao sair do bloco
+                contexto = servicos.usando_loja(loja) if loja else nullcontext()
+            except ValueError as e:
+                raise ErroRequisicao(str(e), 404)
+
+            with contexto:
+                for metodo_rota, padrao, handler in ROTAS:
+                    achou = padrao.match(url.path.rstrip('/') or '/')
+                    if achou and metodo_rota == metodo:
+                        status, dados = handler(params, corpo, *achou.groups())
+                        break
+                else:
+                    raise ErroRequisicao("Rota não encontrada.", 404)
+        except ErroRequisicao as e:
+            status, dados = e.status, {'erro': str(e)}
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            status, dados = 400, {'erro': "JSON inválido."}
+        except Exception as e:
+            status, dados = 500, {'erro': f"Erro interno: {e}"}
+        self._responder(status, dados)
+
+    def do_GET(self):
+        self._despachar('GET')
+
+    def do_POST(self):
+        self._despachar('POST')
+
+    def log_message(self, formato, *args):
+        pass  # sem log por requisição: atrapalha testes de carga
+
+
+class ServidorAPI(ThreadingHTTPServer):
+    """
+    Atende com um pool fixo de threads em vez de uma thread nova por conexão,
+    assim cada worker reaproveita a sua conexão SQLite (database.conectar).
+    Cada conexão ocupa um worker até fechar: conexões paradas caem depois de
+    TEMPO_OCIOSO, e as ativas são fechadas depois da resposta quando há
+    outras na fila.
+    """
+
+    def __init__(self, endereco, workers=8):
+        super().__init__(endereco, RequisicaoAPI)
+        self._workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
+        self._conexoes = 0  # atendidas ou esperando worker
+        self._lock_conexoes = threading.Lock()
+
+    def tem_fila(self):
+        return self._conexoes > self._workers
+
+    def process_request(self, request, client_address):
+        with self._lock_conexoes:
+            self._conexoes += 1
+        self._pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            with self._lock_conexoes:
+                self._conexoes -= 1
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+def iniciar_servidor(host='127.0.0.1', porta=8502, workers=8):
+    servicos.inicializar()
+    return ServidorAPI((host, porta), workers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="API HTTP/JSON do SmartCommerce")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8502)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    servidor = iniciar_servidor(args.host, args.porta, args.workers)
+    print(f"API do SmartCommerce em http://{args.host}:{args.porta}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
@@ -0,0 +1,329 @@
+"""
+Arquivo frio de vendas: as linhas de `vendas` anteriores a uma data de corte
+saem do SQLite e vão para arquivos Parquet, um por mês. O banco transacional
+fica pequeno e o histórico completo continua disponível.
+
+    <banco>_arquivo/mes=2025-01/vendas-<geração>.parquet
+
+A tabela `vendas_arquivadas` (no próprio banco) lista o arquivo válido de cada
+mês. Um mês só troca de arquivo na mesma transação que apaga as linhas do
+SQLite, então cada venda está sempre em um lugar só. O resumo diário
+(`vendas_diarias`) não muda com o arquivamento: o Dashboard continua igual.
+Pedidos (cabeçalhos) ficam no SQLite.
+
+Uso:
+    python arquivo_vendas.py --manter-meses 12
+    python arquivo_vendas.py --antes-de 2025-01-01 --compactar
+    python arquivo_vendas.py --listar
+"""
+import argparse
+import os
+import uuid
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import database
+from database import Desfazer, conectar_leitura, escrever, escrever_exclusivo
+from instrumentacao import cronometrado
+
+MESES_QUENTES = 12
+TENTATIVAS = 3
+
+
+def diretorio_arquivo(caminho_db=None):
+    """Pasta das partições, ao lado do banco (uma por loja/arquivo .db)."""
+    caminho_db = caminho_db or database.caminho_db()
+    return os.path.splitext(os.path.abspath(caminho_db))[0] + '_arquivo'
+
+
+def _caminho(arquivo):
+    return os.path.join(diretorio_arquivo(), arquivo)
+
+
+def _primeiro_dia(mes):
+    return f"{mes}-01"
+
+
+def _mes_seguinte(mes):
+    ano, numero = map(int, mes.split('-'))
+    return f"{ano + numero // 12:04d}-{numero % 12 + 1:02d}"
+
+
+def corte_para(antes_de=None, manter_meses=MESES_QUENTES, hoje=None):
+    """
+    Data de corte (primeiro dia de um mês): arquiva-se só mês fechado. Nunca
+    passa do mês corrente, que ainda recebe vendas.
+    """
+    hoje = hoje or date.today()
+    atual = hoje.replace(day=1)
+    if antes_de is None:
+        total = atual.year * 12 + atual.month - 1 - manter_meses
+        corte = date(total // 12, total % 12 + 1, 1)
+    else:
+        corte = pd.Timestamp(antes_de).date().replace(day=1)
+    return str(min(corte, atual))
+
+# ============================================
+# ESCRITA (arquivamento)
+# ============================================
+
+def _ler_particao(arquivo, filtros=None, colunas=None):
+    tabela = pq.read_table(_caminho(arquivo), filters=filtros)
+    df = tabela.to_pandas()
+    if colunas is not None:
+        # Partições antigas podem não ter colunas criadas depois
+        df = df.reindex(columns=colunas)
+    return df
+
+
+def _gravar_particao(mes, df):
+    """Grava uma nova geração do mês e devolve o nome relativo do arquivo."""
+    arquivo = os.path.join(f"mes={mes}", f"vendas-{uuid.uuid4().hex[:12]}.parquet")
+    caminho = _caminho(arquivo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    # Ordenado por data: as estatísticas dos row groups ajudam os filtros
+    df = df.sort_values(['data_venda', 'id'], kind='stable')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), caminho + '.tmp',
+                   compression='zstd')
+    os.replace(caminho + '.tmp', caminho)
+    return arquivo
+
+
+def _trocar_particao(cursor, mes, inicio, fim, anterior, arquivo, novas, df):
+    cursor.execute(
+        "SELECT arquivo FROM vendas_arquivadas WHERE mes = ?", (mes,)
+    )
+    linha = cursor.fetchone()
+    cursor.execute("""
+        DELETE FROM vendas
+        WHERE data_venda >= ? AND data_venda < ? AND id <= ?
+    """, (inicio, fim, int(novas['id'].max())))
+    if cursor.rowcount != len(novas) or (linha[0] if linha else None) != anterior:
+        raise Desfazer(False)
+
+    cursor.execute("""
+        INSERT INTO vendas_arquivadas (mes, arquivo, linhas, menor_id, maior_id)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (mes) DO UPDATE SET
+            arquivo = excluded.arquivo,
+            linhas = excluded.linhas,
+            menor_id = excluded.menor_id,
+            maior_id = excluded.maior_id,
+            arquivado_em = CURRENT_TIMESTAMP
+    """, (mes, arquivo, len(df), int(df['id'].min()), int(df['id'].max())))
+    return True
+
+
+def _arquivar_mes(mes, corte):
+    """
+    Move as vendas quentes de um mês (anteriores ao corte) para o Parquet.
+    O arquivo é escrito sem segurar o lock de escrita; a troca final (conferir
+    e apagar) é um comando do escritor único, na fila junto com as vendas.
+    Se um estorno mexeu no mês nesse meio tempo, nada é gravado e retorna
+    None (o chamador tenta de novo).
+    """
+    inicio, fim = _primeiro_dia(mes), min(_primeiro_dia(_mes_seguinte(mes)), corte)
+
+    leitura = conectar_leitura()
+    novas = pd.read_sql_query(
+        "SELECT * FROM vendas WHERE data_venda >= ? AND data_venda < ?",
+        leitura, params=(inicio, fim)
+    )
+    atual = leitura.execute(
+        "SELECT arquivo FROM vendas_arquivadas WHERE mes = ?", (mes,)
+    ).fetchone()
+    leitura.close()
+    if novas.empty:
+        return 0
+
+    anterior = atual[0] if atual else None
+    df = novas
+    if anterior is not None:
+        df = pd.concat([_ler_particao(anterior), novas], ignore_index=True)
+    arquivo = _gravar_particao(mes, df)
+
+    try:
+        trocou = escrever(_trocar_particao, mes, inicio, fim, anterior, arquivo, novas, df)
+    except Exception:
+        os.remove(_caminho(arquivo))
+        raise
+    if not trocou:
+        os.remove(_caminho(arquivo))
+        return None
+
+    if anterior is not None:
+        try:
+            os.remove(_caminho(anterior))
+        except FileNotFoundError:
+            pass
+    return len(novas)
+
+
+@cronometrado
+def arquivar_vendas(corte):
+    """
+    Arquiva, mês a mês, as vendas com data anterior a `corte` (AAAA-MM-01).
+    Retorna {mes: linhas movidas}.
+    """
+    leitura = conectar_leitura()
+    meses = [linha[0] for linha in leitura.execute("""
+        SELECT DISTINCT strftime('%Y-%m', data_venda)
+        FROM vendas WHERE data_venda < ?
+        ORDER BY 1
+    """, (corte,))]
+    leitura.close()
+
+    movidas = {}
+    for mes in meses:
+        for _ in range(TENTATIVAS):
+            linhas = _arquivar_mes(mes, corte)
+            if linhas is not None:
+                movidas[mes] = linhas
+                break
+        else:
+            raise RuntimeError(f"Não foi possível arquivar {mes}: vendas alteradas durante a cópia.")
+    return movidas
+
+
+def _compactar(conn):
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def compactar():
+    """
+    Devolve ao disco o espaço liberado pelas linhas arquivadas. Roda no
+    escritor único com a fila parada: as vendas esperam o VACUUM terminar.
+    """
+    escrever_exclusivo(_compactar)
+
+# ============================================
+# LEITURA (usada por relatorios.py e pelo resumo diário)
+# ============================================
+
+def particoes(mes_inicio=None, mes_fim=None, conn=None):
+    """[(mes, arquivo)] do mais recente para o mais antigo, podados pelo intervalo de meses."""
+    conn = conn or conectar_leitura()
+    return conn.execute("""
+        SELECT mes, arquivo FROM vendas_arquivadas
+        WHERE mes >= ? AND mes <= ?
+        ORDER BY mes DESC
+    """, (mes_inicio or '0000-00', mes_fim or '9999-99')).fetchall()
+
+
+def ler_vendas_arquivadas(colunas, apos=None, produto_id=None, data_inicio=None,
+                          data_ate=None, depois_de=None, limite=None):
+    """
+    Vendas arquivadas da mais recente para a mais antiga, no mesmo formato da
+    consulta quente: `apos` e `depois_de` são chaves (data_venda, id) que
+    limitam a faixa por cima e por baixo; `data_ate` é exclusiva. Só abre os
+    meses que podem ter linhas na faixa e para ao juntar `limite` linhas.
+    """
+    superior = min(d for d in (data_ate, apos and apos[0], '9999-12-31') if d)
+    inferior = max(d for d in (data_inicio, depois_de and depois_de[0], '0000-01-01') if d)
+
+    filtros = [('data_venda', '>=', inferior), ('data_venda', '<=', superior)]
+    if produto_id is not None:
+        filtros.append(('produto_id', '=', int(produto_id)))
+
+    partes, total = [], 0
+    for _, arquivo in particoes(inferior[:7], superior[:7]):
+        df = _ler_particao(arquivo, filtros, colunas)
+        if data_ate is not None:
+            df = df[df['data_venda'] < data_ate]
+        if apos is not None:
+            df = df[(df['data_venda'] < apos[0])
+                    | ((df['data_venda'] == apos[0]) & (df['id'] < apos[1]))]
+        if depois_de is not None:
+            df = df[(df['data_venda'] > depois_de[0])
+                    | ((df['data_venda'] == depois_de[0]) & (df['id'] > depois_de[1]))]
+        if df.empty:
+            continue
+        partes.append(df)
+        total += len(df)
+        if limite is not None and total >= limite:
+            break
+
+    if not partes:
+        return pd.DataFrame(columns=colunas)
+    df = pd.concat(partes, ignore_index=True)
+    df = df.sort_values(['data_venda', 'id'], ascending=False, kind='stable')
+    return df.iloc[:limite] if limite is not None else df
+
+
+def venda_arquivada(venda_id):
+    """Linha arquivada pelo id (só abre o mês cuja faixa de ids a contém), ou None."""
+    conn = conectar_leitura()
+    candidatos = conn.execute("""
+        SELECT arquivo FROM vendas_arquivadas
+        WHERE ? BETWEEN menor_id AND maior_id
+    """, (int(venda_id),)).fetchall()
+    conn.close()
+    for (arquivo,) in candidatos:
+        df = _ler_particao(arquivo, [('id', '=', int(venda_id))])
+        if not df.empty:
+            return df.iloc[0].to_dict()
+    return None
+
+
+def resumo_diario_arquivado(conn=None, mes=None):
+    """
+    (dia, produto_id, faturamento, custo, unidades, num_vendas) das vendas
+    arquivadas (só as de `mes`, AAAA-MM, se informado). Vendas arquivadas
+    antes de guardar o custo usam o custo atual.
+    """
+    conn = conn or conectar_leitura()  # pode ser o cursor da transação
+    custos = None
+    linhas = []
+    for _, arquivo in particoes(mes, mes, conn=conn):
+        df = _ler_particao(arquivo, colunas=['produto_id', 'quantidade', 'valor_total',
+                                             'custo_total', 'data_venda'])
+        if df['custo_total'].isna().any():
+            if custos is None:
+                custos = dict(conn.execute("SELECT id, preco_custo FROM produtos").fetchall())
+            df['custo_total'] = df['custo_total'].fillna(
+                df['produto_id'].map(custos) * df['quantidade']
+            ).fillna(0)
+        df['dia'] = df['data_venda'].str[:10]
+        grupos = df.groupby(['dia', 'produto_id']).agg(
+            faturamento=('valor_total', 'sum'),
+            custo=('custo_total', 'sum'),
+            unidades=('quantidade', 'sum'),
+            num_vendas=('quantidade', 'size'),
+        ).reset_index()
+        linhas.extend(
+            (r.dia, int(r.produto_id), float(r.faturamento), float(r.custo), int(r.unidades),
+             int(r.num_vendas))
+            for r in grupos.itertuples(index=False)
+        )
+    return linhas
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Arquivo frio de vendas do SmartCommerce")
+    parser.add_argument('--banco', default=database.CAMINHO_DB)
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--antes-de', help="arquiva as vendas anteriores ao mês desta data")
+    grupo.add_argument('--manter-meses', type=int, default=MESES_QUENTES,
+                       help="meses fechados que ficam no SQLite (padrão: %(default)s)")
+    parser.add_argument('--compactar', action='store_true',
+                        help="roda VACUUM depois de arquivar")
+    parser.add_argument('--listar', action='store_true', help="só lista as partições")
+    args = parser.parse_args()
+
+    database.CAMINHO_DB = args.banco
+    database.criar_tabelas()
+
+    if not args.listar:
+        corte = corte_para(args.antes_de, args.manter_meses)
+        movidas = arquivar_vendas(corte)
+        print(f"Corte em {corte}: {sum(movidas.values())} venda(s) arquivada(s) "
+              f"em {len(movidas)} mês(es).")
+        if args.compactar:
+            compactar()
+
+    for mes, arquivo in reversed(particoes()):
+        print(f"  {mes}  {arquivo}")
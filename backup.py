@@ -0,0 +1,247 @@
+"""
+Backup online com a API de backup do SQLite. A cópia anda em passos de
+PAGINAS_POR_PASSO páginas com uma pausa entre eles, e o PDV continua vendendo
+enquanto ela roda. A cópia inteira sai de uma única transação de leitura: é
+um retrato consistente do banco num instante, mesmo com vendas acontecendo,
+e não recomeça a cada escrita. Ela é conferida com PRAGMA integrity_check
+antes de ganhar o nome final.
+
+    <banco>_backups/<banco>-AAAAMMDD-HHMMSS.db
+
+Ficam os MANTER_BACKUPS mais recentes de cada banco. As partições Parquet do
+arquivo frio (arquivo_vendas.py) não entram na cópia: copie a pasta
+<banco>_arquivo/ junto.
+
+Uso:
+    python backup.py
+    python backup.py --todas-as-lojas --a-cada 60 --manter 48
+    python backup.py --listar
+    python backup.py --restaurar gestao_backups/gestao-20250101-120000.db
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import database
+from database import conectar_leitura, escrever_exclusivo
+from instrumentacao import cronometrado
+
+PAGINAS_POR_PASSO = 256       # ~1 MB com páginas de 4 KB
+PAUSA_ENTRE_PASSOS = 0.005    # segundos
+MANTER_BACKUPS = 7
+
+
+def diretorio_backups(caminho_db=None):
+    """Pasta dos backups, ao lado do banco (uma por loja/arquivo .db)."""
+    caminho_db = caminho_db or database.caminho_db()
+    return os.path.splitext(os.path.abspath(caminho_db))[0] + '_backups'
+
+
+def _prefixo(caminho_db=None):
+    caminho_db = caminho_db or database.caminho_db()
+    return os.path.splitext(os.path.basename(caminho_db))[0] + '-'
+
+
+def listar_backups(caminho_db=None):
+    """Backups completos do banco, do mais novo para o mais antigo."""
+    pasta = diretorio_backups(caminho_db)
+    if not os.path.isdir(pasta):
+        return []
+    prefixo = _prefixo(caminho_db)
+    backups = []
+    for nome in os.listdir(pasta):
+        if nome.startswith(prefixo) and nome.endswith('.db'):
+            caminho = os.path.join(pasta, nome)
+            info = os.stat(caminho)
+            backups.append({
+                'arquivo': caminho,
+                'bytes': info.st_size,
+                'criado_em': datetime.fromtimestamp(info.st_mtime),
+            })
+    return sorted(backups, key=lambda b: (b['criado_em'], b['arquivo']), reverse=True)
+
+
+def verificar_integridade(arquivo):
+    """Problemas apontados pelo PRAGMA integrity_check do arquivo ([] se íntegro)."""
+    conn = sqlite3.connect(f"file:{os.path.abspath(arquivo)}?mode=ro", uri=True)
+    try:
+        resultado = [linha[0] for linha in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        resultado = [str(e)]  # nem é um banco SQLite
+    finally:
+        conn.close()
+    return [] if resultado == ['ok'] else resultado
+
+
+def rotacionar(manter=MANTER_BACKUPS, caminho_db=None):
+    """Apaga os backups além dos `manter` mais recentes; devolve os apagados."""
+    removidos = [b['arquivo'] for b in listar_backups(caminho_db)[manter:]]
+    for arquivo in removidos:
+        os.remove(arquivo)
+    return removidos
+
+
+def _nome_livre(pasta, prefixo):
+    base = os.path.join(pasta, prefixo + datetime.now().strftime('%Y%m%d-%H%M%S'))
+    destino, n = base + '.db', 1
+    while os.path.exists(destino):
+        destino, n = f"{base}-{n}.db", n + 1
+    return destino
+
+
+@cronometrado
+def fazer_backup(paginas_por_passo=PAGINAS_POR_PASSO, pausa=PAUSA_ENTRE_PASSOS,
+                 manter=MANTER_BACKUPS):
+    """
+    Copia o banco da thread para <banco>_backups/ sem parar as vendas.
+    `manter=None` não apaga backups antigos. Devolve um relatório com o
+    arquivo, o tamanho, os passos e a vazão. ValueError se a cópia não
+    passar na verificação de integridade (e ela é descartada).
+    """
+    pasta = diretorio_backups()
+    os.makedirs(pasta, exist_ok=True)
+    final = _nome_livre(pasta, _prefixo())
+    parcial = final + '.parcial'
+
+    passos = reinicios = 0
+    ultimo_restante = None
+
+    def progresso(status, restantes, total):
+        nonlocal passos, reinicios, ultimo_restante
+        passos += 1
+        if ultimo_restante is not None and restantes > ultimo_restante:
+            reinicios += 1
+        ultimo_restante = restantes
+        if restantes and pausa:
+            time.sleep(pausa)  # a vez é dos escritores
+
+    origem = conectar_leitura()
+    destino = sqlite3.connect(parcial)
+    t0 = time.perf_counter()
+    try:
+        # Uma transação de leitura do início ao fim: em WAL, as vendas seguem
+        # gravando e a cópia continua no mesmo retrato, sem recomeçar
+        origem.execute("BEGIN")
+        origem.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        origem.backup(destino, pages=paginas_por_passo, progress=progresso)
+        origem.close()
+        segundos = time.perf_counter() - t0
+        # A cópia é um arquivo só, sem -wal ao lado
+        destino.execute("PRAGMA journal_mode=DELETE")
+        paginas = destino.execute("PRAGMA page_count").fetchone()[0]
+        destino.close()
+    except Exception:
+        origem.close()
+        destino.close()
+        os.remove(parcial)
+        raise
+
+    problemas = verificar_integridade(parcial)
+    if problemas:
+        os.remove(parcial)
+        raise ValueError(f"Backup descartado, falhou na verificação de integridade: {problemas[:5]}")
+    os.replace(parcial, final)
+
+    tamanho = os.path.getsize(final)
+    return {
+        'arquivo': final,
+        'bytes': tamanho,
+        'paginas': paginas,
+        'passos': passos,
+        'reinicios': reinicios,
+        'segundos': round(segundos, 3),
+        'mb_por_s': round(tamanho / 1e6 / segundos, 1) if segundos else None,
+        'removidos': rotacionar(manter) if manter is not None else [],
+    }
+
+
+def _restaurar(conn, arquivo):
+    origem = sqlite3.connect(f"file:{os.path.abspath(arquivo)}?mode=ro", uri=True)
+    try:
+        origem.backup(conn)
+    finally:
+        origem.close()
+    # Um backup antigo pode estar numa versão anterior do schema: migra antes
+    # de soltar a fila, para nenhuma venda cair no schema velho
+    database.criar_tabelas()
+
+
+@cronometrado
+def restaurar(arquivo):
+    """
+    Volta o banco da thread para o conteúdo de um backup. Antes, confere o
+    backup e faz mais um backup do estado atual, sem rotação. A troca é uma
+    escrita só, pela própria API de backup, na conexão do escritor único com
+    a fila parada: as vendas que chegarem esperam por ela, e quem estiver
+    conectado passa a ver o banco restaurado na transação seguinte. Devolve o
+    caminho do backup do estado anterior.
+    """
+    if not os.path.isfile(arquivo):
+        raise ValueError(f"Backup não encontrado: {arquivo}")
+    if os.path.abspath(arquivo) == os.path.abspath(database.caminho_db()):
+        raise ValueError("O backup não pode ser o próprio banco.")
+    problemas = verificar_integridade(arquivo)
+    if problemas:
+        raise ValueError(f"Backup corrompido, nada foi restaurado: {problemas[:5]}")
+
+    anterior = fazer_backup(manter=None)['arquivo']
+    escrever_exclusivo(_restaurar, arquivo)
+    return anterior
+
+
+def _bancos(todas_as_lojas):
+    if not todas_as_lojas:
+        return [database.caminho_db()]
+    import lojas
+    return list(lojas.listar_lojas().values())
+
+
+def _imprimir(relatorio):
+    print(f"  {relatorio['arquivo']}: {relatorio['bytes'] / 1e6:.1f} MB, "
+          f"{relatorio['passos']} passo(s), {relatorio['segundos']:.2f} s "
+          f"({relatorio['mb_por_s']} MB/s)"
+          + (f", {len(relatorio['removidos'])} antigo(s) removido(s)" if relatorio['removidos'] else ""))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backup online do SmartCommerce")
+    parser.add_argument('--banco', default=database.CAMINHO_DB)
+    parser.add_argument('--todas-as-lojas', action='store_true',
+                        help="faz o backup de todas as lojas (ignora --banco)")
+    parser.add_argument('--manter', type=int, default=MANTER_BACKUPS,
+                        help="backups mantidos por banco (padrão: %(default)s)")
+    parser.add_argument('--a-cada', type=float, metavar='MINUTOS',
+                        help="repete o backup a cada MINUTOS, até ser interrompido")
+    parser.add_argument('--paginas-por-passo', type=int, default=PAGINAS_POR_PASSO)
+    parser.add_argument('--pausa', type=float, default=PAUSA_ENTRE_PASSOS,
+                        help="segundos entre um passo e outro (padrão: %(default)s)")
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--listar', action='store_true', help="só lista os backups")
+    grupo.add_argument('--verificar', metavar='ARQUIVO', help="confere a integridade de um backup")
+    grupo.add_argument('--restaurar', metavar='ARQUIVO', help="restaura o banco a partir de um backup")
+    args = parser.parse_args()
+
+    database.CAMINHO_DB = args.banco
+
+    if args.listar:
+        for caminho in _bancos(args.todas_as_lojas):
+            for b in listar_backups(caminho):
+                print(f"  {b['criado_em']:%Y-%m-%d %H:%M:%S}  {b['bytes'] / 1e6:8.1f} MB  {b['arquivo']}")
+    elif args.verificar:
+        problemas = verificar_integridade(args.verificar)
+        print("Backup íntegro." if not problemas else "\n".join(problemas))
+    elif args.restaurar:
+        anterior = restaurar(args.restaurar)
+        print(f"Banco {args.banco} restaurado de {args.restaurar}. "
+              f"O estado anterior ficou em {anterior}.")
+    else:
+        while True:
+            print(f"{datetime.now():%Y-%m-%d %H:%M:%S} backup:")
+            for caminho in _bancos(args.todas_as_lojas):
+                with database.usando_banco(caminho):
+                    _imprimir(fazer_backup(args.paginas_por_passo, args.pausa, args.manter))
+            if not args.a_cada:
+                break
+            time.sleep(args.a_cada * 60)
@@ -0,0 +1,220 @@
+"""
+Benchmark das operações do database.py e das consultas do Dashboard em várias
+escalas de dados sintéticos (gerar_dados.py). O resultado vai para um JSON,
+para comparar versões.
+
+Uso:
+    python benchmark.py --escalas minima pequena --saida bench_resultados.json
+    python benchmark.py --escalas pequena --comparar bench_anterior.json
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import backup
+import database
+import gerar_dados
+import relatorios
+from cache import cache_consultas
+
+
+def _versao_codigo():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _medir(funcao, repeticoes, preparar=None):
+    """Executa `funcao` várias vezes e devolve as estatísticas em milissegundos."""
+    tempos = []
+    for i in range(repeticoes):
+        args = preparar(i) if preparar else ()
+        t0 = time.perf_counter()
+        funcao(*args)
+        tempos.append((time.perf_counter() - t0) * 1000)
+    tempos.sort()
+    return {
+        'repeticoes': repeticoes,
+        'min_ms': round(tempos[0], 3),
+        'mediana_ms': round(statistics.median(tempos), 3),
+        'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+        'media_ms': round(statistics.fmean(tempos), 3),
+    }
+
+
+def _sem_cache(funcao):
+    # em_cache e cronometrado usam functools.wraps: a função original fica no
+    # fim da cadeia de __wrapped__ (um nível só ainda passaria pelo cache)
+    return inspect.unwrap(funcao)
+
+
+def medir_escala(caminho, repeticoes):
+    database.CAMINHO_DB = caminho
+    conn = database.conectar()
+    custos = conn.execute(
+        "SELECT id, preco_custo FROM produtos ORDER BY id LIMIT ?", (repeticoes,)
+    ).fetchall()
+    produto_ids = [produto_id for produto_id, _ in custos]
+    # Garante estoque para as vendas do benchmark com COMPRAs de verdade:
+    # razão, camadas e custo médio continuam batendo com a quantidade
+    for produto_id, custo in custos:
+        database.registrar_entrada_estoque(produto_id, 1000000, custo)
+
+    inicio, fim = relatorios.periodo_vendas()
+    meio = inicio + (fim - inicio) / 2
+    resultados = {}
+
+    vendas_feitas = []
+
+    def vender(produto_id):
+        _, _, itens = database.fechar_venda([(produto_id, 1, 10.0)])
+        vendas_feitas.append((itens[0]['venda_id'], produto_id))
+
+    resultados['registrar_venda'] = _medir(
+        lambda pid: database.registrar_venda(pid, 1, 10.0), repeticoes,
+        lambda i: (produto_ids[i % len(produto_ids)],)
+    )
+    resultados['fechar_venda_1_item'] = _medir(
+        vender, repeticoes, lambda i: (produto_ids[i % len(produto_ids)],)
+    )
+    resultados['estornar_venda_db'] = _medir(
+        lambda venda_id, pid: database.estornar_venda_db(venda_id, pid, 1), repeticoes,
+        lambda i: vendas_feitas[i]
+    )
+
+    catalogo = {linha[0]: linha for linha in conn.execute(
+        "SELECT id, nome, marca, quantidade, preco_custo, preco_venda FROM produtos "
+        "WHERE id IN (%s)" % ','.join('?' * len(produto_ids)), produto_ids
+    )}
+    resultados['atualizar_produto_db'] = _medir(
+        lambda p: database.atualizar_produto_db(p[0], p[1], p[2], p[3], p[4], p[5]),
+        repeticoes, lambda i: (catalogo[produto_ids[i % len(produto_ids)]],)
+    )
+
+    # Backup online: vazão da cópia e o que ela custa ao fechamento de venda
+    relatorios_backup = []
+    resultados['backup_online'] = _medir(
+        lambda: relatorios_backup.append(backup.fazer_backup(manter=1)), min(repeticoes, 5)
+    )
+    resultados['backup_online']['mb_por_s'] = relatorios_backup[-1]['mb_por_s']
+
+    copiando = threading.Event()
+    copiando.set()
+
+    def backups_seguidos():
+        while copiando.is_set():
+            backup.fazer_backup(manter=1)
+
+    em_segundo_plano = threading.Thread(target=backups_seguidos)
+    em_segundo_plano.start()
+    resultados['fechar_venda_durante_backup'] = _medir(
+        vender, repeticoes, lambda i: (produto_ids[i % len(produto_ids)],)
+    )
+    copiando.clear()
+    em_segundo_plano.join()
+    shutil.rmtree(backup.diretorio_backups(caminho))
+
+    consultas = {
+        'listar_produtos': lambda: _sem_cache(relatorios.listar_produtos)(),
+        'periodo_vendas': lambda: _sem_cache(relatorios.periodo_vendas)(),
+        'kpis_periodo': lambda: _sem_cache(relatorios.kpis_periodo)(inicio, fim),
+        'serie_diaria': lambda: _sem_cache(relatorios.serie_diaria)(inicio, fim),
+        'ranking_produtos': lambda: _sem_cache(relatorios.ranking_produtos)(inicio, fim),
+        'top_produtos_10_lucro': lambda: _sem_cache(relatorios.top_produtos)(10, 'lucro'),
+        'serie_vendas': lambda: _sem_cache(relatorios.serie_vendas)(inicio, fim),
+        'ranking_com_outros': lambda: _sem_cache(relatorios.ranking_com_outros)(inicio, fim),
+        'composicao_estoque': lambda: _sem_cache(relatorios.composicao_estoque)(),
+        'estoque_em_produto': lambda: _sem_cache(relatorios.estoque_em)(produto_ids[0], meio),
+        'inventario_em': lambda: _sem_cache(relatorios.inventario_em)(meio),
+        'historico_vendas_pagina_1': lambda: _sem_cache(relatorios.historico_vendas)(20),
+        'buscar_produtos_prefixo': lambda: _sem_cache(relatorios.buscar_produtos)('caf pre', 20),
+        'buscar_produtos_sku': lambda: _sem_cache(relatorios.buscar_produtos)('7890000000042', 20),
+    }
+    for nome, consulta in consultas.items():
+        resultados[nome] = _medir(consulta, repeticoes)
+
+    # Mesmo caminho do app (com cache), depois do primeiro acesso
+    cache_consultas.limpar()
+    relatorios.listar_produtos()
+    resultados['listar_produtos_em_cache'] = _medir(relatorios.listar_produtos, repeticoes)
+
+    database.fechar_conexoes()
+    return resultados
+
+
+def comparar(atual, anterior):
+    """Imprime a variação da mediana de cada medição em relação a um resultado anterior."""
+    for escala, dados in atual['escalas'].items():
+        antes = anterior.get('escalas', {}).get(escala, {}).get('medicoes', {})
+        print(f"\n[{escala}]")
+        for nome, stats in dados['medicoes'].items():
+            if nome not in antes:
+                print(f"  {nome:<28} {stats['mediana_ms']:>10.3f} ms  (novo)")
+                continue
+            base = antes[nome]['mediana_ms']
+            variacao = ((stats['mediana_ms'] - base) / base * 100) if base else 0.0
+            print(f"  {nome:<28} {stats['mediana_ms']:>10.3f} ms  ({variacao:+.1f}%)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark do SmartCommerce")
+    parser.add_argument('--escalas', nargs='+', default=['minima', 'pequena'],
+                        choices=sorted(gerar_dados.ESCALAS))
+    parser.add_argument('--repeticoes', type=int, default=50)
+    parser.add_argument('--diretorio', help="onde guardar os bancos gerados (padrão: temporário)")
+    parser.add_argument('--reusar', action='store_true',
+                        help="reaproveita bancos já gerados no diretório (mais rápido, menos comparável)")
+    parser.add_argument('--saida', default='bench_resultados.json')
+    parser.add_argument('--comparar', help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    diretorio = args.diretorio or tempfile.mkdtemp(prefix='smartcommerce_bench_')
+    os.makedirs(diretorio, exist_ok=True)
+
+    resultado = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'versao_codigo': _versao_codigo(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'repeticoes': args.repeticoes,
+        'escalas': {},
+    }
+
+    for escala in args.escalas:
+        tamanho = gerar_dados.ESCALAS[escala]
+        caminho = os.path.join(diretorio, f"bench_{escala}.db")
+        t0 = time.perf_counter()
+        if not (args.reusar and os.path.exists(caminho)):
+            gerar_dados.gerar(caminho, tamanho['produtos'], tamanho['vendas'], sobrescrever=True)
+        geracao = time.perf_counter() - t0
+
+        print(f"Medindo escala '{escala}' ({tamanho['produtos']} produtos, "
+              f"{tamanho['vendas']} vendas)...")
+        resultado['escalas'][escala] = {
+            **tamanho,
+            'geracao_s': round(geracao, 2),
+            'medicoes': medir_escala(caminho, args.repeticoes),
+        }
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(resultado, json.load(f))
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from database import caminho_db, versao_dados
+
+# ============================================
+# CACHE DE CONSULTAS
+# ============================================
+# Compartilhado entre reruns e sessões (vive no processo). Cada entrada é
+# guardada junto com a versão dos dados do seu banco (loja); uma escrita muda
+# a versão e descarta, na próxima leitura, só as entradas daquele banco.
+
+class CacheConsultas:
+    def __init__(self, max_itens=256, ttl=300):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()  # (banco, chave) -> (expira_em, valor)
+        self._versoes = {}  # banco -> versão dos dados das entradas guardadas
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.invalidacoes = 0
+
+    def _conferir_versao(self, banco, versao):
+        if versao != self._versoes.get(banco):
+            velhas = [chave for chave in self._itens if chave[0] == banco]
+            if velhas:
+                self.invalidacoes += 1
+            for chave in velhas:
+                del self._itens[chave]
+            self._versoes[banco] = versao
+
+    def obter(self, chave, versao, banco=None):
+        """Retorna (True, valor) se a chave estiver válida, senão (False, None)."""
+        with self._lock:
+            self._conferir_versao(banco, versao)
+            chave = (banco, chave)
+            item = self._itens.get(chave)
+            if item is None or item[0] < time.monotonic():
+                self._itens.pop(chave, None)
+                self.falhas += 1
+                return False, None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return True, item[1]
+
+    def guardar(self, chave, versao, valor, ttl=None, banco=None):
+        with self._lock:
+            self._conferir_versao(banco, versao)
+            chave = (banco, chave)
+            expira_em = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._itens[chave] = (expira_em, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'itens': len(self._itens),
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'invalidacoes': self.invalidacoes,
+                'taxa_acerto': (self.acertos / consultas) if consultas else 0.0,
+            }
+
+
+cache_consultas = CacheConsultas()
+
+
+def _copia(valor):
+    # DataFrames/dicts são mutáveis: quem recebe pode alterar sem estragar o cache
+    if isinstance(valor, tuple):
+        return tuple(_copia(v) for v in valor)  # ex.: (DataFrame, cursor)
+    return valor.copy() if hasattr(valor, 'copy') else valor
+
+
+def em_cache(funcao=None, *, ttl=None):
+    """Decorador: reaproveita o resultado enquanto a versão dos dados não mudar."""
+    def decorador(f):
+        nome = f"{f.__module__}.{f.__qualname__}"
+
+        @wraps(f)
+        def envolvida(*args, **kwargs):
+            chave = (nome, args, tuple(sorted(kwargs.items())))
+            banco = caminho_db()
+            versao = versao_dados()
+            achou, valor = cache_consultas.obter(chave, versao, banco)
+            if not achou:
+                valor = f(*args, **kwargs)
+                cache_consultas.guardar(chave, versao, valor, ttl, banco)
+            return _copia(valor)
+
+        return envolvida
+
+    if funcao is not None:
+        return decorador(funcao)
+    return decorador
@@ -0,0 +1,104 @@
+"""
+Carrinho do PDV: uma linha por produto (adicionar o mesmo produto de novo
+soma à linha existente), com subtotal e total mantidos a cada alteração, sem
+refazer a soma do pedido inteiro. O estoque de cada linha é conferido contra
+a quantidade disponível lida do catálogo quando o produto entrou no carrinho;
+a baixa de verdade (condicional) continua sendo a do fechar_venda.
+"""
+
+
+class ItemCarrinho:
+    __slots__ = ('produto_id', 'produto', 'quantidade', 'unitario', 'disponivel', 'subtotal')
+
+    def __init__(self, produto_id, produto, quantidade, unitario, disponivel):
+        self.produto_id = produto_id
+        self.produto = produto
+        self.quantidade = quantidade
+        self.unitario = unitario
+        self.disponivel = disponivel
+        self.subtotal = quantidade * unitario
+
+
+class Carrinho:
+    __slots__ = ('_itens', 'total', 'unidades')
+
+    def __init__(self):
+        self._itens = {}  # produto_id -> ItemCarrinho, na ordem em que entraram
+        self.total = 0.0
+        self.unidades = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __iter__(self):
+        return iter(self._itens.values())
+
+    def __contains__(self, produto_id):
+        return produto_id in self._itens
+
+    def quantidade_de(self, produto_id):
+        item = self._itens.get(produto_id)
+        return item.quantidade if item else 0
+
+    def _conferir(self, produto, quantidade, disponivel):
+        if quantidade <= 0:
+            raise ValueError("A quantidade deve ser positiva!")
+        if quantidade > disponivel:
+            raise ValueError(
+                f"Estoque insuficiente para {produto} (disponível: {disponivel})!"
+            )
+
+    def _mudar(self, item, quantidade):
+        subtotal = quantidade * item.unitario
+        self.total += subtotal - item.subtotal
+        self.unidades += quantidade - item.quantidade
+        item.quantidade = quantidade
+        item.subtotal = subtotal
+
+    def adicionar(self, produto_id, produto, quantidade, unitario, disponivel):
+        """Põe `quantidade` do produto no carrinho; ValueError se passar do estoque."""
+        produto_id, quantidade, disponivel = int(produto_id), int(quantidade), int(disponivel)
+        item = self._itens.get(produto_id)
+        if item is None:
+            self._conferir(produto, quantidade, disponivel)
+            item = self._itens[produto_id] = ItemCarrinho(
+                produto_id, produto, 0, float(unitario), disponivel
+            )
+        else:
+            # O estoque lido agora é mais novo que o de quando a linha entrou
+            item.disponivel = disponivel
+            self._conferir(produto, item.quantidade + quantidade, disponivel)
+            quantidade += item.quantidade
+        self._mudar(item, quantidade)
+
+    def alterar(self, produto_id, quantidade):
+        """Troca a quantidade de uma linha (0 tira o produto do carrinho)."""
+        item = self._itens[produto_id]
+        quantidade = int(quantidade)
+        if quantidade == 0:
+            self.remover(produto_id)
+            return
+        self._conferir(item.produto, quantidade, item.disponivel)
+        if quantidade != item.quantidade:
+            self._mudar(item, quantidade)
+
+    def remover(self, produto_id):
+        item = self._itens.pop(produto_id)
+        if not self._itens:
+            self.limpar()  # zera o total sem resto de arredondamento
+            return
+        self.total -= item.subtotal
+        self.unidades -= item.quantidade
+
+    def limpar(self):
+        self._itens.clear()
+        self.total = 0.0
+        self.unidades = 0
+
+    def atualizar_disponivel(self, produto_id, disponivel):
+        """Guarda o estoque atual de uma linha (ex.: depois de uma venda recusada)."""
+        self._itens[produto_id].disponivel = int(disponivel)
+
+    def itens_venda(self):
+        """Linhas no formato do fechar_venda: (produto_id, quantidade, valor_total)."""
+        return [(i.produto_id, i.quantidade, i.subtotal) for i in self._itens.values()]
@@ -0,0 +1,240 @@
+"""
+Importação e exportação do catálogo de produtos em CSV ou Parquet, em lotes:
+a memória usada depende do tamanho do lote, não do arquivo.
+
+Na importação, o SKU identifica o produto. Produto novo é cadastrado; um SKU
+já existente tem nome, marca e preço de venda atualizados. A quantidade do
+arquivo é uma entrada de mercadoria: soma ao estoque, vira uma COMPRA e entra
+no custo médio ao preço de custo do arquivo.
+
+Uso:
+    python catalogo.py importar fornecedor.csv
+    python catalogo.py exportar catalogo.parquet
+"""
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import database
+from database import conectar_leitura, importar_lote_produtos
+from instrumentacao import cronometrado
+
+TAMANHO_LOTE = 5_000
+MAX_ERROS_GUARDADOS = 1_000
+
+COLUNAS_IMPORTACAO = ['sku', 'nome', 'marca', 'quantidade', 'preco_custo', 'preco_venda']
+COLUNAS_EXPORTACAO = ['id', 'sku', 'nome', 'marca', 'quantidade', 'preco_custo', 'preco_venda']
+
+
+def _formato(nome_arquivo, formato=None):
+    formato = (formato or os.path.splitext(str(nome_arquivo))[1].lstrip('.')).lower()
+    if formato not in ('csv', 'parquet'):
+        raise ValueError(f"Formato não suportado: '{formato}' (use csv ou parquet).")
+    return formato
+
+# ============================================
+# IMPORTAÇÃO
+# ============================================
+
+def _lotes_csv(arquivo, separador):
+    """DataFrames de texto, um por lote, e a fração do arquivo já lida."""
+    tamanho = getattr(arquivo, 'size', None)
+    if tamanho is None:
+        arquivo.seek(0, io.SEEK_END)
+        tamanho = arquivo.tell()
+        arquivo.seek(0)
+    leitor = pd.read_csv(arquivo, sep=separador, dtype=str, keep_default_na=False,
+                         chunksize=TAMANHO_LOTE, encoding='utf-8-sig')
+    for lote in leitor:
+        yield lote, (min(arquivo.tell() / tamanho, 1.0) if tamanho else 1.0)
+
+
+def _lotes_parquet(arquivo):
+    parquet = pq.ParquetFile(arquivo)
+    colunas = [c for c in COLUNAS_IMPORTACAO if c in parquet.schema_arrow.names]
+    total = max(parquet.metadata.num_rows, 1)
+    lidas = 0
+    for batch in parquet.iter_batches(batch_size=TAMANHO_LOTE, columns=colunas):
+        lote = batch.to_pandas().astype(object).where(lambda df: df.notna(), '')
+        lidas += len(lote)
+        yield lote.astype(str), lidas / total
+
+
+def _numeros(serie):
+    # Aceita vírgula decimal (planilhas em português)
+    return pd.to_numeric(serie.str.strip().str.replace(',', '.', regex=False), errors='coerce')
+
+
+def validar_lote(lote):
+    """
+    Normaliza um lote (colunas em texto) e separa o que é válido.
+    Retorna (linhas para importar_lote_produtos, [(índice, sku, mensagem)]).
+    """
+    for coluna in COLUNAS_IMPORTACAO:
+        if coluna not in lote.columns:
+            lote[coluna] = ''
+    df = pd.DataFrame({
+        'sku': lote['sku'].str.strip(),
+        'nome': lote['nome'].str.strip(),
+        'marca': lote['marca'].str.strip(),
+        'quantidade': _numeros(lote['quantidade'].replace('', '0')),
+        'preco_custo': _numeros(lote['preco_custo'].replace('', '0')),
+        'preco_venda': _numeros(lote['preco_venda'].replace('', '0')),
+    }, index=lote.index)
+
+    problemas = [
+        (df['sku'] == '', "SKU obrigatório"),
+        (df['nome'] == '', "Nome obrigatório"),
+        (df['quantidade'].isna() | (df['quantidade'] % 1 != 0) | (df['quantidade'] < 0),
+         "Quantidade deve ser um inteiro não negativo"),
+        (df['preco_custo'].isna() | (df['preco_custo'] < 0), "Preço de custo inválido"),
+        (df['preco_venda'].isna() | (df['preco_venda'] < 0), "Preço de venda inválido"),
+    ]
+    erros = []
+    invalidas = pd.Series(False, index=df.index)
+    for mascara, mensagem in problemas:
+        novas = mascara & ~invalidas  # uma mensagem por linha (a primeira)
+        erros.extend((i, df.at[i, 'sku'], mensagem) for i in df.index[novas])
+        invalidas |= mascara
+
+    validas = df[~invalidas]
+    linhas = list(zip(
+        validas['sku'], validas['nome'], validas['marca'].replace('', 'Marca Padrão'),
+        validas['quantidade'].astype('int64').tolist(),
+        validas['preco_custo'].astype(float).tolist(),
+        validas['preco_venda'].astype(float).tolist(),
+    ))
+    return linhas, sorted(erros)
+
+
+@cronometrado
+def importar_produtos(arquivo, formato=None, separador=',', progresso=None):
+    """
+    Importa um arquivo (caminho ou objeto aberto em modo binário, como o
+    UploadedFile do Streamlit), um lote/transação por vez.
+    `progresso(fracao, resultado)` é chamado depois de cada lote.
+    Retorna um dict com lidas, inseridos, atualizados, total_erros e erros
+    [(linha, sku, mensagem)], sendo linha a posição no arquivo (1 = primeira
+    linha de dados).
+    """
+    formato = _formato(getattr(arquivo, 'name', arquivo), formato)
+    resultado = {'lidas': 0, 'inseridos': 0, 'atualizados': 0, 'total_erros': 0, 'erros': []}
+
+    aberto = open(arquivo, 'rb') if isinstance(arquivo, (str, os.PathLike)) else arquivo
+    try:
+        lotes = _lotes_csv(aberto, separador) if formato == 'csv' else _lotes_parquet(aberto)
+        for lote, fracao in lotes:
+            lote.index = range(resultado['lidas'] + 1, resultado['lidas'] + 1 + len(lote))
+            resultado['lidas'] += len(lote)
+            linhas, erros = validar_lote(lote)
+            try:
+                inseridos, atualizados = importar_lote_produtos(linhas)
+                resultado['inseridos'] += inseridos
+                resultado['atualizados'] += atualizados
+            except sqlite3.Error as e:
+                # O lote inteiro voltou atrás: todas as suas linhas válidas falharam
+                com_erro = {linha for linha, _, _ in erros}
+                erros = sorted(erros + [
+                    (linha, sku.strip(), f"Erro no banco: {e}")
+                    for linha, sku in zip(lote.index, lote['sku']) if linha not in com_erro
+                ])
+            resultado['total_erros'] += len(erros)
+            espaco = MAX_ERROS_GUARDADOS - len(resultado['erros'])
+            resultado['erros'].extend(erros[:max(espaco, 0)])
+            if progresso:
+                progresso(fracao, resultado)
+    finally:
+        if aberto is not arquivo:
+            aberto.close()
+    return resultado
+
+# ============================================
+# EXPORTAÇÃO
+# ============================================
+
+def _lotes_catalogo():
+    conn = conectar_leitura()
+    cursor = conn.execute(f"SELECT {', '.join(COLUNAS_EXPORTACAO)} FROM produtos ORDER BY id")
+    try:
+        while True:
+            linhas = cursor.fetchmany(TAMANHO_LOTE)
+            if not linhas:
+                break
+            yield linhas
+    finally:
+        conn.close()
+
+
+@cronometrado
+def exportar_produtos(destino, formato=None):
+    """
+    Grava o catálogo em `destino` (caminho ou objeto binário aberto), lote a
+    lote. Retorna o número de produtos exportados.
+    """
+    formato = _formato(getattr(destino, 'name', destino), formato)
+    total = 0
+    if formato == 'csv':
+        aberto = open(destino, 'wb') if isinstance(destino, (str, os.PathLike)) else destino
+        texto = io.TextIOWrapper(aberto, encoding='utf-8', newline='')
+        try:
+            escritor = csv.writer(texto)
+            escritor.writerow(COLUNAS_EXPORTACAO)
+            for linhas in _lotes_catalogo():
+                escritor.writerows(linhas)
+                total += len(linhas)
+        finally:
+            texto.flush()
+            texto.detach()  # não fecha o arquivo de quem chamou
+            if aberto is not destino:
+                aberto.close()
+        return total
+
+    esquema = pa.schema([
+        ('id', pa.int64()), ('sku', pa.string()), ('nome', pa.string()),
+        ('marca', pa.string()), ('quantidade', pa.int64()),
+        ('preco_custo', pa.float64()), ('preco_venda', pa.float64()),
+    ])
+    with pq.ParquetWriter(destino, esquema, compression='zstd') as escritor:
+        for linhas in _lotes_catalogo():
+            colunas = list(zip(*linhas))
+            escritor.write_batch(pa.record_batch(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+                schema=esquema
+            ))
+            total += len(linhas)
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Importa/exporta o catálogo de produtos")
+    parser.add_argument('comando', choices=['importar', 'exportar'])
+    parser.add_argument('arquivo')
+    parser.add_argument('--banco', default=database.CAMINHO_DB)
+    parser.add_argument('--formato', choices=['csv', 'parquet'],
+                        help="padrão: pela extensão do arquivo")
+    parser.add_argument('--separador', default=',', help="separador do CSV (padrão: vírgula)")
+    args = parser.parse_args()
+
+    database.CAMINHO_DB = args.banco
+    database.criar_tabelas()
+
+    if args.comando == 'exportar':
+        total = exportar_produtos(args.arquivo, args.formato)
+        print(f"{total} produto(s) exportado(s) para {args.arquivo}.")
+    else:
+        def mostrar(fracao, parcial):
+            print(f"\r{fracao:6.1%}  {parcial['lidas']} linha(s)", end='', file=sys.stderr)
+
+        resultado = importar_produtos(args.arquivo, args.formato, args.separador, mostrar)
+        print(file=sys.stderr)
+        print(f"{resultado['lidas']} linha(s): {resultado['inseridos']} novo(s), "
+              f"{resultado['atualizados']} atualizado(s), {resultado['total_erros']} erro(s).")
+        for linha, sku, mensagem in resultado['erros'][:50]:
+            print(f"  linha {linha} (SKU {sku or '-'}): {mensagem}")
@@ -1,12 +1,435 @@
+import json
+import os
 import sqlite3
+import queue
+import threading
+import weakref
+from concurrent.futures import Future, TimeoutError as FuturoTimeout
+from contextlib import contextmanager
+
+import instrumentacao
+from instrumentacao import cronometrado
+
+CAMINHO_DB = 'gestao.db'
+
+# Ajustes aplicados uma única vez, quando a conexão é aberta
+PRAGMAS_ESCRITA = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",  # 256 MB
+    "PRAGMA cache_size=-20000",    # ~20 MB
+)
+
+PRAGMAS_LEITURA = (
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA query_only=1",
+)
+
+MAX_CONEXOES_OCIOSAS = 8
+
+_local = threading.local()
+_ociosas = {}  # (caminho, somente_leitura) -> conexões livres para reuso
+_lock_pool = threading.Lock()
+
+
+def caminho_db():
+    """
+    Banco da thread atual: o escolhido com selecionar_banco/usando_banco
+    (uma loja) ou, se nenhum, CAMINHO_DB.
+    """
+    return getattr(_local, 'caminho_db', None) or CAMINHO_DB
+
+
+def selecionar_banco(caminho):
+    """Faz a thread atual (um rerun do Streamlit, uma requisição) usar `caminho`."""
+    _local.caminho_db = caminho
+
+
+@contextmanager
+def usando_banco(caminho):
+    """Usa `caminho` dentro do bloco e depois volta ao banco anterior da thread."""
+    anterior = getattr(_local, 'caminho_db', None)
+    _local.caminho_db = caminho
+    try:
+        yield
+    finally:
+        _local.caminho_db = anterior
+
+
+class ConexaoReutilizavel(sqlite3.Connection):
+    """
+    Conexão mantida aberta e reaproveitada pela thread (sessão do Streamlit).
+    O close() apenas desfaz o que ficou pendente; a conexão volta para o pool.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def fechar_de_verdade(self):
+        super().close()
+
+    # Com a instrumentação ligada, todo SQL passa pelo CursorInstrumentado
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = instrumentacao.CursorInstrumentado if instrumentacao.ativo else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        if not instrumentacao.ativo:
+            return super().execute(sql, parametros)
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, sequencia):
+        if not instrumentacao.ativo:
+            return super().executemany(sql, sequencia)
+        return self.cursor().executemany(sql, sequencia)
+
+    def commit(self):
+        if not instrumentacao.ativo:
+            return super().commit()
+        with instrumentacao.medir_sql('COMMIT'):
+            super().commit()
+
+
+class _Emprestimo:
+    """
+    Conexões emprestadas a uma thread. O Streamlit usa uma thread nova a cada
+    rerun: quando ela termina, este objeto é coletado e as conexões voltam
+    para o pool em vez de serem fechadas.
+    """
+
+    def __init__(self):
+        self.conexoes = {}
+        weakref.finalize(self, _devolver_ao_pool, self.conexoes)
+
+
+def _devolver_ao_pool(conexoes):
+    for chave, conn in conexoes.items():
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.ProgrammingError:
+            continue  # já fechada
+        with _lock_pool:
+            livres = _ociosas.setdefault(chave, [])
+            if len(livres) < MAX_CONEXOES_OCIOSAS:
+                livres.append(conn)
+                continue
+        conn.fechar_de_verdade()
+    conexoes.clear()
+
+
+def _abrir(caminho, somente_leitura):
+    if somente_leitura:
+        if not os.path.exists(caminho):
+            # O arquivo (e o modo WAL) nasce pela conexão de escrita
+            conectar()
+        uri = f"file:{os.path.abspath(caminho)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, factory=ConexaoReutilizavel,
+                               check_same_thread=False)
+        pragmas = PRAGMAS_LEITURA
+    else:
+        conn = sqlite3.connect(caminho, factory=ConexaoReutilizavel,
+                               check_same_thread=False)
+        pragmas = PRAGMAS_ESCRITA
+
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+def _conexao_da_thread(somente_leitura):
+    # Cada thread usa só as suas conexões; check_same_thread=False serve apenas
+    # para que elas possam mudar de dona ao passar pelo pool
+    emprestimo = getattr(_local, 'emprestimo', None)
+    if emprestimo is None:
+        emprestimo = _local.emprestimo = _Emprestimo()
+
+    caminho = caminho_db()
+    chave = (caminho, somente_leitura)
+    conn = emprestimo.conexoes.get(chave)
+    if conn is None:
+        with _lock_pool:
+            livres = _ociosas.get(chave)
+            conn = livres.pop() if livres else None
+        if conn is None:
+            conn = _abrir(caminho, somente_leitura)
+        emprestimo.conexoes[chave] = conn
+    elif conn.in_transaction:
+        # Sobra de um uso anterior que não chegou a fazer commit/close
+        conn.rollback()
+    instrumentacao.preparar_conexao(conn)
+    return conn
+
 
 def conectar():
-    return sqlite3.connect('gestao.db')
+    """Conexão de escrita reaproveitada pela thread atual."""
+    return _conexao_da_thread(somente_leitura=False)
 
-def criar_tabelas():
-    conn = conectar()
-    cursor = conn.cursor()
 
+def conectar_leitura():
+    """
+    Conexão somente leitura para consultas analíticas.
+    Em WAL, leitores não bloqueiam a escrita do PDV (e vice-versa).
+    """
+    return _conexao_da_thread(somente_leitura=True)
+
+
+def fechar_conexoes():
+    """
+    Encerra os escritores e fecha de fato as conexões da thread atual e as
+    ociosas do pool.
+    """
+    parar_escritores()
+    emprestimo = getattr(_local, 'emprestimo', None)
+    if emprestimo is not None:
+        for conn in emprestimo.conexoes.values():
+            conn.fechar_de_verdade()
+        emprestimo.conexoes.clear()
+    with _lock_pool:
+        for livres in _ociosas.values():
+            for conn in livres:
+                conn.fechar_de_verdade()
+        _ociosas.clear()
+
+# ============================================
+# VERSÃO DOS DADOS (invalidação de cache)
+# ============================================
+
+_lock_versao = threading.Lock()
+_contador_escritas = {}  # banco -> escritas feitas por este processo
+_observadores = {}
+
+def _registrar_escrita():
+    """Chamado pelos helpers de escrita depois de cada commit."""
+    caminho = caminho_db()
+    with _lock_versao:
+        _contador_escritas[caminho] = _contador_escritas.get(caminho, 0) + 1
+
+def versao_dados():
+    """
+    Identifica o estado atual do banco da thread: muda a cada escrita feita
+    por este processo (contador) ou por qualquer outro (PRAGMA data_version de
+    uma conexão observadora que nunca escreve).
+    """
+    caminho = caminho_db()
+    with _lock_versao:
+        observador = _observadores.get(caminho)
+        if observador is None:
+            conectar()  # garante que o arquivo exista
+            observador = _observadores[caminho] = sqlite3.connect(
+                caminho, check_same_thread=False
+            )
+        data_version = observador.execute("PRAGMA data_version").fetchone()[0]
+        return _contador_escritas.get(caminho, 0), data_version
+
+def _colunas(cursor, tabela):
+    cursor.execute(f"PRAGMA table_info({tabela})")
+    return {linha[1] for linha in cursor.fetchall()}
+
+# ============================================
+# ESCRITOR ÚNICO (fila de comandos com group commit)
+# ============================================
+# Cada banco tem uma thread escritora, dona da única conexão que grava nele.
+# As escritas do app viram comandos (funções que recebem o cursor) postos na
+# fila com um Future; o escritor junta no mesmo lote tudo o que chegou
+# enquanto o lote anterior gravava e faz um só commit para todos. Não há
+# espera artificial: um comando espera no máximo o lote em andamento e o seu.
+# Cada comando roda num SAVEPOINT, então o erro de um não desfaz os outros.
+# Se a própria thread cai (banco que não abre, conexão quebrada), os comandos
+# pendentes falham com o erro e a próxima escrita cria um escritor novo.
+# Manutenção que precisa da conexão fora de transação (escrever_exclusivo)
+# fecha o lote e roda sozinha; as escritas do app esperam na fila.
+
+MAX_COMANDOS_POR_LOTE = 64
+ESPERA_MAXIMA_ESCRITA = 60  # segundos na fila antes de desistir do comando
+
+_escritores = {}  # banco -> _Escritor
+_lock_escritores = threading.Lock()
+
+
+class Desfazer(Exception):
+    """Levantada por um comando para desfazer só o que ele gravou e ainda devolver `resultado`."""
+
+    def __init__(self, resultado):
+        super().__init__(resultado)
+        self.resultado = resultado
+
+
+class _Escritor:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.fila = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._rodar, name=f'escritor:{caminho}',
+                                       daemon=True)
+        self.thread.start()
+
+    def enviar(self, comando, args, exclusivo=False):
+        futuro = Future()
+        # O SQL do comando entra na execução (rerun, requisição) de quem pediu
+        self.fila.put((comando, args, futuro, instrumentacao.contexto_atual(), exclusivo))
+        return futuro
+
+    def _proximo_lote(self):
+        # Bloqueia pelo primeiro comando e leva junto os que já estão na fila,
+        # até um exclusivo (que fecha o lote)
+        lote = [self.fila.get()]
+        while (lote[-1] is not None and not lote[-1][4]
+               and len(lote) < MAX_COMANDOS_POR_LOTE):
+            try:
+                lote.append(self.fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _rodar(self):
+        lote = []
+        try:
+            selecionar_banco(self.caminho)
+            conn = _abrir(self.caminho, somente_leitura=False)
+            try:
+                while True:
+                    lote = self._proximo_lote()
+                    # Comandos desistidos por quem esperava (ver escrever) não rodam
+                    comandos = [c for c in lote
+                                if c is not None and c[2].set_running_or_notify_cancel()]
+                    exclusivo = comandos.pop() if comandos and comandos[-1][4] else None
+                    if comandos:
+                        self._gravar(conn, comandos)
+                    if exclusivo:
+                        self._rodar_exclusivo(conn, exclusivo)
+                    if lote[-1] is None:
+                        return
+            finally:
+                conn.fechar_de_verdade()
+        except Exception as e:
+            self._encerrar_com_erro(e, lote)
+
+    def _encerrar_com_erro(self, erro, lote):
+        # Sai do registro antes de esvaziar a fila: escrever() só enfileira
+        # com o lock, então depois disto ninguém mais põe comando aqui
+        with _lock_escritores:
+            if _escritores.get(self.caminho) is self:
+                del _escritores[self.caminho]
+        pendentes = list(lote)
+        while True:
+            try:
+                pendentes.append(self.fila.get_nowait())
+            except queue.Empty:
+                break
+        for item in pendentes:
+            if item is not None and not item[2].done():
+                item[2].set_exception(erro)
+
+    def _gravar(self, conn, comandos):
+        instrumentacao.preparar_conexao(conn)
+        cursor = conn.cursor()
+        respostas = []
+        # BEGIN e COMMIT são do lote: ficam na execução do primeiro comando
+        try:
+            with instrumentacao.na_execucao(comandos[0][3]):
+                cursor.execute("BEGIN IMMEDIATE")
+            for comando, args, futuro, contexto, _ in comandos:
+                with instrumentacao.na_execucao(contexto):
+                    cursor.execute("SAVEPOINT comando")
+                    try:
+                        respostas.append((futuro, comando(cursor, *args), None))
+                    except Desfazer as d:
+                        cursor.execute("ROLLBACK TO comando")
+                        respostas.append((futuro, d.resultado, None))
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO comando")
+                        respostas.append((futuro, None, e))
+                    cursor.execute("RELEASE comando")
+            with instrumentacao.na_execucao(comandos[0][3]):
+                conn.commit()
+        except Exception as e:
+            # Sem commit, nenhum comando do lote foi gravado
+            conn.rollback()
+            for _, _, futuro, _, _ in comandos:
+                futuro.set_exception(e)
+            return
+        _registrar_escrita()
+        # Só depois do commit: quem esperava já lê os próprios dados
+        for futuro, valor, erro in respostas:
+            if erro is None:
+                futuro.set_result(valor)
+            else:
+                futuro.set_exception(erro)
+
+    def _rodar_exclusivo(self, conn, item):
+        comando, args, futuro, contexto, _ = item
+        instrumentacao.preparar_conexao(conn)
+        with instrumentacao.na_execucao(contexto):
+            try:
+                valor = comando(conn, *args)
+            except Exception as e:
+                conn.close()  # desfaz a transação que ficou aberta
+                futuro.set_exception(e)
+                return
+            conn.close()
+        _registrar_escrita()
+        futuro.set_result(valor)
+
+
+def _enviar(comando, args, exclusivo=False):
+    caminho = caminho_db()
+    with _lock_escritores:
+        escritor = _escritores.get(caminho)
+        if escritor is None:
+            escritor = _escritores[caminho] = _Escritor(caminho)
+        return escritor.enviar(comando, args, exclusivo)
+
+
+def escrever(comando, *args):
+    """
+    Executa comando(cursor, *args) na thread escritora do banco atual e
+    devolve o seu retorno (ou levanta a sua exceção) depois do commit.
+    sqlite3.OperationalError se o comando esperou ESPERA_MAXIMA_ESCRITA na
+    fila sem começar (e aí ele não roda mais).
+    """
+    futuro = _enviar(comando, args)
+    try:
+        return futuro.result(timeout=ESPERA_MAXIMA_ESCRITA)
+    except FuturoTimeout:
+        if futuro.cancel():
+            raise sqlite3.OperationalError(
+                "O banco não respondeu a tempo; nada foi gravado."
+            ) from None
+    # Já estava gravando: o escritor responde (ou falha) ao fim do lote
+    return futuro.result()
+
+
+def escrever_exclusivo(comando, *args):
+    """
+    Executa comando(conexão, *args) na thread escritora, fora de lote: o
+    comando abre e fecha as próprias transações na conexão de escrita, e as
+    escritas do app que chegarem enquanto ele roda esperam na fila em vez de
+    falhar com "database is locked". Para manutenção que não cabe num
+    comando comum (ex.: restaurar pela API de backup). Espera sem limite.
+    """
+    return _enviar(comando, args, exclusivo=True).result()
+
+
+def parar_escritores():
+    """Grava o que estiver na fila e encerra as threads escritoras."""
+    with _lock_escritores:
+        escritores = list(_escritores.values())
+        _escritores.clear()
+        for escritor in escritores:
+            escritor.fila.put(None)
+    for escritor in escritores:
+        escritor.thread.join()
+
+# ============================================
+# MIGRAÇÕES (versão guardada em PRAGMA user_version)
+# ============================================
+
+def _migracao_001_tabelas_base(cursor):
     # Tabela de Produtos (Estoque)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS produtos (
@@ -19,6 +442,10 @@ def criar_tabelas():
         )
     ''')
 
+    # Bancos antigos foram criados sem a coluna marca
+    if 'marca' not in _colunas(cursor, 'produtos'):
+        cursor.execute("ALTER TABLE produtos ADD COLUMN marca TEXT")
+
     # Tabela de Vendas
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS vendas (
@@ -30,12 +457,7 @@ def criar_tabelas():
             FOREIGN KEY (produto_id) REFERENCES produtos(id)
         )
     ''')
-    
-    try:
-        cursor.execute("ALTER TABLE produtos ADD COLUMN marca TEXT")
-    except sqlite3.OperationalError:
-        pass  # Coluna já existe
-    
+
     # Tabela de Movimentações
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS movimentacoes (
@@ -49,106 +471,1052 @@ def criar_tabelas():
         )
     ''')
 
-    conn.commit()
-    conn.close()
+def _migracao_002_pedidos(cursor):
+    # Tabela de Pedidos (cabeçalho que agrupa os itens de uma venda)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pedidos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data_pedido DATETIME DEFAULT CURRENT_TIMESTAMP,
+            valor_total REAL NOT NULL,
+            qtd_itens INTEGER NOT NULL
+        )
+    ''')
 
-if __name__ == '__main__':
-    criar_tabelas()
-    print("Banco de dados e tabelas criadas com sucesso.")
+    if 'pedido_id' not in _colunas(cursor, 'vendas'):
+        cursor.execute("ALTER TABLE vendas ADD COLUMN pedido_id INTEGER REFERENCES pedidos(id)")
+
+def _migracao_003_indices(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas(data_venda)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_produto ON vendas(produto_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_pedido ON vendas(pedido_id)")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movimentacoes_produto_data
+        ON movimentacoes(produto_id, data_movimento)
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos(nome)")
+
+def _migracao_004_vendas_diarias(cursor):
+    # Resumo diário por produto, mantido junto com cada venda/estorno
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vendas_diarias (
+            dia TEXT NOT NULL,
+            produto_id INTEGER NOT NULL,
+            faturamento REAL NOT NULL DEFAULT 0,
+            custo REAL NOT NULL DEFAULT 0,
+            lucro REAL NOT NULL DEFAULT 0,
+            unidades INTEGER NOT NULL DEFAULT 0,
+            num_vendas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, produto_id)
+        ) WITHOUT ROWID
+    ''')
+    # Custo atual do produto: as vendas só guardam o próprio custo a partir da 009
+    cursor.execute("""
+        INSERT INTO vendas_diarias
+            (dia, produto_id, faturamento, custo, lucro, unidades, num_vendas)
+        SELECT
+            date(v.data_venda),
+            v.produto_id,
+            SUM(v.valor_total),
+            SUM(p.preco_custo * v.quantidade),
+            SUM(v.valor_total - p.preco_custo * v.quantidade),
+            SUM(v.quantidade),
+            COUNT(*)
+        FROM vendas v
+        JOIN produtos p ON v.produto_id = p.id
+        GROUP BY date(v.data_venda), v.produto_id
+    """)
 
-def registrar_venda(produto_id, qtd_venda, valor_total): 
+def _migracao_005_busca_produtos(cursor):
+    # Código de barras / SKU: único quando informado
+    if 'sku' not in _colunas(cursor, 'produtos'):
+        cursor.execute("ALTER TABLE produtos ADD COLUMN sku TEXT")
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_produtos_sku
+        ON produtos(sku) WHERE sku IS NOT NULL
+    ''')
+
+    # Índice de texto (FTS5) sobre nome, marca e SKU, sincronizado por triggers
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS produtos_busca USING fts5(
+            nome, marca, sku,
+            content='produtos', content_rowid='id',
+            tokenize="unicode61 remove_diacritics 2",
+            prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS produtos_busca_ai AFTER INSERT ON produtos BEGIN
+            INSERT INTO produtos_busca (rowid, nome, marca, sku)
+            VALUES (new.id, new.nome, new.marca, new.sku);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS produtos_busca_ad AFTER DELETE ON produtos BEGIN
+            INSERT INTO produtos_busca (produtos_busca, rowid, nome, marca, sku)
+            VALUES ('delete', old.id, old.nome, old.marca, old.sku);
+        END
+    ''')
+    # Só reindexa quando muda algo buscável (baixas de estoque não tocam o índice)
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS produtos_busca_au
+        AFTER UPDATE OF nome, marca, sku ON produtos BEGIN
+            INSERT INTO produtos_busca (produtos_busca, rowid, nome, marca, sku)
+            VALUES ('delete', old.id, old.nome, old.marca, old.sku);
+            INSERT INTO produtos_busca (rowid, nome, marca, sku)
+            VALUES (new.id, new.nome, new.marca, new.sku);
+        END
+    ''')
+    cursor.execute("INSERT INTO produtos_busca (produtos_busca) VALUES ('rebuild')")
+
+def _migracao_006_vendas_arquivadas(cursor):
+    # Catálogo das partições mensais de vendas movidas para Parquet
+    # (ver arquivo_vendas.py): só o arquivo listado aqui vale para leitura
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vendas_arquivadas (
+            mes TEXT PRIMARY KEY,  -- AAAA-MM
+            arquivo TEXT NOT NULL,
+            linhas INTEGER NOT NULL,
+            menor_id INTEGER NOT NULL,
+            maior_id INTEGER NOT NULL,
+            arquivado_em DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _migracao_007_totais_produto(cursor):
+    # Totais acumulados por produto (histórico inteiro), para o ranking sem
+    # agrupar vendas: cada métrica tem índice, então o top-N lê só N linhas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS totais_produto (
+            produto_id INTEGER PRIMARY KEY REFERENCES produtos(id),
+            unidades INTEGER NOT NULL DEFAULT 0,
+            faturamento REAL NOT NULL DEFAULT 0,
+            lucro REAL NOT NULL DEFAULT 0,
+            num_vendas INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for coluna in ('unidades', 'faturamento', 'lucro'):
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_totais_produto_{coluna} ON totais_produto({coluna})"
+        )
+    _recalcular_totais_produto(cursor)
+
+def _migracao_008_razao_estoque(cursor):
+    # movimentacoes vira o razão de estoque: toda mudança de quantidade é uma
+    # linha com sinal (COMPRA/ESTORNO > 0, VENDA < 0, AJUSTE ±)
+    colunas = _colunas(cursor, 'movimentacoes')
+    if 'referencia_id' not in colunas:
+        cursor.execute("ALTER TABLE movimentacoes ADD COLUMN referencia_id INTEGER")  # venda
+    if 'observacao' not in colunas:
+        cursor.execute("ALTER TABLE movimentacoes ADD COLUMN observacao TEXT")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_movimentacoes_data ON movimentacoes(data_movimento)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_movimentacoes_referencia ON movimentacoes(referencia_id)"
+    )
+
+    # Vendas ainda no banco entram no razão com a data original
+    cursor.execute('''
+        INSERT INTO movimentacoes
+            (produto_id, tipo, quantidade, preco_custo_na_epoca, data_movimento, referencia_id)
+        SELECT v.produto_id, 'VENDA', -v.quantidade, p.preco_custo, v.data_venda, v.id
+        FROM vendas v
+        JOIN produtos p ON p.id = v.produto_id
+    ''')
+    # O que o histórico não explica (edições antigas, vendas arquivadas...)
+    # vira um saldo de abertura antes do primeiro movimento do produto
+    cursor.execute('''
+        INSERT INTO movimentacoes
+            (produto_id, tipo, quantidade, preco_custo_na_epoca, data_movimento, observacao)
+        SELECT p.id, 'AJUSTE', p.quantidade - COALESCE(m.saldo, 0), p.preco_custo,
+            COALESCE(m.primeiro, CURRENT_TIMESTAMP), 'Saldo de abertura'
+        FROM produtos p
+        LEFT JOIN (
+            SELECT produto_id, SUM(quantidade) as saldo, MIN(data_movimento) as primeiro
+            FROM movimentacoes GROUP BY produto_id
+        ) m ON m.produto_id = p.id
+        WHERE p.quantidade <> COALESCE(m.saldo, 0)
+    ''')
+
+    # Retratos periódicos do estoque: a posição numa data parte do último
+    # retrato anterior e soma só os movimentos depois dele
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots_estoque (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data_corte DATETIME NOT NULL UNIQUE,
+            criado_em DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshots_estoque_itens (
+            snapshot_id INTEGER NOT NULL REFERENCES snapshots_estoque(id),
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            custo_unitario REAL,
+            PRIMARY KEY (snapshot_id, produto_id)
+        ) WITHOUT ROWID
+    ''')
+
+def _migracao_009_custo_da_venda(cursor):
+    # Custo gravado na linha de venda no fechamento: editar o custo do produto
+    # não reescreve mais o lucro de vendas passadas
+    colunas = _colunas(cursor, 'vendas')
+    if 'custo_unitario' not in colunas:
+        cursor.execute("ALTER TABLE vendas ADD COLUMN custo_unitario REAL")
+    if 'custo_total' not in colunas:
+        cursor.execute("ALTER TABLE vendas ADD COLUMN custo_total REAL")
+    # Vendas antigas: o custo que o razão registrou na VENDA (ou o atual)
+    cursor.execute('''
+        UPDATE vendas SET custo_unitario = COALESCE(
+            (SELECT preco_custo_na_epoca FROM movimentacoes
+             WHERE referencia_id = vendas.id AND tipo = 'VENDA'),
+            (SELECT preco_custo FROM produtos WHERE id = vendas.produto_id)
+        )
+    ''')
+    cursor.execute("UPDATE vendas SET custo_total = custo_unitario * quantidade")
+
+    # Camadas de custo (uma por entrada ainda não consumida), para o FIFO.
+    # O estoque atual vira uma camada ao custo cadastrado
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS camadas_custo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL REFERENCES produtos(id),
+            quantidade INTEGER NOT NULL,  -- o que ainda resta da entrada
+            custo_unitario REAL NOT NULL,
+            data_entrada DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_camadas_custo_produto ON camadas_custo(produto_id, id)"
+    )
+    cursor.execute('''
+        INSERT INTO camadas_custo (produto_id, quantidade, custo_unitario)
+        SELECT id, quantidade, preco_custo FROM produtos WHERE quantidade > 0
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS configuracoes (
+            chave TEXT PRIMARY KEY,
+            valor TEXT NOT NULL
+        )
+    ''')
+    cursor.execute(
+        "INSERT OR IGNORE INTO configuracoes (chave, valor) VALUES ('metodo_custo', 'MEDIO')"
+    )
+
+    # Dias com vendas no banco passam a somar o custo gravado; os arquivados
+    # (sempre anteriores) ficam como estão
+    cursor.execute("SELECT MIN(data_venda) FROM vendas")
+    desde = cursor.fetchone()[0]
+    if desde is not None:
+        _recalcular_vendas_diarias(cursor, desde)
+        _recalcular_totais_produto(cursor)
+
+def _migracao_010_snapshot_ultimo_movimento(cursor):
+    # O snapshot passa a guardar o último movimento que incluiu: o corte tem
+    # resolução de segundo, e um movimento gravado no mesmo segundo logo
+    # depois do snapshot ficava fora dele e também da cauda
+    if 'ultimo_movimento_id' not in _colunas(cursor, 'snapshots_estoque'):
+        cursor.execute("ALTER TABLE snapshots_estoque ADD COLUMN ultimo_movimento_id INTEGER")
+    # Os snapshots já gravados podem ter perdido movimentos assim: são
+    # refeitos a partir do razão, que nunca é podado
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimentacoes")
+    cursor.execute(
+        "UPDATE snapshots_estoque SET ultimo_movimento_id = ?", (cursor.fetchone()[0],)
+    )
+    cursor.execute("DELETE FROM snapshots_estoque_itens")
+    cursor.execute('''
+        INSERT INTO snapshots_estoque_itens (snapshot_id, produto_id, quantidade, custo_unitario)
+        SELECT snapshot_id, produto_id, quantidade, custo
+        FROM (
+            SELECT s.id as snapshot_id, m.produto_id, SUM(m.quantidade) as quantidade,
+                m.preco_custo_na_epoca as custo,
+                MAX(m.data_movimento || printf('%015d', m.id))
+            FROM snapshots_estoque s
+            JOIN movimentacoes m ON m.data_movimento <= s.data_corte
+            GROUP BY s.id, m.produto_id
+        )
+    ''')
+
+def _migracao_011_custo_do_estoque(cursor):
+    # A posição numa data passa a ser valorizada pelo custo do estoque depois
+    # de cada movimento (camadas abertas), não pelo custo do próprio
+    # movimento: 10 a 2,00 e depois 10 a 4,00 valiam 20 x 4,00
+    if 'custo_estoque' not in _colunas(cursor, 'movimentacoes'):
+        cursor.execute("ALTER TABLE movimentacoes ADD COLUMN custo_estoque REAL")
+    # As camadas do passado não foram guardadas: os movimentos antigos ficam
+    # com o próprio custo e o último de cada produto, com o das camadas atuais
+    cursor.execute("UPDATE movimentacoes SET custo_estoque = preco_custo_na_epoca")
+    cursor.execute('''
+        UPDATE movimentacoes SET custo_estoque = NULL
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, MAX(data_movimento || printf('%015d', id))
+                FROM movimentacoes GROUP BY produto_id
+            )
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_movimentacoes_sem_custo
+        ON movimentacoes(id) WHERE custo_estoque IS NULL
+    ''')
+    _custear_estoque(cursor)
+    # Snapshots: o custo do último movimento que cada um incluiu
+    cursor.execute('''
+        UPDATE snapshots_estoque_itens SET custo_unitario = COALESCE((
+            SELECT m.custo_estoque
+            FROM snapshots_estoque s
+            JOIN movimentacoes m ON m.produto_id = snapshots_estoque_itens.produto_id
+                AND m.data_movimento <= s.data_corte AND m.id <= s.ultimo_movimento_id
+            WHERE s.id = snapshots_estoque_itens.snapshot_id
+            ORDER BY m.data_movimento DESC, m.id DESC LIMIT 1
+        ), custo_unitario)
+    ''')
+
+def _migracao_012_vendas_por_produto(cursor):
+    # Histórico filtrado por produto (mais recente primeiro, paginado por
+    # (data_venda, id)): com o índice só em produto_id, o SQLite ordenava
+    # todas as vendas do produto numa B-tree temporária a cada página
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_vendas_produto_data
+        ON vendas(produto_id, data_venda, id)
+    ''')
+    # As buscas só por produto_id usam o prefixo do novo
+    cursor.execute("DROP INDEX IF EXISTS idx_vendas_produto")
+
+# A posição na lista é o número da migração: nunca reordenar, só acrescentar
+MIGRACOES = [
+    _migracao_001_tabelas_base,
+    _migracao_002_pedidos,
+    _migracao_003_indices,
+    _migracao_004_vendas_diarias,
+    _migracao_005_busca_produtos,
+    _migracao_006_vendas_arquivadas,
+    _migracao_007_totais_produto,
+    _migracao_008_razao_estoque,
+    _migracao_009_custo_da_venda,
+    _migracao_010_snapshot_ultimo_movimento,
+    _migracao_011_custo_do_estoque,
+    _migracao_012_vendas_por_produto,
+]
+
+def versao_schema(conn=None):
+    conn = conn or conectar()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+@cronometrado
+def aplicar_migracoes():
+    """
+    Aplica, em ordem, as migrações com número acima de PRAGMA user_version.
+    Cada uma roda na sua própria transação junto com o novo número de versão,
+    então nunca é aplicada duas vezes (nem por dois processos ao mesmo tempo).
+    """
     conn = conectar()
+    # Banco em dia (o caso comum): basta ler a versão, sem pegar o lock de escrita
+    if versao_schema(conn) >= len(MIGRACOES):
+        conn.close()
+        return 0
     cursor = conn.cursor()
-    
-    # Busca estoque atual
-    cursor.execute("SELECT quantidade FROM produtos WHERE id = ?", (produto_id,))
-    estoque_atual = cursor.fetchone()[0]
-    
-    if estoque_atual >= qtd_venda:
-        # Registra a venda com o valor total
+    aplicadas = 0
+    while True:
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            versao = versao_schema(conn)
+            if versao >= len(MIGRACOES):
+                conn.commit()
+                break
+            MIGRACOES[versao](cursor)
+            cursor.execute(f"PRAGMA user_version = {versao + 1}")
+            conn.commit()
+            _registrar_escrita()
+            aplicadas += 1
+        except Exception:
+            conn.rollback()
+            raise
+
+    if aplicadas:
+        cursor.execute("PRAGMA optimize")
+    conn.close()
+    return aplicadas
+
+def criar_tabelas():
+    aplicar_migracoes()
+
+# ============================================
+# RESUMOS DE VENDAS (vendas_diarias e totais_produto)
+# ============================================
+
+def _somar_venda_diaria(cursor, data_venda, produto_id, qtd, valor_total, custo_total,
+                        sinal=1):
+    """
+    Soma (sinal=1) ou retira (sinal=-1) uma linha de venda do resumo do dia
+    e dos totais do produto, na transação de quem chamou. O custo é o que
+    ficou gravado na venda.
+    """
+    faturamento, custo, unidades = sinal * valor_total, sinal * custo_total, sinal * qtd
+    cursor.execute("""
+        INSERT INTO vendas_diarias
+            (dia, produto_id, faturamento, custo, lucro, unidades, num_vendas)
+        VALUES (date(?), ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (dia, produto_id) DO UPDATE SET
+            faturamento = faturamento + excluded.faturamento,
+            custo = custo + excluded.custo,
+            lucro = lucro + excluded.lucro,
+            unidades = unidades + excluded.unidades,
+            num_vendas = num_vendas + excluded.num_vendas
+    """, (data_venda, produto_id, faturamento, custo, faturamento - custo, unidades, sinal))
+
+    cursor.execute("""
+        INSERT INTO totais_produto (produto_id, unidades, faturamento, lucro, num_vendas)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (produto_id) DO UPDATE SET
+            unidades = unidades + excluded.unidades,
+            faturamento = faturamento + excluded.faturamento,
+            lucro = lucro + excluded.lucro,
+            num_vendas = num_vendas + excluded.num_vendas
+    """, (produto_id, unidades, faturamento, faturamento - custo, sinal))
+
+    if sinal < 0:
         cursor.execute("""
-            INSERT INTO vendas (produto_id, quantidade, valor_total) 
-            VALUES (?, ?, ?)
-        """, (produto_id, qtd_venda, valor_total))
-        
-        # Baixa no estoque
-        cursor.execute("UPDATE produtos SET quantidade = quantidade - ? WHERE id = ?", 
-                       (qtd_venda, produto_id))
-        
-        conn.commit()
-        conn.close()
-        return True, "Venda realizada!"
-    
+            DELETE FROM vendas_diarias
+            WHERE dia = date(?) AND produto_id = ? AND num_vendas <= 0
+        """, (data_venda, produto_id))
+        cursor.execute(
+            "DELETE FROM totais_produto WHERE produto_id = ? AND num_vendas <= 0",
+            (produto_id,)
+        )
+
+def _recalcular_vendas_diarias(cursor, desde=None, ate=None):
+    """
+    Refaz o resumo a partir da tabela vendas (só os dias a partir de `desde`
+    e, se informado, antes de `ate`).
+    """
+    desde, ate = desde or '', ate or '9999-12-31'
+    cursor.execute(
+        "DELETE FROM vendas_diarias WHERE dia >= substr(?, 1, 10) AND dia < substr(?, 1, 10)",
+        (desde, ate)
+    )
+    cursor.execute("""
+        INSERT INTO vendas_diarias
+            (dia, produto_id, faturamento, custo, lucro, unidades, num_vendas)
+        SELECT
+            date(data_venda),
+            produto_id,
+            SUM(valor_total),
+            SUM(custo_total),
+            SUM(valor_total - custo_total),
+            SUM(quantidade),
+            COUNT(*)
+        FROM vendas
+        WHERE data_venda >= substr(?, 1, 10) AND data_venda < substr(?, 1, 10)
+        GROUP BY date(data_venda), produto_id
+    """, (desde, ate))
+
+def _somar_vendas_arquivadas(cursor, mes=None):
+    # Import tardio: arquivo_vendas depende deste módulo (e do pyarrow)
+    import arquivo_vendas
+
+    cursor.executemany("""
+        INSERT INTO vendas_diarias
+            (dia, produto_id, faturamento, custo, lucro, unidades, num_vendas)
+        SELECT ?, id, ?, ?, ?, ?, ?
+        FROM produtos WHERE id = ?
+        ON CONFLICT (dia, produto_id) DO UPDATE SET
+            faturamento = faturamento + excluded.faturamento,
+            custo = custo + excluded.custo,
+            lucro = lucro + excluded.lucro,
+            unidades = unidades + excluded.unidades,
+            num_vendas = num_vendas + excluded.num_vendas
+    """, (
+        (dia, faturamento, custo, faturamento - custo, unidades, num_vendas, produto_id)
+        for dia, produto_id, faturamento, custo, unidades, num_vendas
+        in arquivo_vendas.resumo_diario_arquivado(cursor, mes)
+    ))
+
+def _recalcular_totais_produto(cursor):
+    # O resumo diário já inclui as vendas arquivadas
+    cursor.execute("DELETE FROM totais_produto")
+    cursor.execute("""
+        INSERT INTO totais_produto (produto_id, unidades, faturamento, lucro, num_vendas)
+        SELECT produto_id, SUM(unidades), SUM(faturamento), SUM(lucro), SUM(num_vendas)
+        FROM vendas_diarias
+        GROUP BY produto_id
+    """)
+
+def _reconstruir_mes(cursor, mes):
+    # O mês inteiro numa transação: uma venda feita entre dois meses
+    # reconstruídos soma no resumo como sempre, e o mês dela sai certo
+    ano, numero = map(int, mes.split('-'))
+    seguinte = f"{ano + numero // 12:04d}-{numero % 12 + 1:02d}-01"
+    _recalcular_vendas_diarias(cursor, f"{mes}-01", seguinte)
+    _somar_vendas_arquivadas(cursor, mes)
+
+def _reconstruir_totais(cursor):
+    _recalcular_totais_produto(cursor)
+    cursor.execute("SELECT COUNT(*) FROM vendas_diarias")
+    return cursor.fetchone()[0]
+
+@cronometrado
+def reconstruir_vendas_diarias():
+    """
+    Refaz do zero o resumo diário (a partir da tabela vendas e do arquivo
+    frio) e os totais por produto, um mês por comando do escritor: as
+    vendas seguem gravando entre um mês e outro. Retorna o número de linhas
+    do resumo.
+    """
+    conn = conectar_leitura()
+    meses = [linha[0] for linha in conn.execute("""
+        SELECT substr(dia, 1, 7) FROM vendas_diarias
+        UNION SELECT strftime('%Y-%m', data_venda) FROM vendas
+        UNION SELECT mes FROM vendas_arquivadas
+    """)]
     conn.close()
-    return False, "Estoque insuficiente!"
+    for mes in meses:
+        escrever(_reconstruir_mes, mes)
+    return escrever(_reconstruir_totais)
 
-def  atualizar_coluna_marca():
+# ============================================
+# RAZÃO DE ESTOQUE (movimentacoes) E SNAPSHOTS
+# ============================================
+
+DIAS_ENTRE_SNAPSHOTS = 7
+
+def _registrar_movimento(cursor, produto_id, tipo, quantidade, custo=None,
+                         data=None, referencia_id=None, observacao=None):
+    """
+    Lança uma linha no razão (quantidade com sinal), na transação de quem
+    chamou. Sem custo informado, usa o custo atual do produto.
+    """
+    cursor.execute('''
+        INSERT INTO movimentacoes
+            (produto_id, tipo, quantidade, preco_custo_na_epoca, data_movimento,
+             referencia_id, observacao)
+        SELECT id, ?, ?, COALESCE(?, preco_custo), COALESCE(?, CURRENT_TIMESTAMP), ?, ?
+        FROM produtos WHERE id = ?
+    ''', (tipo, quantidade, custo, data, referencia_id, observacao, produto_id))
+
+def _custear_estoque(cursor):
+    """
+    Grava nos movimentos ainda sem custo_estoque o custo unitário do estoque
+    depois deles: valor das camadas abertas / unidades (sem camadas, o custo
+    médio). É o custo que valoriza a posição numa data. Chamar no fim do
+    comando, depois de mexer nas camadas.
+    """
+    cursor.execute('''
+        UPDATE movimentacoes SET custo_estoque = (
+            SELECT COALESCE(
+                SUM(c.quantidade * c.custo_unitario) / NULLIF(SUM(c.quantidade), 0),
+                p.preco_custo
+            )
+            FROM produtos p
+            LEFT JOIN camadas_custo c ON c.produto_id = p.id
+            WHERE p.id = movimentacoes.produto_id
+        )
+        WHERE custo_estoque IS NULL
+    ''')
+
+def _registrar_snapshot(cursor, data_corte):
+    if data_corte is None:
+        cursor.execute("SELECT CURRENT_TIMESTAMP")
+        data_corte = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT 1 FROM snapshots_estoque WHERE data_corte = ?", (data_corte,)
+    )
+    if cursor.fetchone():
+        return None
+
+    cursor.execute('''
+        SELECT id, data_corte, ultimo_movimento_id FROM snapshots_estoque
+        WHERE data_corte < ? ORDER BY data_corte DESC LIMIT 1
+    ''', (data_corte,))
+    anterior_id, anterior_corte, anterior_ultimo = cursor.fetchone() or (None, '', 0)
+    # O snapshot cobre os movimentos até data_corte já gravados agora. Um
+    # lançado depois, mesmo no mesmo segundo ou com data retroativa, tem id
+    # maior e fica para a cauda (ver relatorios.estoque_em)
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimentacoes")
+    ultimo_id = cursor.fetchone()[0]
+
+    cursor.execute(
+        "INSERT INTO snapshots_estoque (data_corte, ultimo_movimento_id) VALUES (?, ?)",
+        (data_corte, ultimo_id)
+    )
+    snapshot_id = cursor.lastrowid
+    # O custo vem da linha mais recente (o do estoque depois dela): com MAX(),
+    # o SQLite tira as colunas soltas (custo) da mesma linha que tem o máximo
+    cursor.execute('''
+        INSERT INTO snapshots_estoque_itens (snapshot_id, produto_id, quantidade, custo_unitario)
+        SELECT ?, produto_id, quantidade, custo
+        FROM (
+            SELECT produto_id, SUM(quantidade) as quantidade, custo, MAX(ordem)
+            FROM (
+                SELECT produto_id, quantidade, custo_unitario as custo, '' as ordem
+                FROM snapshots_estoque_itens WHERE snapshot_id = ?
+                UNION ALL
+                SELECT produto_id, quantidade, custo_estoque,
+                    data_movimento || printf('%015d', id)
+                FROM movimentacoes
+                WHERE data_movimento > ? AND data_movimento <= ? AND id <= ?
+                UNION ALL
+                -- Gravados depois do snapshot anterior, com data até o corte dele
+                SELECT produto_id, quantidade, custo_estoque,
+                    data_movimento || printf('%015d', id)
+                FROM movimentacoes
+                WHERE id > ? AND id <= ? AND data_movimento <= ?
+            )
+            GROUP BY produto_id
+        )
+    ''', (snapshot_id, anterior_id, anterior_corte, data_corte, ultimo_id,
+          anterior_ultimo, ultimo_id, anterior_corte))
+    return snapshot_id
+
+@cronometrado
+def registrar_snapshot_estoque(data_corte=None):
+    """
+    Grava a posição de cada produto (quantidade e custo do estoque) até
+    `data_corte` (padrão: agora), a partir do snapshot anterior mais os
+    movimentos entre os dois. Retorna o id do snapshot, ou None se já existe
+    um com a mesma data de corte.
+    """
+    return escrever(_registrar_snapshot, data_corte)
+
+@cronometrado
+def snapshot_estoque_se_necessario(dias=DIAS_ENTRE_SNAPSHOTS):
+    """Cria um snapshot se o último tiver mais de `dias` (ou não houver nenhum)."""
     conn = conectar()
-    cursor = conn.cursor()
-    
+    vencido = conn.execute('''
+        SELECT COALESCE(MAX(data_corte), '') < datetime('now', ?)
+        FROM snapshots_estoque
+    ''', (f'-{int(dias)} days',)).fetchone()[0]
+    conn.close()
+    return registrar_snapshot_estoque() if vencido else None
+
+# ============================================
+# CUSTEIO (custo médio ponderado e FIFO)
+# ============================================
+# produtos.preco_custo é sempre o custo médio ponderado, refeito a cada
+# entrada. camadas_custo guarda o que resta de cada entrada, da mais antiga
+# para a mais nova. O método da loja (configuracoes.metodo_custo) decide qual
+# dos dois custos fica gravado na venda.
+
+METODOS_CUSTO = ('MEDIO', 'FIFO')
+
+def _metodo_custo(cursor):
+    cursor.execute("SELECT valor FROM configuracoes WHERE chave = 'metodo_custo'")
+    linha = cursor.fetchone()
+    return linha[0] if linha else 'MEDIO'
+
+def metodo_custo():
+    conn = conectar_leitura()
+    try:
+        return _metodo_custo(conn.cursor())
+    finally:
+        conn.close()
+
+def _definir_metodo_custo(cursor, metodo):
+    cursor.execute('''
+        INSERT INTO configuracoes (chave, valor) VALUES ('metodo_custo', ?)
+        ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor
+    ''', (metodo,))
+
+@cronometrado
+def definir_metodo_custo(metodo):
+    """Troca o método de custeio; vale para as vendas seguintes."""
+    if metodo not in METODOS_CUSTO:
+        raise ValueError(f"Método de custo inválido: '{metodo}' (use MEDIO ou FIFO).")
+    escrever(_definir_metodo_custo, metodo)
+
+def _abrir_camada(cursor, produto_id, quantidade, custo):
+    cursor.execute('''
+        INSERT INTO camadas_custo (produto_id, quantidade, custo_unitario)
+        VALUES (?, ?, ?)
+    ''', (produto_id, quantidade, custo))
+
+def _entrada_custo(cursor, produto_id, quantidade, custo):
+    """
+    Entrada de mercadoria (COMPRA, ESTORNO): refaz o custo médio e abre uma
+    camada. Chamar ANTES de somar a quantidade ao estoque.
+    Retorna o número de produtos encontrados (0 ou 1).
+    """
+    cursor.execute('''
+        UPDATE produtos SET preco_custo = CASE
+            WHEN quantidade > 0 THEN (quantidade * preco_custo + ? * ?) / (quantidade + ?)
+            ELSE ?
+        END
+        WHERE id = ?
+    ''', (quantidade, custo, quantidade, custo, produto_id))
+    encontrados = cursor.rowcount
+    if encontrados and quantidade > 0:
+        _abrir_camada(cursor, produto_id, quantidade, custo)
+    return encontrados
+
+def _saida_custo(cursor, produto_id, quantidade, metodo='MEDIO'):
+    """
+    Saída de mercadoria (venda, baixa manual): consome as camadas mais
+    antigas. Retorna o custo unitário da saída pelo `metodo`; o custo médio
+    não muda numa saída.
+    """
+    cursor.execute('''
+        SELECT id, quantidade, custo_unitario FROM camadas_custo
+        WHERE produto_id = ? ORDER BY id
+    ''', (produto_id,))
+    restante, valor = quantidade, 0.0
+    for camada_id, disponivel, custo in cursor.fetchall():
+        usada = min(restante, disponivel)
+        valor += usada * custo
+        restante -= usada
+        if usada == disponivel:
+            cursor.execute("DELETE FROM camadas_custo WHERE id = ?", (camada_id,))
+        else:
+            cursor.execute("UPDATE camadas_custo SET quantidade = quantidade - ? WHERE id = ?",
+                           (usada, camada_id))
+        if restante == 0:
+            break
+
+    cursor.execute("SELECT preco_custo FROM produtos WHERE id = ?", (produto_id,))
+    medio = cursor.fetchone()[0]
+    if metodo != 'FIFO' or quantidade <= 0:
+        return medio
+    # As camadas só não cobrem a saída se o estoque foi mexido por fora: o resto sai pelo médio
+    return (valor + restante * medio) / quantidade
+
+def _reavaliacao(cursor, produto_id, custo):
+    # Custo editado sem mudar a quantidade: uma linha de quantidade zero marca
+    # quando o estoque passou a valer o novo custo
+    _registrar_movimento(cursor, produto_id, 'AJUSTE', 0, custo, observacao='Custo editado')
+
+def _custo_editado(cursor, produto_id, nova_quantidade, novo_custo, ja_lancado=0):
+    """
+    Produto alterado à mão (editor de estoque), antes do UPDATE: um custo
+    diferente do atual reavalia as camadas abertas, e o AJUSTE de quantidade
+    abre uma camada (> 0) ou consome as mais antigas (< 0).
+    """
+    cursor.execute("SELECT quantidade, preco_custo FROM produtos WHERE id = ?", (produto_id,))
+    atual = cursor.fetchone()
+    if atual is None:
+        return
+    quantidade, custo = atual
+    ajuste = nova_quantidade - quantidade - ja_lancado
+    if novo_custo != custo:
+        cursor.execute("UPDATE camadas_custo SET custo_unitario = ? WHERE produto_id = ?",
+                       (novo_custo, produto_id))
+        if ajuste == 0 and not ja_lancado:
+            _reavaliacao(cursor, produto_id, novo_custo)
+    if ajuste > 0:
+        _abrir_camada(cursor, produto_id, ajuste, novo_custo)
+    elif ajuste < 0:
+        _saida_custo(cursor, produto_id, -ajuste)
+
+@cronometrado
+def registrar_venda(produto_id, qtd_venda, valor_total):
+    sucesso, msg, resultados = fechar_venda([(produto_id, qtd_venda, valor_total)])
+    if sucesso:
+        return True, "Venda realizada!"
+    return False, resultados[0]['mensagem'] if resultados else msg
+
+def _fechar_venda(cursor, itens):
+    cursor.execute("SELECT CURRENT_TIMESTAMP")
+    agora = cursor.fetchone()[0]
+    metodo = _metodo_custo(cursor)
+
+    cursor.execute("""
+        INSERT INTO pedidos (data_pedido, valor_total, qtd_itens)
+        VALUES (?, ?, ?)
+    """, (agora, sum(v for _, _, v in itens), len(itens)))
+    pedido_id = cursor.lastrowid
+
+    resultados = []
+    for produto_id, qtd, valor in itens:
+        # Baixa condicional: a checagem e a baixa são a mesma instrução
+        cursor.execute("""
+            UPDATE produtos SET quantidade = quantidade - ?
+            WHERE id = ? AND quantidade >= ?
+        """, (qtd, produto_id, qtd))
+
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT nome, quantidade FROM produtos WHERE id = ?", (produto_id,))
+            produto = cursor.fetchone()
+            if produto is None:
+                msg = f"Produto {produto_id} não encontrado!"
+            else:
+                msg = f"Estoque insuficiente para {produto[0]} (disponível: {produto[1]})!"
+            resultados.append({'produto_id': produto_id, 'quantidade': qtd,
+                               'sucesso': False, 'mensagem': msg, 'venda_id': None})
+            continue
+
+        # O custo da saída fica gravado na venda
+        custo = _saida_custo(cursor, produto_id, qtd, metodo)
+        cursor.execute("""
+            INSERT INTO vendas (pedido_id, produto_id, quantidade, valor_total, data_venda,
+                                custo_unitario, custo_total)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (pedido_id, produto_id, qtd, valor, agora, custo, custo * qtd))
+        venda_id = cursor.lastrowid
+        _registrar_movimento(cursor, produto_id, 'VENDA', -qtd, custo, data=agora,
+                             referencia_id=venda_id)
+        _custear_estoque(cursor)
+        _somar_venda_diaria(cursor, agora, produto_id, qtd, valor, custo * qtd)
+        resultados.append({'produto_id': produto_id, 'quantidade': qtd,
+                           'sucesso': True, 'mensagem': "Venda realizada!",
+                           'venda_id': venda_id})
+
+    if not all(r['sucesso'] for r in resultados):
+        # Nada é gravado: as linhas que passaram também não viraram venda
+        for r in resultados:
+            if r['sucesso']:
+                r.update(sucesso=False, mensagem="Não gravado (pedido cancelado).")
+            r['venda_id'] = None
+        raise Desfazer((False, "Pedido não registrado: há itens sem estoque.", resultados))
+    return True, f"Pedido #{pedido_id} registrado!", resultados
+
+@cronometrado
+def fechar_venda(itens):
+    """
+    Registra um pedido inteiro (lista de (produto_id, quantidade, valor_total))
+    numa única transação. Se qualquer linha falhar, nada é gravado.
+    Retorna (sucesso, mensagem, resultados por linha).
+    """
+    itens = [(int(p), int(q), float(v)) for p, q, v in itens]
+    if not itens:
+        return False, "Carrinho vazio!", []
+    try:
+        return escrever(_fechar_venda, itens)
+    except sqlite3.Error as e:
+        return False, f"Erro ao registrar venda: {e}", []
+
+def _cadastrar_produto(cursor, nome, marca, qtd, custo, venda, sku):
+    cursor.execute(
+        """INSERT INTO produtos
+           (nome, marca, quantidade, preco_custo, preco_venda, sku)
+           VALUES (?,?,?,?,?,?)""",
+        (nome, marca, qtd, custo, venda, sku or None)
+    )
+    novo_id = cursor.lastrowid
+    if qtd > 0:
+        _registrar_movimento(cursor, novo_id, 'COMPRA', qtd, custo)
+        _abrir_camada(cursor, novo_id, qtd, custo)
+        _custear_estoque(cursor)
+    return novo_id
+
+@cronometrado
+def cadastrar_produto(nome, marca, qtd, custo, venda, sku=None):
+    """
+    Cadastra um produto e, se houver quantidade inicial, a COMPRA
+    correspondente, na mesma transação. Retorna o id do novo produto.
+    """
+    return escrever(_cadastrar_produto, nome, marca, qtd, custo, venda, sku)
+
+def _importar_lote_produtos(cursor, linhas):
+    cursor.execute(
+        "SELECT COUNT(DISTINCT sku) FROM produtos WHERE sku IN (SELECT value FROM json_each(?))",
+        (json.dumps([linha[0] for linha in linhas]),)
+    )
+    existentes = cursor.fetchone()[0]
+    cursor.executemany('''
+        INSERT INTO produtos (sku, nome, marca, quantidade, preco_custo, preco_venda)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (sku) WHERE sku IS NOT NULL DO UPDATE SET
+            nome = excluded.nome,
+            marca = excluded.marca,
+            quantidade = quantidade + excluded.quantidade,
+            preco_custo = CASE
+                WHEN quantidade > 0 AND excluded.quantidade > 0 THEN
+                    (quantidade * preco_custo + excluded.quantidade * excluded.preco_custo)
+                    / (quantidade + excluded.quantidade)
+                WHEN quantidade > 0 THEN preco_custo
+                ELSE excluded.preco_custo
+            END,
+            preco_venda = excluded.preco_venda
+    ''', linhas)
+    compras = [(qtd, custo, sku) for sku, _, _, qtd, custo, _ in linhas if qtd > 0]
+    cursor.executemany('''
+        INSERT INTO movimentacoes (produto_id, tipo, quantidade, preco_custo_na_epoca)
+        SELECT id, 'COMPRA', ?, ? FROM produtos WHERE sku = ?
+    ''', compras)
+    cursor.executemany('''
+        INSERT INTO camadas_custo (produto_id, quantidade, custo_unitario)
+        SELECT id, ?, ? FROM produtos WHERE sku = ?
+    ''', compras)
+    _custear_estoque(cursor)
+    skus = len({linha[0] for linha in linhas})
+    return skus - existentes, existentes
+
+@cronometrado
+def importar_lote_produtos(linhas):
+    """
+    Upsert por SKU de um lote já validado, numa única transação: produto novo
+    é inserido; existente tem nome/marca/preço de venda atualizados e a
+    quantidade somada ao estoque. Cada quantidade > 0 vira uma COMPRA e entra
+    no custo médio ao preço de custo da linha.
+    linhas: lista de (sku, nome, marca, quantidade, preco_custo, preco_venda)
+    Retorna (inseridos, atualizados).
+    """
+    if not linhas:
+        return 0, 0
+    return escrever(_importar_lote_produtos, linhas)
+
+def _atualizar_coluna_marca(cursor):
     # Atualiza a coluna 'marca' com um valor padrão se estiver vazia
     cursor.execute("UPDATE produtos SET marca = 'Marca Padrão' WHERE marca IS NULL OR marca = ''")
-    
-    conn.commit()
-    conn.close()
-    
-def atualizar_produto_db(id_prod, nome, marca, qtd, custo, venda):
-    conn = conectar()
-    cursor = conn.cursor()
+
+@cronometrado
+def  atualizar_coluna_marca():
+    escrever(_atualizar_coluna_marca)
+
+_SQL_AJUSTE = '''
+    INSERT INTO movimentacoes (produto_id, tipo, quantidade, preco_custo_na_epoca, observacao)
+    SELECT id, 'AJUSTE', ? - quantidade - ?, preco_custo, 'Editor de estoque'
+    FROM produtos WHERE id = ? AND ? - quantidade - ? <> 0
+'''
+
+def _parametros_ajuste(produto_id, nova_quantidade, ja_lancado=0):
+    # AJUSTE = nova quantidade - quantidade atual no banco - o que já entrou como COMPRA
+    return (nova_quantidade, ja_lancado, produto_id, nova_quantidade, ja_lancado)
+
+def _atualizar_produto(cursor, id_prod, nome, marca, qtd, custo, venda):
+    cursor.execute(_SQL_AJUSTE, _parametros_ajuste(id_prod, qtd))
+    _custo_editado(cursor, id_prod, qtd, custo)
     cursor.execute('''
         UPDATE produtos
         SET nome = ?, marca = ?, quantidade = ?, preco_custo = ?, preco_venda = ?
         WHERE id = ?
     ''', (nome, marca, qtd, custo, venda, id_prod))
-    conn.commit()
-    conn.close()
-    
-def criar_tabela_movimentacao():
-    conn = conectar()
-    cursor = conn.cursor()
-    # Registra entradas (compras/ajustes) e saídas (vendas)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS movimentacoes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            produto_id INTEGER,
-            tipo TEXT, -- 'COMPRA' ou 'VENDA'
-            quantidade INTEGER,
-            preco_custo_na_epoca REAL,
-            data_movimento DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (produto_id) REFERENCES produtos (id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    
-def registrar_movimento_db(produto_id, tipo, quantidade, preco_custo):
+    _custear_estoque(cursor)
+
+@cronometrado
+def atualizar_produto_db(id_prod, nome, marca, qtd, custo, venda):
+    escrever(_atualizar_produto, id_prod, nome, marca, qtd, custo, venda)
+
+def _salvar_alteracoes_estoque(cursor, alteracoes, entradas):
+    compradas = {}
+    for produto_id, qtd, _ in entradas:
+        compradas[produto_id] = compradas.get(produto_id, 0) + qtd
+    # A quantidade é uma diferença sobre o estoque de agora, não o número que
+    # a tabela mostrava: vendas feitas com o editor aberto continuam valendo
+    for _, _, diferenca, _, _, _, produto_id in alteracoes:
+        cursor.execute("SELECT nome, quantidade FROM produtos WHERE id = ?", (produto_id,))
+        atual = cursor.fetchone()
+        if atual is not None and atual[1] + diferenca < 0:
+            raise Desfazer((False,
+                f"O estoque de '{atual[0]}' mudou enquanto a tabela estava aberta "
+                f"(agora: {atual[1]}). Recarregue a tabela e edite de novo."))
+
+    cursor.executemany('''
+        INSERT INTO movimentacoes (produto_id, tipo, quantidade, preco_custo_na_epoca)
+        SELECT id, 'COMPRA', ?, COALESCE(?, preco_custo) FROM produtos WHERE id = ?
+    ''', [(qtd, custo, produto_id) for produto_id, qtd, custo in entradas])
+    cursor.executemany('''
+        INSERT INTO camadas_custo (produto_id, quantidade, custo_unitario)
+        SELECT id, ?, COALESCE(?, preco_custo) FROM produtos WHERE id = ?
+    ''', [(qtd, custo, produto_id) for produto_id, qtd, custo in entradas])
+    for _, _, diferenca, custo, _, _, produto_id in alteracoes:
+        # Depois das COMPRAs: um custo editado reavalia também as camadas novas
+        if custo is not None:
+            cursor.execute("UPDATE camadas_custo SET custo_unitario = ? WHERE produto_id = ?",
+                           (custo, produto_id))
+            if diferenca == 0:
+                _reavaliacao(cursor, produto_id, custo)
+        # Baixa manual: o que a diferença não explica pelas COMPRAs
+        baixa = diferenca - compradas.get(produto_id, 0)
+        if baixa < 0:
+            _registrar_movimento(cursor, produto_id, 'AJUSTE', baixa, custo,
+                                 observacao='Editor de estoque')
+            _saida_custo(cursor, produto_id, -baixa)
+    cursor.executemany('''
+        UPDATE produtos
+        SET nome = ?, marca = ?, quantidade = quantidade + ?,
+            preco_custo = COALESCE(?, preco_custo), preco_venda = ?, sku = ?
+        WHERE id = ?
+    ''', alteracoes)
+    _custear_estoque(cursor)
+    return True, f"{len(alteracoes)} produto(s) atualizado(s)!"
+
+@cronometrado
+def salvar_alteracoes_estoque(alteracoes, entradas):
     """
-    Registra uma entrada (COMPRA) ou saída no histórico de movimentações.
+    Grava, numa única transação, só os produtos que mudaram no editor.
+    alteracoes: lista de (nome, marca, diferença de quantidade,
+        preco_custo ou None se não mudou, preco_venda, sku, id)
+    entradas: lista de (produto_id, quantidade, preco_custo ou None) para as COMPRAs
+    A diferença de quantidade vale sobre o estoque atual (vendas feitas com
+    o editor aberto não são desfeitas); uma diferença negativa que não é
+    COMPRA vira um AJUSTE no razão. Retorna (sucesso, mensagem): recusa se o
+    estoque ficaria negativo porque mudou desde que a tabela foi lida.
     """
-    conn = conectar()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO movimentacoes (produto_id, tipo, quantidade, preco_custo_na_epoca)
-        VALUES (?, ?, ?, ?)
-    ''', (produto_id, tipo, quantidade, preco_custo))
-    conn.commit()
-    conn.close()
+    if not alteracoes and not entradas:
+        return True, "Nenhuma alteração."
+    return escrever(_salvar_alteracoes_estoque, alteracoes, entradas)
+
+def _registrar_entrada_estoque(cursor, produto_id, quantidade, preco_custo):
+    if not _entrada_custo(cursor, produto_id, quantidade, preco_custo):
+        raise Desfazer((False, f"Produto {produto_id} não encontrado!"))
+    cursor.execute("UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?",
+                   (quantidade, produto_id))
+    _registrar_movimento(cursor, produto_id, 'COMPRA', quantidade, preco_custo)
+    _custear_estoque(cursor)
+    return True, "Entrada registrada!"
+
+@cronometrado
+def registrar_entrada_estoque(produto_id, quantidade, preco_custo):
+    """
+    Entrada de mercadoria: refaz o custo médio, soma ao estoque e registra a
+    COMPRA na mesma transação.
+    """
+    try:
+        return escrever(_registrar_entrada_estoque, produto_id, quantidade, preco_custo)
+    except Exception as e:
+        return False, f"Erro ao registrar entrada: {e}"
+
+def _estornar_venda(cursor, venda_id, produto_id, quantidade):
+    cursor.execute("""
+        SELECT data_venda, valor_total, custo_unitario, custo_total
+        FROM vendas WHERE id = ? AND produto_id = ?
+    """, (venda_id, produto_id))
+    venda = cursor.fetchone()
+    if venda is None:
+        raise Desfazer((False, "Venda não encontrada (já estornada?)."))
+    data_venda, valor_total, custo_unitario, custo_total = venda
+
+    # 1. Devolve a quantidade ao estoque, ao custo gravado na venda
+    _entrada_custo(cursor, produto_id, quantidade, custo_unitario)
+    cursor.execute("UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?",
+                   (quantidade, produto_id))
+
+    # 2. Deleta o registro da venda e lança o ESTORNO no razão
+    cursor.execute("DELETE FROM vendas WHERE id = ?", (venda_id,))
+    _registrar_movimento(cursor, produto_id, 'ESTORNO', quantidade, custo_unitario,
+                         referencia_id=venda_id)
+    _custear_estoque(cursor)
 
+    # 3. Retira a venda do resumo diário
+    _somar_venda_diaria(cursor, data_venda, produto_id, quantidade, valor_total,
+                        custo_total, sinal=-1)
+    return True, "Venda estornada com sucesso! Estoque atualizado."
+
+@cronometrado
 def estornar_venda_db(venda_id, produto_id, quantidade):
-    conn = conectar()
-    cursor = conn.cursor()
     try:
-        # 1. Devolve a quantidade ao estoque
-        cursor.execute("UPDATE produtos SET quantidade = quantidade + ? WHERE id = ?", 
-                       (quantidade, produto_id))
-        
-        # 2. Deleta o registro da venda
-        cursor.execute("DELETE FROM vendas WHERE id = ?", (venda_id,))
-        
-        conn.commit()
-        return True, "Venda estornada com sucesso! Estoque atualizado."
+        return escrever(_estornar_venda, venda_id, produto_id, quantidade)
     except Exception as e:
-        conn.rollback()
         return False, f"Erro ao estornar: {e}"
-    finally:
-        conn.close()
\ No newline at end of file
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manutenção do banco do SmartCommerce")
+    parser.add_argument(
+        'comando', nargs='?', default='criar',
+        choices=['criar', 'reconstruir-resumos', 'snapshot-estoque'],
+        help="criar: aplica as migrações | reconstruir-resumos: refaz vendas_diarias e "
+             "totais_produto | snapshot-estoque: grava a posição atual do estoque"
+    )
+    args = parser.parse_args()
+
+    criar_tabelas()
+    if args.comando == 'criar':
+        print("Banco de dados e tabelas criadas com sucesso.")
+    elif args.comando == 'reconstruir-resumos':
+        linhas = reconstruir_vendas_diarias()
+        print(f"Resumo diário reconstruído: {linhas} linha(s).")
+    elif args.comando == 'snapshot-estoque':
+        snapshot_id = registrar_snapshot_estoque()
+        print(f"Snapshot #{snapshot_id} gravado." if snapshot_id else "Já existe um snapshot agora.")
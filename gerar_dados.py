@@ -0,0 +1,185 @@
+"""
+Gera dados sintéticos (produtos, pedidos, vendas, razão de estoque, camadas de
+custo e snapshots) para testes de desempenho. Sempre usa uma semente, então a
+mesma escala gera o mesmo banco.
+
+Uso:
+    python gerar_dados.py --escala pequena --banco bench_pequena.db
+    python gerar_dados.py --produtos 50000 --vendas 5000000 --banco grande.db
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+import database
+
+ESCALAS = {
+    'minima': {'produtos': 100, 'vendas': 2_000},
+    'pequena': {'produtos': 1_000, 'vendas': 50_000},
+    'media': {'produtos': 10_000, 'vendas': 500_000},
+    'grande': {'produtos': 50_000, 'vendas': 5_000_000},
+}
+
+CATEGORIAS = [
+    'Caneta', 'Caderno', 'Sabonete', 'Shampoo', 'Café', 'Arroz', 'Feijão', 'Biscoito',
+    'Refrigerante', 'Suco', 'Detergente', 'Esponja', 'Pilha', 'Lâmpada', 'Cabo USB',
+    'Carregador', 'Camiseta', 'Meia', 'Chocolate', 'Leite', 'Iogurte', 'Macarrão',
+]
+VARIACOES = ['Tradicional', 'Premium', 'Light', 'Integral', 'Extra', 'Mini', 'Família',
+             'Azul', 'Preto', 'Branco', 'Sem Açúcar', 'Zero', 'Grande', 'Pequeno']
+MARCAS = ['Marca Padrão', 'Acme', 'Bom Preço', 'Qualitá', 'Nativa', 'Super', 'Ideal',
+          'Estrela', 'Aurora', 'Vitória', 'Prime', 'Do Campo']
+
+TAMANHO_LOTE = 50_000
+
+
+def _produtos(rng, quantidade):
+    for i in range(quantidade):
+        categoria = rng.choice(CATEGORIAS)
+        nome = f"{categoria} {rng.choice(VARIACOES)} {rng.randint(1, 999)}"
+        custo = round(rng.lognormvariate(1.5, 0.8), 2)
+        venda = round(custo * rng.uniform(1.2, 2.5), 2)
+        sku = f"789{i + 1:010d}"  # formato de EAN-13 brasileiro
+        yield (nome, rng.choice(MARCAS), rng.randint(0, 500), custo, venda, sku)
+
+
+def _inserir_em_lotes(cursor, conn, sql, linhas):
+    linhas = iter(linhas)
+    while True:
+        lote = list(itertools.islice(linhas, TAMANHO_LOTE))
+        if not lote:
+            break
+        cursor.executemany(sql, lote)
+        conn.commit()
+
+
+def gerar(caminho, produtos, vendas, dias=365, semente=42, fim=None, sobrescrever=False):
+    """Cria o banco em `caminho` com a escala pedida (recria se `sobrescrever`)."""
+    if os.path.exists(caminho) and not sobrescrever:
+        raise FileExistsError(f"{caminho} já existe; use sobrescrever=True para recriar.")
+
+    database.fechar_conexoes()
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+
+    database.CAMINHO_DB = caminho
+    database.criar_tabelas()
+    rng = random.Random(semente)
+    fim = fim or datetime(2026, 1, 1)
+    inicio = fim - timedelta(days=dias)
+
+    conn = database.conectar()
+    cursor = conn.cursor()
+
+    _inserir_em_lotes(cursor, conn, """
+        INSERT INTO produtos (nome, marca, quantidade, preco_custo, preco_venda, sku)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, _produtos(rng, produtos))
+
+    cursor.execute("SELECT id, preco_custo, preco_venda FROM produtos ORDER BY id")
+    catalogo = cursor.fetchall()
+
+    # Popularidade com cauda longa (tipo Zipf): poucos produtos vendem muito
+    pesos = list(itertools.accumulate(1 / (i + 1) ** 0.8 for i in range(len(catalogo))))
+    ordem = list(range(len(catalogo)))
+    rng.shuffle(ordem)
+    segundos = dias * 86_400
+
+    def linhas_de_venda():
+        pedido_id = 0
+        geradas = 0
+        # Datas crescentes, como numa loja de verdade
+        passo = segundos / max(vendas, 1)
+        instante = 0.0
+        while geradas < vendas:
+            pedido_id += 1
+            itens = min(rng.choice((1, 1, 1, 2, 2, 3, 4, 5)), vendas - geradas)
+            instante += passo * itens * rng.uniform(0.5, 1.5)
+            data = (inicio + timedelta(seconds=min(instante, segundos - 1))).strftime(
+                '%Y-%m-%d %H:%M:%S'
+            )
+            escolhidos = rng.choices(ordem, cum_weights=pesos, k=itens)
+            for indice in escolhidos:
+                pid, custo, preco = catalogo[indice]
+                qtd = rng.choice((1, 1, 1, 1, 2, 2, 3, 5))
+                yield (pedido_id, pid, qtd, round(preco * qtd, 2), data, custo, custo * qtd)
+            geradas += itens
+
+    _inserir_em_lotes(cursor, conn, """
+        INSERT INTO vendas (pedido_id, produto_id, quantidade, valor_total, data_venda,
+                            custo_unitario, custo_total)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, linhas_de_venda())
+
+    # Cabeçalhos dos pedidos a partir dos itens gerados
+    cursor.execute("""
+        INSERT INTO pedidos (id, data_pedido, valor_total, qtd_itens)
+        SELECT pedido_id, MIN(data_venda), SUM(valor_total), COUNT(*)
+        FROM vendas GROUP BY pedido_id
+    """)
+
+    # Razão de estoque coerente: uma compra inicial cobre tudo o que foi vendido
+    # mais o estoque atual, e cada venda é uma saída
+    cursor.execute("""
+        INSERT INTO movimentacoes
+            (produto_id, tipo, quantidade, preco_custo_na_epoca, custo_estoque, data_movimento)
+        SELECT p.id, 'COMPRA', p.quantidade + COALESCE(s.vendidas, 0), p.preco_custo,
+            p.preco_custo, ?
+        FROM produtos p
+        LEFT JOIN (
+            SELECT produto_id, SUM(quantidade) as vendidas FROM vendas GROUP BY produto_id
+        ) s ON s.produto_id = p.id
+        WHERE p.quantidade + COALESCE(s.vendidas, 0) > 0
+    """, (inicio.strftime('%Y-%m-%d %H:%M:%S'),))
+    cursor.execute("""
+        INSERT INTO movimentacoes
+            (produto_id, tipo, quantidade, preco_custo_na_epoca, custo_estoque,
+             data_movimento, referencia_id)
+        SELECT produto_id, 'VENDA', -quantidade, custo_unitario, custo_unitario, data_venda, id
+        FROM vendas
+    """)
+    # Custo constante no período: o estoque que sobrou é uma camada só
+    cursor.execute("""
+        INSERT INTO camadas_custo (produto_id, quantidade, custo_unitario, data_entrada)
+        SELECT id, quantidade, preco_custo, ? FROM produtos WHERE quantidade > 0
+    """, (inicio.strftime('%Y-%m-%d %H:%M:%S'),))
+    conn.commit()
+    conn.close()
+
+    # Snapshots mensais, como se o app tivesse rodado o período todo
+    for dia in range(30, dias + 1, 30):
+        database.registrar_snapshot_estoque(
+            (inicio + timedelta(days=dia)).strftime('%Y-%m-%d %H:%M:%S')
+        )
+
+    database.reconstruir_vendas_diarias()
+    database.conectar().execute("ANALYZE")
+    return caminho
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos para o SmartCommerce")
+    parser.add_argument('--escala', choices=sorted(ESCALAS), default='pequena')
+    parser.add_argument('--produtos', type=int, help="sobrescreve a escala")
+    parser.add_argument('--vendas', type=int, help="sobrescreve a escala")
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--banco', default='bench.db')
+    parser.add_argument('--sobrescrever', action='store_true', help="recria o banco se já existir")
+    args = parser.parse_args()
+
+    escala = dict(ESCALAS[args.escala])
+    if args.produtos is not None:
+        escala['produtos'] = args.produtos
+    if args.vendas is not None:
+        escala['vendas'] = args.vendas
+
+    t0 = time.perf_counter()
+    gerar(args.banco, escala['produtos'], escala['vendas'], args.dias, args.semente,
+          sobrescrever=args.sobrescrever)
+    print(f"{args.banco}: {escala['produtos']} produtos, {escala['vendas']} vendas "
+          f"em {time.perf_counter() - t0:.1f}s")
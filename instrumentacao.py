@@ -0,0 +1,267 @@
+"""
+Instrumentação opcional: tempo e linhas de cada instrução SQL, de cada seção
+do app.py e de cada helper de banco, agrupados por execução (rerun).
+
+Liga com a variável de ambiente SMARTCOMMERCE_DIAGNOSTICO=1. Desligada, cada
+ponto de medição custa só a checagem de `ativo`.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+ativo = os.environ.get('SMARTCOMMERCE_DIAGNOSTICO', '').lower() in ('1', 'true', 'sim')
+
+MAX_EXECUCOES = 50
+MAX_EVENTOS_POR_EXECUCAO = 5_000
+
+_local = threading.local()
+_execucoes = deque(maxlen=MAX_EXECUCOES)
+_lock = threading.Lock()
+
+
+def ativar(valor=True):
+    global ativo
+    ativo = valor
+
+# ============================================
+# EXECUÇÕES E EVENTOS
+# ============================================
+
+def iniciar_execucao(rotulo='rerun'):
+    """Abre o registro de uma nova execução (rerun, requisição...) na thread atual."""
+    if not ativo:
+        return None
+    execucao = {
+        'rotulo': rotulo,
+        'thread': threading.current_thread().name,
+        'inicio': time.time(),
+        '_t0': time.perf_counter(),
+        'eventos': [],
+        'descartados': 0,
+    }
+    _local.execucao = execucao
+    _local.nivel = 0
+    with _lock:
+        _execucoes.append(execucao)
+    return execucao
+
+
+def execucao_atual():
+    execucao = getattr(_local, 'execucao', None)
+    if execucao is None and ativo:
+        execucao = iniciar_execucao(f"thread {threading.current_thread().name}")
+    return execucao
+
+
+def contexto_atual():
+    """Execução e nível atuais da thread, para na_execucao() em outra thread."""
+    if not ativo:
+        return None
+    return execucao_atual(), getattr(_local, 'nivel', 0)
+
+
+@contextmanager
+def na_execucao(contexto):
+    """
+    Registra os eventos do bloco na execução de outra thread: `contexto` vem
+    de contexto_atual() na thread que pediu o trabalho (ex.: o escritor
+    único gravando o comando de um rerun).
+    """
+    if contexto is None:
+        yield
+        return
+    anterior = getattr(_local, 'execucao', None), getattr(_local, 'nivel', 0)
+    _local.execucao, _local.nivel = contexto
+    try:
+        yield
+    finally:
+        _local.execucao, _local.nivel = anterior
+
+
+def _registrar(evento):
+    execucao = execucao_atual()
+    if execucao is None:
+        return None
+    if len(execucao['eventos']) >= MAX_EVENTOS_POR_EXECUCAO:
+        execucao['descartados'] += 1
+        return None
+    evento['inicio_ms'] = round((evento.pop('_t0') - execucao['_t0']) * 1000, 3)
+    evento['nivel'] = getattr(_local, 'nivel', 0)
+    execucao['eventos'].append(evento)
+    return evento
+
+
+@contextmanager
+def medir(nome, tipo='secao'):
+    """Cronometra um bloco (seção do app, montagem de gráfico...)."""
+    if not ativo:
+        yield
+        return
+    evento = _registrar({'tipo': tipo, 'nome': nome, '_t0': time.perf_counter(),
+                         'duracao_ms': None})
+    _local.nivel = getattr(_local, 'nivel', 0) + 1
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.nivel -= 1
+        if evento is not None:
+            evento['duracao_ms'] = round((time.perf_counter() - t0) * 1000, 3)
+
+
+def cronometrado(funcao):
+    """Decorador para helpers de banco: registra cada chamada como um evento."""
+    nome = f"{funcao.__module__}.{funcao.__name__}"
+
+    @wraps(funcao)
+    def envolvida(*args, **kwargs):
+        if not ativo:
+            return funcao(*args, **kwargs)
+        with medir(nome, tipo='helper'):
+            return funcao(*args, **kwargs)
+
+    return envolvida
+
+# ============================================
+# SQL
+# ============================================
+
+def _rastrear(sql):
+    pendentes = getattr(_local, 'sql_rastreado', None)
+    if pendentes is not None:
+        pendentes.append(sql)
+
+
+def preparar_conexao(conn):
+    """Liga/desliga o set_trace_callback da conexão conforme o modo atual."""
+    if getattr(conn, '_rastreada', False) != ativo:
+        conn.set_trace_callback(_rastrear if ativo else None)
+        conn._rastreada = ativo
+
+
+def _registrar_sql(sql, t0, linhas):
+    # O texto vem do trace callback quando possível (com os parâmetros expandidos)
+    rastreado = getattr(_local, 'sql_rastreado', None) or []
+    _local.sql_rastreado = None
+    # (o último: o sqlite3 pode rastrear um BEGIN implícito antes da instrução)
+    texto = rastreado[-1] if rastreado else sql
+    return _registrar({
+        'tipo': 'sql',
+        'nome': ' '.join(str(texto).split()),
+        '_t0': t0,
+        'duracao_ms': round((time.perf_counter() - t0) * 1000, 3),
+        'linhas': linhas,
+        'instrucoes': max(len(rastreado), 1),
+    })
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor usado quando a instrumentação está ligada (ver database.ConexaoReutilizavel)."""
+
+    _evento = None
+
+    def execute(self, sql, parametros=()):
+        _local.sql_rastreado = []
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parametros)
+        finally:
+            self._evento = _registrar_sql(sql, t0, max(self.rowcount, 0))
+
+    def executemany(self, sql, sequencia):
+        _local.sql_rastreado = []
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, sequencia)
+        finally:
+            self._evento = _registrar_sql(sql, t0, max(self.rowcount, 0))
+
+    def _somar_leitura(self, t0, linhas):
+        # SELECTs rodam aos poucos: o tempo de leitura entra na mesma instrução
+        if self._evento is not None:
+            self._evento['duracao_ms'] = round(
+                self._evento['duracao_ms'] + (time.perf_counter() - t0) * 1000, 3
+            )
+            self._evento['linhas'] += linhas
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        linha = super().fetchone()
+        self._somar_leitura(t0, 0 if linha is None else 1)
+        return linha
+
+    def fetchmany(self, size=None):
+        t0 = time.perf_counter()
+        linhas = super().fetchmany(self.arraysize if size is None else size)
+        self._somar_leitura(t0, len(linhas))
+        return linhas
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        linhas = super().fetchall()
+        self._somar_leitura(t0, len(linhas))
+        return linhas
+
+    def __next__(self):
+        t0 = time.perf_counter()
+        linha = super().__next__()
+        self._somar_leitura(t0, 1)
+        return linha
+
+
+@contextmanager
+def medir_sql(sql):
+    """Para instruções que não passam por um cursor (ex.: COMMIT)."""
+    if not ativo:
+        yield
+        return
+    _local.sql_rastreado = []
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registrar_sql(sql, t0, 0)
+
+# ============================================
+# RESUMO E EXPORTAÇÃO
+# ============================================
+
+def resumo(execucao):
+    eventos = execucao['eventos']
+    sql = [e for e in eventos if e['tipo'] == 'sql']
+    return {
+        'rotulo': execucao['rotulo'],
+        'total_ms': round((time.perf_counter() - execucao['_t0']) * 1000, 3),
+        'sql_ms': round(sum(e['duracao_ms'] for e in sql), 3),
+        'instrucoes_sql': len(sql),
+        'linhas_sql': sum(e['linhas'] for e in sql),
+        'eventos_descartados': execucao['descartados'],
+    }
+
+
+def execucoes():
+    with _lock:
+        return list(_execucoes)
+
+
+def exportar_jsonl(caminho=None):
+    """Um evento por linha (com o rótulo e o horário da execução), para análise offline."""
+    linhas = []
+    for execucao in execucoes():
+        for evento in list(execucao['eventos']):
+            linhas.append(json.dumps({
+                'execucao': execucao['rotulo'],
+                'thread': execucao['thread'],
+                'execucao_inicio': execucao['inicio'],
+                **evento,
+            }, ensure_ascii=False))
+    texto = '\n'.join(linhas) + ('\n' if linhas else '')
+    if caminho:
+        with open(caminho, 'a', encoding='utf-8') as f:
+            f.write(texto)
+    return texto
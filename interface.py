@@ -0,0 +1,131 @@
+"""
+Peças de tela compartilhadas pelas páginas do app (paginas/): componentes
+visuais, o estado da sessão (carrinho, sinais) e os helpers de fragmento.
+"""
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+from carrinho import Carrinho
+from servicos import selecionar_loja
+
+# ============================================
+# FUNÇÕES HELPER VISUAIS
+# ============================================
+
+def criar_header(titulo, descricao=None):
+    """Cria header estilizado"""
+    if descricao:
+        st.markdown(f"""
+        <div class="custom-header">
+            <h1>{titulo}</h1>
+            <p>{descricao}</p>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown(f"""
+        <div class="custom-header">
+            <h1>{titulo}</h1>
+        </div>
+        """, unsafe_allow_html=True)
+
+def card_metrica(label, value, icon="📊", tipo="primary", change=None):
+    """Cria card de métrica estilizado"""
+    change_html = ""
+    if change:
+        change_class = "positive" if "+" in change else "negative"
+        change_html = f'<div class="metric-change {change_class}">{change}</div>'
+
+    st.markdown(f"""
+    <div class="metric-card {tipo}">
+        <div class="metric-label">{icon} {label}</div>
+        <div class="metric-value">{value}</div>
+        {change_html}
+    </div>
+    """, unsafe_allow_html=True)
+
+def alerta_estoque(produto, quantidade_atual, tipo="warning"):
+    """Cria alerta de estoque"""
+    icon = "⚠️" if tipo == "warning" else "🔴"
+    st.markdown(f"""
+    <div class="alert-low-stock">
+        <div class="alert-icon">{icon}</div>
+        <div class="alert-content">
+            <strong>Atenção:</strong> {produto}<br>
+            <small>Estoque atual: {quantidade_atual} unidades</small>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+def plotly_express():
+    """Importa o Plotly Express só quando há gráfico para desenhar"""
+    import plotly.express as px
+    return px
+
+def rotulos_produtos(df):
+    """{id: "nome — marca (SKU)"} dos produtos de uma busca, para selectbox."""
+    return {
+        int(r.id): f"{r.nome} — {r.marca or 'sem marca'}" + (f" ({r.sku})" if r.sku else "")
+        for r in df.itertuples(index=False)
+    }
+
+def rotulos_unicos(df, coluna='produto'):
+    """Nomes repetidos ganham o id, senão o Plotly junta as barras/fatias."""
+    repetidos = df[coluna].duplicated(keep=False) & df['produto_id'].notna()
+    df.loc[repetidos, coluna] = (
+        df.loc[repetidos, coluna] + ' #' + df.loc[repetidos, 'produto_id'].astype('int64').astype(str)
+    )
+    return df
+
+# ============================================
+# ESTADO DA SESSÃO
+# ============================================
+
+def iniciar_estado():
+    """Carrinho e sinais da sessão, criados no primeiro rerun"""
+    if 'carrinho' not in st.session_state:
+        st.session_state.carrinho = Carrinho()
+        # Cada edição aplicada troca a chave da tabela, que volta sem edições pendentes
+        st.session_state.edicoes_carrinho = 0
+    if 'sinais' not in st.session_state:
+        st.session_state.sinais = {'vendas': 0, 'estoque': 0}
+
+def aplicar_edicao_carrinho(chave, ids):
+    """Leva ao carrinho só as linhas editadas na tabela (antes do rerun)."""
+    carrinho = st.session_state.carrinho
+    for linha, mudancas in st.session_state[chave]['edited_rows'].items():
+        if 'Qtd' not in mudancas or ids[linha] not in carrinho:
+            continue
+        try:
+            carrinho.alterar(ids[linha], mudancas['Qtd'] or 0)
+        except ValueError as e:
+            st.session_state.aviso_carrinho = str(e)
+    st.session_state.edicoes_carrinho += 1
+
+# ============================================
+# FRAGMENTOS E SINAIS DE ATUALIZAÇÃO
+# ============================================
+# O PDV, o histórico e o editor de estoque são fragmentos: um clique dentro
+# de um deles reroda só ele. Quem grava algo que outra área mostra emite o
+# sinal do dado (vendas, estoque); cada área põe o sinal nas chaves dos seus
+# widgets e descarta o que ficou velho (páginas do histórico, linha
+# selecionada, edições pendentes na tabela) no próximo rerun em que aparece.
+# Se a área afetada está na mesma página, quem gravou reroda o app.
+
+def sinal(nome):
+    return st.session_state.sinais[nome]
+
+def emitir_sinais(*nomes):
+    """Marca os dados que mudaram; o rerun fica com quem chamou"""
+    for nome in nomes:
+        st.session_state.sinais[nome] += 1
+
+def rerodar_fragmento():
+    """Reroda só o fragmento; fora de um rerun de fragmento, reroda o app"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+def usar_loja_da_sessao():
+    """O rerun de um fragmento não passa pela sidebar: reaplica a loja da sessão"""
+    selecionar_loja(st.session_state.loja)
@@ -0,0 +1,161 @@
+"""
+Várias lojas, um banco SQLite por loja: o banco principal (CAMINHO_DB) e um
+<PASTA_LOJAS>/<nome>.db para cada outra loja. A loja vale por thread
+(database.usando_banco): cada sessão do app ou requisição da API lê e grava
+só no banco da sua loja, com o seu próprio lock de escrita.
+
+Os relatórios da rede rodam a mesma consulta em todas as lojas ao mesmo tempo
+(uma thread do pool por loja; o sqlite3 solta o GIL enquanto a consulta roda)
+e juntam os parciais. O tempo fica perto do da loja mais lenta, não da soma.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import database
+import relatorios
+from instrumentacao import cronometrado
+
+PASTA_LOJAS = 'lojas'
+NOME_PRINCIPAL = 'Loja principal'
+MAX_THREADS = 8
+
+_executor = None
+_lock_executor = threading.Lock()
+
+
+def listar_lojas():
+    """{nome: caminho do banco}, com a loja principal primeiro."""
+    lojas = {NOME_PRINCIPAL: database.CAMINHO_DB}
+    if os.path.isdir(PASTA_LOJAS):
+        for arquivo in sorted(os.listdir(PASTA_LOJAS)):
+            if arquivo.endswith('.db'):
+                lojas[arquivo[:-3]] = os.path.join(PASTA_LOJAS, arquivo)
+    return lojas
+
+
+def criar_loja(nome):
+    """Cria o banco (já migrado) de uma nova loja e devolve o caminho."""
+    nome = (nome or '').strip()
+    if not re.fullmatch(r"[\w][\w .-]*", nome) or nome == NOME_PRINCIPAL:
+        raise ValueError(f"Nome de loja inválido: '{nome}' (use letras, números, espaço, . e -).")
+    caminho = os.path.join(PASTA_LOJAS, f"{nome}.db")
+    if os.path.exists(caminho):
+        raise FileExistsError(f"A loja '{nome}' já existe.")
+    os.makedirs(PASTA_LOJAS, exist_ok=True)
+    with database.usando_banco(caminho):
+        database.criar_tabelas()
+    return caminho
+
+# ============================================
+# EXECUÇÃO EM PARALELO
+# ============================================
+
+def _pool():
+    global _executor
+    with _lock_executor:
+        if _executor is None:
+            # Threads fixas: cada uma reaproveita as conexões que abriu em cada banco
+            _executor = ThreadPoolExecutor(max_workers=MAX_THREADS, thread_name_prefix='lojas')
+        return _executor
+
+
+def _na_loja(caminho, funcao, args):
+    with database.usando_banco(caminho):
+        return funcao(*args)
+
+
+def em_todas_as_lojas(funcao, *args):
+    """{loja: funcao(*args)}, com cada loja rodando numa thread do pool."""
+    futuros = {
+        nome: _pool().submit(_na_loja, caminho, funcao, args)
+        for nome, caminho in listar_lojas().items()
+    }
+    return {nome: futuro.result() for nome, futuro in futuros.items()}
+
+# ============================================
+# RELATÓRIOS CONSOLIDADOS DA REDE
+# ============================================
+# Cada loja responde com o seu parcial (em cache por loja, como no app) e a
+# junção é feita aqui: somas somam, margem e ticket médio são refeitos.
+
+@cronometrado
+def periodo_rede():
+    """Primeiro e último dia com vendas em qualquer loja, ou (None, None)."""
+    periodos = [p for p in em_todas_as_lojas(relatorios.periodo_vendas).values()
+                if p[0] is not None]
+    if not periodos:
+        return None, None
+    return min(p[0] for p in periodos), max(p[1] for p in periodos)
+
+
+@cronometrado
+def kpis_rede(data_inicio, data_fim):
+    """KPIs da rede no período, com os de cada loja em 'por_loja'."""
+    por_loja = em_todas_as_lojas(relatorios.kpis_periodo, data_inicio, data_fim)
+    faturamento = sum(k['faturamento'] for k in por_loja.values())
+    lucro = sum(k['lucro'] for k in por_loja.values())
+    num_vendas = sum(k['num_vendas'] for k in por_loja.values())
+    return {
+        'faturamento': faturamento,
+        'lucro': lucro,
+        'margem': (lucro / faturamento * 100) if faturamento > 0 else 0,
+        'ticket_medio': (faturamento / num_vendas) if num_vendas > 0 else 0,
+        'num_vendas': num_vendas,
+        'por_loja': por_loja,
+    }
+
+
+@cronometrado
+def serie_rede(data_inicio, data_fim, max_pontos=relatorios.MAX_PONTOS_SERIE):
+    """
+    Série de faturamento da rede: as lojas agrupam pelo mesmo período (a
+    granularidade só depende das datas), então basta somar ponto a ponto.
+    Retorna (DataFrame, granularidade) como relatorios.serie_vendas.
+    """
+    parciais = em_todas_as_lojas(relatorios.serie_vendas, data_inicio, data_fim, max_pontos)
+    granularidade = next(iter(parciais.values()))[1]
+    df = pd.concat([p[0] for p in parciais.values() if not p[0].empty]
+                   or [pd.DataFrame(columns=['data_venda', 'faturamento'])])
+    df = df.groupby('data_venda', as_index=False)['faturamento'].sum().sort_values('data_venda')
+    df['faturamento_acumulado'] = df['faturamento'].cumsum()
+    return df.reset_index(drop=True), granularidade
+
+
+@cronometrado
+def ranking_rede(data_inicio, data_fim, limite=10, metrica='quantidade'):
+    """
+    Top `limite` da rede mais "Outros". O mesmo produto tem ids diferentes em
+    cada loja: junta pelo SKU (ou pelo nome, se não houver SKU). Cada loja
+    manda o ranking completo do período, senão um produto médio em todas as
+    lojas ficaria de fora do top da rede.
+    """
+    relatorios._coluna_metrica(metrica)
+    parciais = em_todas_as_lojas(relatorios.ranking_produtos, data_inicio, data_fim, None,
+                                 metrica)
+    colunas = ['quantidade', 'faturamento', 'lucro']
+    df = pd.concat([p for p in parciais.values() if not p.empty]
+                   or [pd.DataFrame(columns=['produto', 'sku'] + colunas)],
+                   ignore_index=True)
+    df['chave'] = df['sku'].where(df['sku'].notna(), 'nome:' + df['produto'].astype(str))
+    df = df.groupby('chave', as_index=False).agg(
+        produto=('produto', 'first'), sku=('sku', 'first'),
+        **{c: (c, 'sum') for c in colunas}
+    )
+    df = df.sort_values([metrica, 'chave'], ascending=[False, True], kind='stable')
+
+    top = df.head(limite).drop(columns='chave')
+    top.insert(0, 'produto_id', None)
+    # Nomes repetidos (SKUs diferentes) ganham o SKU, senão o gráfico junta as barras
+    repetidos = top['produto'].duplicated(keep=False) & top['sku'].notna()
+    top.loc[repetidos, 'produto'] = (
+        top.loc[repetidos, 'produto'] + ' (' + top.loc[repetidos, 'sku'] + ')'
+    )
+
+    outros = relatorios._linha_outros(top, df[colunas].sum(), colunas)
+    if outros is not None:
+        top = pd.concat([top, pd.DataFrame([outros])], ignore_index=True)
+    return top.reset_index(drop=True)
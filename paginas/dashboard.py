@@ -0,0 +1,314 @@
+"""Página Dashboard: KPIs, gráficos e o histórico de vendas com estorno."""
+import pandas as pd
+import streamlit as st
+
+from instrumentacao import medir
+from interface import (
+    criar_header, card_metrica, plotly_express, rotulos_produtos, rotulos_unicos,
+    sinal, emitir_sinais, rerodar_fragmento, usar_loja_da_sessao
+)
+from servicos import (
+    listar_lojas, buscar_produtos, estornar_venda, buscar_venda, historico_vendas,
+    periodo_vendas, kpis_periodo, serie_vendas, ranking_com_outros, composicao_estoque,
+    periodo_rede, kpis_rede, serie_rede, ranking_rede
+)
+
+# ============================================
+# HISTÓRICO E ESTORNO (fragmento)
+# ============================================
+
+@st.fragment
+def historico_e_estorno(data_inicio, data_fim):
+    """Histórico paginado e estorno; paginar e selecionar reroda só ele"""
+    usar_loja_da_sessao()
+    st.subheader("🧾 Histórico e Estorno de Vendas")
+
+    # Filtro por busca, como no PDV: só os produtos encontrados vão para o
+    # selectbox, não o catálogo inteiro
+    col_f_busca, col_f_prod, col_f_tam = st.columns([2, 2, 1])
+    with col_f_busca:
+        termo_hist = st.text_input(
+            "Filtrar por produto", placeholder="Nome, marca ou SKU", key="busca_historico"
+        )
+    with col_f_prod:
+        rotulos_hist = rotulos_produtos(buscar_produtos(termo_hist, 20)) if termo_hist else {}
+        produto_hist = st.selectbox(
+            "Produto",
+            options=[None] + list(rotulos_hist),
+            format_func=lambda pid: "Todos" if pid is None else rotulos_hist[pid],
+            disabled=not rotulos_hist
+        )
+    with col_f_tam:
+        tamanho_pagina = st.selectbox("Vendas por página", [20, 50, 100])
+
+    # Pilha de cursores: o topo é o início da página atual
+    filtros_hist = (produto_hist, data_inicio, data_fim, tamanho_pagina, sinal('vendas'))
+    if st.session_state.get('hist_filtros') != filtros_hist:
+        st.session_state.hist_filtros = filtros_hist
+        st.session_state.hist_paginas = [None]
+    paginas = st.session_state.hist_paginas
+
+    df_hist, proximo_cursor = historico_vendas(
+        tamanho_pagina, paginas[-1], produto_hist, data_inicio, data_fim
+    )
+
+    if not df_hist.empty:
+        st.info("💡 Clique em uma linha para selecionar e estornar a venda.")
+
+        event = st.dataframe(
+            df_hist,
+            use_container_width=True,
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="single-row", 
+            key=f"tabela_hist_{sinal('vendas')}_{len(paginas)}",
+            column_config={
+                "venda_id": None, 
+                "produto_id": None,
+                "data_venda": st.column_config.DatetimeColumn(
+                    "Data", 
+                    format="DD/MM/YYYY HH:mm"
+                ),
+                "Total": st.column_config.NumberColumn(
+                    "Total", 
+                    format="R$ %.2f"
+                )
+            }
+        )
+
+        col_ant, col_pag, col_prox = st.columns([1, 2, 1])
+        if col_ant.button("◀ Anterior", disabled=len(paginas) == 1, use_container_width=True):
+            paginas.pop()
+            rerodar_fragmento()
+        col_pag.markdown(
+            f"<p style='text-align: center;'>Página {len(paginas)}</p>",
+            unsafe_allow_html=True
+        )
+        if col_prox.button("Próxima ▶", disabled=proximo_cursor is None, use_container_width=True):
+            paginas.append(proximo_cursor)
+            rerodar_fragmento()
+
+        selecionado = event.selection.rows
+        venda_sel = None
+        if selecionado:
+            # A linha só serve para achar o id; os dados vêm do banco
+            venda_sel = buscar_venda(df_hist.iloc[selecionado[0]]['venda_id'])
+
+        if venda_sel and venda_sel['arquivada']:
+            st.info("🗄️ Venda arquivada (histórico frio): não pode ser estornada.")
+        elif venda_sel:
+            st.warning(
+                f"⚠️ Confirmar estorno de {venda_sel['quantidade']}x {venda_sel['produto']}?"
+            )
+
+            if st.button("Confirmar e Devolver ao Estoque", type="primary"):
+                sucesso, msg = estornar_venda(venda_sel['venda_id'])
+                if sucesso:
+                    st.success(msg)
+                    emitir_sinais('vendas', 'estoque')
+                    st.rerun()
+                else:
+                    st.error(msg)
+    elif len(paginas) == 1 and produto_hist is None:
+        st.info("Nenhuma venda registrada no período.")
+    else:
+        st.info("Nenhuma venda encontrada para os filtros.")
+
+
+# ============================================
+# DASHBOARD
+# ============================================
+
+loja_atual = st.session_state.loja
+consolidar = len(listar_lojas()) > 1 and st.sidebar.checkbox(
+    "Dashboard da rede (todas as lojas)", key="consolidar_rede"
+)
+
+criar_header("Dashboard", "Inteligência de negócio em tempo real")
+
+primeiro_dia, ultimo_dia = periodo_rede() if consolidar else periodo_vendas()
+
+if primeiro_dia is None:
+    st.info("💡 Realize vendas para visualizar o dashboard com dados reais.")
+
+    # Mostra cards zerados para visual
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        card_metrica("Faturamento Total", "R$ 0,00", "💰", "success")
+    with col2:
+        card_metrica("Lucro Líquido", "R$ 0,00", "📈", "success")
+    with col3:
+        card_metrica("Margem de Lucro", "0%", "📊", "primary")
+    with col4:
+        card_metrica("Ticket Médio", "R$ 0,00", "🛒", "primary")
+else:
+    # --- FILTROS NO SIDEBAR ---
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Filtros do Dashboard")
+    data_inicio = st.sidebar.date_input("Data Início", primeiro_dia)
+    data_fim = st.sidebar.date_input("Data Fim", ultimo_dia)
+
+    # --- KPIs PRINCIPAIS COM CARDS ESTILIZADOS ---
+    kpis = (kpis_rede if consolidar else kpis_periodo)(data_inicio, data_fim)
+    fat_total = kpis['faturamento']
+    lucro_total = kpis['lucro']
+    margem_total = kpis['margem']
+    ticket_medio = kpis['ticket_medio']
+
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        card_metrica(
+            label="Faturamento Total",
+            value=f"R$ {fat_total:,.2f}",
+            icon="💰",
+            tipo="success"
+        )
+
+    with col2:
+        card_metrica(
+            label="Lucro Líquido",
+            value=f"R$ {lucro_total:,.2f}",
+            icon="📈",
+            tipo="success"
+        )
+
+    with col3:
+        card_metrica(
+            label="Margem de Lucro",
+            value=f"{margem_total:.1f}%",
+            icon="📊",
+            tipo="primary"
+        )
+
+    with col4:
+        card_metrica(
+            label="Ticket Médio",
+            value=f"R$ {ticket_medio:,.2f}",
+            icon="🛒",
+            tipo="primary"
+        )
+
+    if consolidar:
+        st.dataframe(
+            pd.DataFrame.from_dict(kpis['por_loja'], orient='index'),
+            use_container_width=True,
+            column_config={
+                "faturamento": st.column_config.NumberColumn("Faturamento", format="R$ %.2f"),
+                "lucro": st.column_config.NumberColumn("Lucro", format="R$ %.2f"),
+                "margem": st.column_config.NumberColumn("Margem", format="%.1f%%"),
+                "ticket_medio": st.column_config.NumberColumn("Ticket Médio", format="R$ %.2f"),
+                "num_vendas": "Vendas",
+            }
+        )
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # --- GRÁFICO: EVOLUÇÃO E ACÚMULO ---
+    st.subheader("📈 Evolução e Acúmulo de Vendas")
+    px = plotly_express()
+
+    vendas_periodo, granularidade = (serie_rede if consolidar else serie_vendas)(
+        data_inicio, data_fim
+    )
+    vendas_periodo['data_venda'] = pd.to_datetime(vendas_periodo['data_venda'])
+    titulos_serie = {'dia': "Vendas Diárias", 'semana': "Vendas Semanais",
+                     'mes': "Vendas Mensais", 'ano': "Vendas Anuais"}
+
+    with medir("Evolução · figura Plotly"):
+        fig_evolucao = px.line(
+            vendas_periodo, 
+            x='data_venda', 
+            y=['faturamento', 'faturamento_acumulado'],
+            markers=len(vendas_periodo) <= 60, 
+            title=f"{titulos_serie[granularidade]} vs. Faturamento Acumulado",
+            labels={'value': 'Valor (R$)', 'data_venda': 'Data', 'variable': 'Indicador'}
+        )
+        fig_evolucao.update_traces(
+            line_width=3,
+            line=dict(color='#3B82F6'),
+            selector=dict(name='faturamento')
+        )
+        fig_evolucao.update_traces(
+            line=dict(color='#10B981'),
+            selector=dict(name='faturamento_acumulado')
+        )
+        # Eixo de datas: o Plotly escolhe os rótulos, em vez de um por ponto
+        fig_evolucao.update_xaxes(tickformat='%d/%m/%Y')
+        fig_evolucao.update_layout(
+            template='plotly_white',
+            hovermode='x unified',
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            font=dict(color='#374151')
+        )
+    with medir("Evolução · st.plotly_chart"):
+        st.plotly_chart(fig_evolucao, use_container_width=True)
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # --- GRÁFICOS DE PERFORMANCE E ESTOQUE ---
+    col_esq, col_dir = st.columns(2)
+
+    with col_esq:
+        st.subheader("🏆 Top Produtos")
+        metricas_top = {"Qtd Vendida": "quantidade", "Faturamento": "faturamento",
+                        "Lucro": "lucro"}
+        rotulo_metrica = st.radio(
+            "Ordenar por", list(metricas_top), horizontal=True, key="metrica_top"
+        )
+        metrica_top = metricas_top[rotulo_metrica]
+        top_qtd = rotulos_unicos(
+            (ranking_rede if consolidar else ranking_com_outros)(
+                data_inicio, data_fim, 10, metrica_top
+            )
+        ).iloc[::-1]  # o Plotly desenha de baixo para cima
+        with medir("Top produtos · figura Plotly"):
+            fig_top_qtd = px.bar(
+                top_qtd, 
+                x=metrica_top, 
+                y='produto', 
+                orientation='h',
+                title=f"Produtos Mais Vendidos ({rotulo_metrica})"
+            )
+            fig_top_qtd.update_traces(marker_color='#10B981')
+            fig_top_qtd.update_layout(
+                template='plotly_white',
+                plot_bgcolor='white',
+                paper_bgcolor='white',
+                font=dict(color='#374151')
+            )
+        with medir("Top produtos · st.plotly_chart"):
+            st.plotly_chart(fig_top_qtd, use_container_width=True)
+
+    with col_dir:
+        st.subheader("📦 Composição do Estoque")
+        if consolidar:
+            st.caption(f"Estoque da loja selecionada: {loja_atual}")
+        composicao = rotulos_unicos(composicao_estoque(10))
+
+        if not composicao.empty:
+            with medir("Estoque · figura Plotly"):
+                fig_pizza_est = px.pie(
+                    composicao, 
+                    values='quantidade', 
+                    names='produto', 
+                    hole=0.4, 
+                    title="Distribuição de Itens em Estoque"
+                )
+                fig_pizza_est.update_layout(
+                    template='plotly_white',
+                    plot_bgcolor='white',
+                    paper_bgcolor='white',
+                    font=dict(color='#374151')
+                )
+            with medir("Estoque · st.plotly_chart"):
+                st.plotly_chart(fig_pizza_est, use_container_width=True)
+        else:
+            st.info("Cadastre produtos no estoque primeiro.")
+
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.divider()
+
+    # --- HISTÓRICO E ESTORNO DE VENDAS ---
+    historico_e_estorno(data_inicio, data_fim)
@@ -0,0 +1,232 @@
+"""Página Estoque: cadastro, importação/exportação, posição, backup e edição do catálogo."""
+import os
+import tempfile
+
+import pandas as pd
+import streamlit as st
+
+from interface import criar_header, sinal, emitir_sinais, usar_loja_da_sessao
+from servicos import (
+    listar_produtos, cadastrar_produto, salvar_estoque_editado,
+    importar_catalogo, exportar_catalogo, inventario_em, metodo_custo, definir_metodo_custo,
+    fazer_backup, listar_backups
+)
+
+@st.fragment
+def editor_de_estoque():
+    """Tabela de edição do estoque; editar e salvar reroda só ela"""
+    usar_loja_da_sessao()
+
+    st.subheader("📝 Produtos Cadastrados")
+    st.info("💡 Edite os valores diretamente na tabela e clique em 'Salvar Alterações'.")
+    
+    df_estoque_atual = listar_produtos()
+    
+    if not df_estoque_atual.empty:
+        estoque_editado = st.data_editor(
+            df_estoque_atual,
+            use_container_width=True,
+            column_config={
+                "id": st.column_config.NumberColumn("ID", disabled=True),
+                "nome": st.column_config.TextColumn("Produto"),
+                "marca": st.column_config.TextColumn("Marca"),
+                "sku": st.column_config.TextColumn("Código / SKU"),
+                "quantidade": st.column_config.NumberColumn("Estoque", step=1),
+                "preco_custo": st.column_config.NumberColumn(
+                    "Custo", 
+                    format="R$ %.2f"
+                ),
+                "preco_venda": st.column_config.NumberColumn(
+                    "Venda", 
+                    format="R$ %.2f"
+                ),
+            },
+            hide_index=True,
+            key=f"editor_estoque_{sinal('estoque')}"
+        )
+
+        if st.button("💾 Salvar Alterações", type="primary", use_container_width=True):
+            sucesso, msg, entradas, resumo = salvar_estoque_editado(
+                df_estoque_atual, estoque_editado
+            )
+            
+            if not sucesso:
+                st.error(f"❌ {msg}")
+            elif not resumo:
+                st.info("Nenhuma alteração para salvar.")
+            else:
+                nomes = {item['id']: item['produto'] for item in resumo}
+                for produto_id, diferenca, _ in entradas:
+                    st.toast(
+                        f"📦 Entrada: +{diferenca} un. de {nomes[produto_id]}", 
+                        icon="✅"
+                    )
+                for item in resumo[:5]:
+                    st.toast(f"✏️ {item['produto']}: {', '.join(item['campos'])}")
+                if len(resumo) > 5:
+                    st.toast(f"✏️ ... e mais {len(resumo) - 5} produto(s)")
+                
+                total_entradas = sum(qtd for _, qtd, _ in entradas)
+                st.success(
+                    f"✅ {msg} " + 
+                    (f"{total_entradas} entrada(s) registrada(s)." if total_entradas > 0 else "")
+                )
+                emitir_sinais('estoque')
+                st.rerun()
+    else:
+        st.info("📦 Nenhum produto cadastrado ainda. Use o formulário acima para começar.")
+
+
+
+criar_header("Gestão de Inventário", "Controle completo dos seus produtos")
+# --- FORMULÁRIO DE NOVO PRODUTO ---
+with st.expander("➕ Cadastrar Novo Produto", expanded=False):
+    with st.form("novo_produto", clear_on_submit=True):
+        nome_n = st.text_input("Nome do Produto *")
+        marca_n = st.text_input("Marca")
+        sku_n = st.text_input("Código de Barras / SKU")
+
+        c1, c2, c3 = st.columns(3)
+        qtd_n = c1.number_input("Qtd Inicial", min_value=0, step=1)
+        custo_n = c2.number_input("Custo (R$)", min_value=0.0, format="%.2f")
+        venda_n = c3.number_input("Venda (R$)", min_value=0.0, format="%.2f")
+
+        if st.form_submit_button("💾 Salvar Novo Produto", use_container_width=True):
+            sucesso, msg, _ = cadastrar_produto(
+                nome_n, marca_n, qtd_n, custo_n, venda_n, sku_n
+            )
+            if sucesso:
+                st.success(f"✅ {msg}")
+                emitir_sinais('estoque')
+                st.rerun()
+            else:
+                st.error(f"❌ {msg}")
+
+# --- IMPORTAÇÃO / EXPORTAÇÃO EM LOTE ---
+with st.expander("📂 Importar / Exportar Catálogo (CSV ou Parquet)"):
+    st.caption(
+        "Colunas: sku, nome, marca, quantidade, preco_custo, preco_venda. "
+        "O SKU identifica o produto: existente é atualizado e a quantidade "
+        "entra como compra (soma ao estoque)."
+    )
+    arquivo_imp = st.file_uploader(
+        "Arquivo do fornecedor", type=["csv", "parquet"], key="arquivo_catalogo"
+    )
+    separadores = {"Vírgula (,)": ",", "Ponto e vírgula (;)": ";", "Tabulação": "\t"}
+    separador_imp = st.selectbox("Separador do CSV", list(separadores), key="separador_catalogo")
+    if arquivo_imp is not None and st.button("📥 Importar", use_container_width=True):
+        barra = st.progress(0.0, text="Importando...")
+        sucesso, msg, resultado = importar_catalogo(
+            arquivo_imp,
+            separador=separadores[separador_imp],
+            progresso=lambda fracao, parcial: barra.progress(
+                fracao, text=f"Importando... {parcial['lidas']} linha(s)"
+            ),
+        )
+        barra.empty()
+        if resultado is None:
+            st.error(f"❌ {msg}")
+        elif sucesso:
+            st.success(f"✅ {msg}")
+        else:
+            st.warning(f"⚠️ {msg}")
+        if resultado is not None:
+            # A tabela de edição, desenhada logo abaixo, volta com o estoque novo
+            emitir_sinais('estoque')
+            st.dataframe(
+                pd.DataFrame(resultado['erros'], columns=["Linha", "SKU", "Erro"]),
+                hide_index=True, use_container_width=True
+            )
+
+    formato_exp = st.radio("Formato da exportação", ["csv", "parquet"], horizontal=True)
+    if st.button("📤 Gerar arquivo do catálogo", use_container_width=True):
+        with tempfile.NamedTemporaryFile(suffix=f".{formato_exp}", delete=False) as destino:
+            exportar_catalogo(destino.name)
+        with open(destino.name, "rb") as gerado:
+            st.download_button(
+                "⬇️ Baixar catálogo", gerado, file_name=f"catalogo.{formato_exp}",
+                use_container_width=True
+            )
+        os.remove(destino.name)
+
+# --- POSIÇÃO EM UMA DATA (razão + snapshots) ---
+# O corpo de um expander roda mesmo com ele fechado: o inventário (e a lista
+# de backups, abaixo) só é consultado com o toggle ligado
+with st.expander("📅 Posição do Estoque em uma Data"):
+    data_posicao = st.date_input("Fim do dia", key="data_posicao_estoque")
+    if st.toggle("Calcular posição", key="mostrar_posicao_estoque"):
+        posicao = inventario_em(data_posicao)
+        col_unid, col_valor = st.columns(2)
+        col_unid.metric("Unidades em estoque", f"{int(posicao['quantidade'].sum()):,}")
+        col_valor.metric("Valor a custo", f"R$ {posicao['valor'].sum():,.2f}")
+        st.dataframe(
+            posicao.head(100),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "produto_id": None,
+                "produto": "Produto",
+                "quantidade": "Qtd",
+                "custo_unitario": st.column_config.NumberColumn("Custo", format="R$ %.2f"),
+                "valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
+            }
+        )
+        if len(posicao) > 100:
+            st.caption(f"Mostrando os 100 de maior valor, de {len(posicao)} produtos.")
+
+# --- MÉTODO DE CUSTEIO ---
+with st.expander("⚖️ Método de Custo das Vendas"):
+    metodos = {"MEDIO": "Custo médio ponderado",
+               "FIFO": "FIFO (primeiro que entra, primeiro que sai)"}
+    atual = metodo_custo()
+    escolhido = st.radio(
+        "Custo gravado em cada venda", list(metodos), index=list(metodos).index(atual),
+        format_func=metodos.get, key="metodo_custo"
+    )
+    st.caption(
+        "O custo fica gravado na venda no momento do fechamento: trocar o método "
+        "ou editar o custo de um produto não muda o lucro de vendas passadas. "
+        "A coluna Custo da tabela abaixo é sempre o custo médio."
+    )
+    if escolhido != atual:
+        sucesso, msg = definir_metodo_custo(escolhido)
+        if sucesso:
+            st.success(f"✅ {msg}")
+        else:
+            st.error(f"❌ {msg}")
+
+# --- BACKUP DO BANCO ---
+with st.expander("💾 Backup do Banco"):
+    st.caption(
+        "Cópia completa do banco da loja, feita aos poucos: o PDV continua "
+        "vendendo durante o backup. A restauração é pela linha de comando "
+        "(python backup.py --restaurar)."
+    )
+    if st.button("💾 Fazer backup agora", use_container_width=True):
+        with st.spinner("Copiando o banco..."):
+            sucesso, msg, _ = fazer_backup()
+        if sucesso:
+            st.success(f"✅ {msg}")
+        else:
+            st.error(f"❌ {msg}")
+    if st.toggle("Mostrar backups", key="mostrar_backups"):
+        backups = listar_backups()
+        if backups.empty:
+            st.caption("Nenhum backup desta loja ainda.")
+        else:
+            backups['arquivo'] = backups['arquivo'].map(os.path.basename)
+            backups['bytes'] = backups['bytes'] / 1e6
+            st.dataframe(
+                backups,
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "arquivo": "Arquivo",
+                    "bytes": st.column_config.NumberColumn("Tamanho", format="%.1f MB"),
+                    "criado_em": st.column_config.DatetimeColumn("Criado em", format="DD/MM/YYYY HH:mm:ss"),
+                }
+            )
+
+st.divider()
+
+editor_de_estoque()
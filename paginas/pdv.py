@@ -0,0 +1,196 @@
+"""Página Ponto de Venda: busca, carrinho e fechamento do pedido."""
+import pandas as pd
+import streamlit as st
+
+from interface import (
+    criar_header, alerta_estoque, aplicar_edicao_carrinho, rotulos_produtos,
+    emitir_sinais, rerodar_fragmento, usar_loja_da_sessao
+)
+from servicos import buscar_produtos, buscar_produto, fechar_venda
+
+@st.fragment
+def ponto_de_venda():
+    """Busca, carrinho e fechamento; um clique no PDV reroda só o PDV"""
+    usar_loja_da_sessao()
+    
+    # --- PARTE 1: BUSCA E SELEÇÃO DE PRODUTO ---
+    termo_busca = st.text_input(
+        "🔍 Buscar Produto",
+        placeholder="Digite nome, marca ou escaneie o código de barras",
+        key="busca_pdv"
+    )
+    df_p = buscar_produtos(termo_busca, 20)
+    
+    if df_p.empty and not termo_busca and not st.session_state.carrinho:
+        st.warning("⚠️ Cadastre produtos no estoque primeiro.")
+    else:
+        if df_p.empty:
+            st.warning("Nenhum produto encontrado para a busca.")
+        else:
+            col_selecao, col_feedback = st.columns([2, 1])
+            
+            with col_selecao:
+                rotulos = rotulos_produtos(df_p)
+                prod_id = st.selectbox(
+                    "Selecione o Produto", 
+                    options=list(rotulos),
+                    format_func=rotulos.get
+                )
+                # Resolve pelo id (produtos com o mesmo nome não se confundem)
+                info = buscar_produto(prod_id)
+                prod_nome = info['nome']
+                
+            with col_feedback:
+                estoque_real = int(info['quantidade'])
+                
+                # Cards de feedback visual
+                st.markdown(f"""
+                <div class="metric-card primary">
+                    <div class="metric-label">📦 Disponível</div>
+                    <div class="metric-value">{estoque_real}</div>
+                </div>
+                """, unsafe_allow_html=True)
+                
+                st.markdown(f"""
+                <div class="metric-card success">
+                    <div class="metric-label">💵 Preço Unit.</div>
+                    <div class="metric-value">R$ {info['preco_venda']:,.2f}</div>
+                </div>
+                """, unsafe_allow_html=True)
+
+            col_qtd, col_btn = st.columns([2, 1])
+            carrinho = st.session_state.carrinho
+            # O que já está no carrinho sai do disponível para esta adição
+            livre = estoque_real - carrinho.quantidade_de(prod_id)
+            
+            with col_qtd:
+                max_permitido = max(1, livre)
+                qtd_item = st.number_input(
+                    "Quantidade a vender", 
+                    min_value=1, 
+                    max_value=max_permitido, 
+                    step=1,
+                    disabled=(livre <= 0)
+                )
+                if estoque_real <= 0:
+                    alerta_estoque(prod_nome, estoque_real)
+                elif livre <= 0:
+                    st.caption("Todo o estoque deste produto já está no carrinho.")
+            
+            with col_btn:
+                st.write(" ") 
+                if st.button("➕ Adicionar ao Carrinho", use_container_width=True,
+                             disabled=(livre <= 0)):
+                    try:
+                        carrinho.adicionar(
+                            info['id'], prod_nome, qtd_item, info['preco_venda'], estoque_real
+                        )
+                        rerodar_fragmento()
+                    except ValueError as e:
+                        st.error(str(e))
+
+        st.divider()
+
+        # --- PARTE 2: CARRINHO ---
+        carrinho = st.session_state.carrinho
+        if carrinho:
+            st.subheader("🛒 Itens no Pedido")
+            st.caption(f"{len(carrinho)} produto(s) · {carrinho.unidades} unidade(s) · "
+                       "Qtd 0 tira o produto do pedido")
+
+            aviso = st.session_state.pop('aviso_carrinho', None)
+            if aviso:
+                st.warning(aviso)
+
+            ids = [item.produto_id for item in carrinho]
+            df_cart = pd.DataFrame({
+                "ID": ids,
+                "Produto": [item.produto for item in carrinho],
+                "Qtd": [item.quantidade for item in carrinho],
+                "Unitário": [item.unitario for item in carrinho],
+                "Subtotal": [item.subtotal for item in carrinho],
+            })
+            chave_editor = f"editor_carrinho_{st.session_state.edicoes_carrinho}"
+
+            # A edição é aplicada no callback, linha a linha: sem comparar a
+            # tabela inteira nem um rerun extra
+            st.data_editor(
+                df_cart,
+                key=chave_editor,
+                on_change=aplicar_edicao_carrinho,
+                args=(chave_editor, ids),
+                use_container_width=True,
+                num_rows="fixed",
+                column_config={
+                    "ID": st.column_config.NumberColumn("ID", disabled=True),
+                    "Produto": st.column_config.TextColumn("Produto", disabled=True),
+                    "Unitário": st.column_config.NumberColumn(
+                        "Preço Unit.", 
+                        format="R$ %.2f", 
+                        disabled=True
+                    ),
+                    "Qtd": st.column_config.NumberColumn(
+                        "Qtd", 
+                        min_value=0, 
+                        step=1, 
+                        disabled=False
+                    ),
+                    "Subtotal": st.column_config.NumberColumn(
+                        "Subtotal", 
+                        format="R$ %.2f", 
+                        disabled=True
+                    ),
+                },
+                hide_index=True
+            )
+
+            # Total destacado
+            st.markdown(f"""
+            <div style="background: linear-gradient(135deg, #10B981 0%, #059669 100%);
+                        color: white; padding: 1.5rem; border-radius: 1rem;
+                        text-align: center; margin: 1rem 0;">
+                <p style="margin: 0; font-size: 0.875rem; opacity: 0.9;">
+                    TOTAL DO PEDIDO
+                </p>
+                <h2 style="margin: 0.5rem 0 0 0; font-size: 2.5rem; font-weight: 800;">
+                    R$ {carrinho.total:,.2f}
+                </h2>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            c_vaz, c_limpar, c_vender = st.columns([1, 1, 1])
+            
+            if c_limpar.button("🗑️ Esvaziar Carrinho", use_container_width=True):
+                carrinho.limpar()
+                rerodar_fragmento()
+
+            if c_vender.button(
+                "✅ Fechar Venda", 
+                type="primary", 
+                use_container_width=True
+            ):
+                sucesso, msg, resultados = fechar_venda(carrinho.itens_venda())
+                
+                if not sucesso:
+                    st.error(msg)
+                    for r in resultados:
+                        if not r['sucesso']:
+                            st.error(r['mensagem'])
+                            # Outra venda levou o estoque: a conferência passa a usar o atual
+                            atual = buscar_produto(r['produto_id'])
+                            if atual is not None and r['produto_id'] in carrinho:
+                                carrinho.atualizar_disponivel(r['produto_id'], atual['quantidade'])
+                else:
+                    carrinho.limpar()
+                    st.success("✅ Venda processada com sucesso!")
+                    st.balloons()
+                    # Dashboard e Estoque são outras páginas: releem ao serem abertas
+                    emitir_sinais('vendas', 'estoque')
+                    rerodar_fragmento()
+        else:
+            st.info("🛒 Carrinho vazio. Adicione produtos para iniciar uma venda.")
+
+
+
+criar_header("Ponto de Venda", "Realize vendas de forma rápida e profissional")
+ponto_de_venda()
@@ -0,0 +1,532 @@
+import json
+import re
+from datetime import timedelta
+
+import pandas as pd
+from cache import em_cache
+from database import conectar_leitura
+from instrumentacao import cronometrado
+
+# ============================================
+# CATÁLOGO
+# ============================================
+
+@cronometrado
+@em_cache
+def listar_produtos():
+    conn = conectar_leitura()
+    df = pd.read_sql_query("SELECT * FROM produtos", conn)
+    conn.close()
+    return df
+
+# ============================================
+# BUSCA DE PRODUTOS (PDV)
+# ============================================
+
+COLUNAS_PRODUTO = "p.id, p.nome, p.marca, p.sku, p.quantidade, p.preco_custo, p.preco_venda"
+
+def _consulta_fts(termo):
+    # Cada palavra vira um prefixo entre aspas ("cane"* "azu"*), o que também
+    # neutraliza a sintaxe do FTS5 digitada sem querer
+    return ' '.join(f'"{palavra}"*' for palavra in re.findall(r'\w+', termo))
+
+@cronometrado
+@em_cache
+def buscar_produtos(termo, limite=10):
+    """
+    Até `limite` produtos para o que foi digitado ou escaneado. Um SKU exato
+    vem sozinho; senão, busca por prefixo em nome, marca e SKU (FTS5), do mais
+    relevante para o menos. Sem termo, lista em ordem alfabética.
+    """
+    termo = (termo or '').strip()
+    conn = conectar_leitura()
+    if not termo:
+        df = pd.read_sql_query(
+            f"SELECT {COLUNAS_PRODUTO} FROM produtos p ORDER BY p.nome LIMIT ?",
+            conn, params=(limite,)
+        )
+    else:
+        df = pd.read_sql_query(
+            f"SELECT {COLUNAS_PRODUTO} FROM produtos p WHERE p.sku = ?",
+            conn, params=(termo,)
+        )
+        consulta = _consulta_fts(termo)
+        if df.empty and consulta:
+            df = pd.read_sql_query(f"""
+                SELECT {COLUNAS_PRODUTO}
+                FROM produtos_busca b
+                JOIN produtos p ON p.id = b.rowid
+                WHERE produtos_busca MATCH ?
+                ORDER BY b.rank
+                LIMIT ?
+            """, conn, params=(consulta, limite))
+    conn.close()
+    return df
+
+@cronometrado
+def buscar_produto(produto_id):
+    """Produto pelo id, com o estoque atual (sem cache), ou None."""
+    conn = conectar_leitura()
+    cursor = conn.execute(
+        f"SELECT {COLUNAS_PRODUTO} FROM produtos p WHERE p.id = ?", (int(produto_id),)
+    )
+    linha = cursor.fetchone()
+    colunas = [c[0] for c in cursor.description]
+    conn.close()
+    return None if linha is None else dict(zip(colunas, linha))
+
+def precos_venda(ids):
+    """Preço de venda atual (sem cache) dos produtos `ids`, em {id: preço}."""
+    conn = conectar_leitura()
+    precos = dict(conn.execute(
+        "SELECT id, preco_venda FROM produtos WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps([int(i) for i in ids]),)
+    ).fetchall())
+    conn.close()
+    return precos
+
+# ============================================
+# POSIÇÃO DE ESTOQUE NUMA DATA (razão + snapshots)
+# ============================================
+# Parte do último snapshot até o fim do dia pedido e soma só a cauda do razão
+# que ele não inclui: os movimentos com data depois do corte e os gravados
+# depois do snapshot (id acima do último que ele incluiu). O custo é o do
+# estoque depois do movimento mais recente (ou o do snapshot): valor das
+# camadas abertas / unidades, gravado em custo_estoque.
+
+def _limite_do_dia(data):
+    return str(pd.Timestamp(str(data)).date() + timedelta(days=1))
+
+def _snapshot_anterior(conn, limite):
+    return conn.execute("""
+        SELECT id, data_corte, ultimo_movimento_id FROM snapshots_estoque
+        WHERE data_corte < ? ORDER BY data_corte DESC LIMIT 1
+    """, (limite,)).fetchone() or (None, '', 0)
+
+@cronometrado
+@em_cache
+def estoque_em(produto_id, data):
+    """Quantidade e custo unitário de um produto ao fim do dia `data`."""
+    limite = _limite_do_dia(data)
+    conn = conectar_leitura()
+    snapshot_id, corte, ultimo_id = _snapshot_anterior(conn, limite)
+    quantidade, custo, _ = conn.execute("""
+        SELECT COALESCE(SUM(quantidade), 0), custo, MAX(ordem)
+        FROM (
+            SELECT quantidade, custo_unitario as custo, '' as ordem
+            FROM snapshots_estoque_itens WHERE snapshot_id = ? AND produto_id = ?
+            UNION ALL
+            SELECT quantidade, custo_estoque, data_movimento || printf('%015d', id)
+            FROM movimentacoes
+            WHERE produto_id = ? AND data_movimento > ? AND data_movimento < ?
+            UNION ALL
+            SELECT quantidade, custo_estoque, data_movimento || printf('%015d', id)
+            FROM movimentacoes
+            WHERE produto_id = ? AND id > ? AND data_movimento <= ?
+        )
+    """, (snapshot_id, int(produto_id), int(produto_id), corte, limite,
+          int(produto_id), ultimo_id, corte)).fetchone()
+    conn.close()
+    return {'produto_id': int(produto_id), 'data': str(data),
+            'quantidade': quantidade, 'custo_unitario': custo}
+
+@cronometrado
+@em_cache
+def inventario_em(data):
+    """
+    Posição de todos os produtos ao fim do dia `data`, com a valorização
+    (quantidade x custo unitário do estoque na época), do maior valor para o menor.
+    """
+    limite = _limite_do_dia(data)
+    conn = conectar_leitura()
+    snapshot_id, corte, ultimo_id = _snapshot_anterior(conn, limite)
+    df = pd.read_sql_query("""
+        SELECT
+            t.produto_id,
+            p.nome as produto,
+            t.quantidade,
+            t.custo as custo_unitario,
+            t.quantidade * t.custo as valor
+        FROM (
+            SELECT produto_id, SUM(quantidade) as quantidade, custo, MAX(ordem)
+            FROM (
+                SELECT produto_id, quantidade, custo_unitario as custo, '' as ordem
+                FROM snapshots_estoque_itens WHERE snapshot_id = ?
+                UNION ALL
+                SELECT produto_id, quantidade, custo_estoque,
+                    data_movimento || printf('%015d', id)
+                FROM movimentacoes
+                WHERE data_movimento > ? AND data_movimento < ?
+                UNION ALL
+                SELECT produto_id, quantidade, custo_estoque,
+                    data_movimento || printf('%015d', id)
+                FROM movimentacoes
+                WHERE id > ? AND data_movimento <= ?
+            )
+            GROUP BY produto_id
+        ) t
+        JOIN produtos p ON p.id = t.produto_id
+        WHERE t.quantidade <> 0
+        ORDER BY valor DESC
+    """, conn, params=(snapshot_id, corte, limite, ultimo_id, corte))
+    conn.close()
+    return df
+
+# ============================================
+# CONSULTAS DO DASHBOARD
+# ============================================
+# Filtros e agregações rodam no SQLite (sobre vendas_diarias), então memória
+# e tempo dependem do tamanho do resultado, não do histórico de vendas.
+
+@cronometrado
+@em_cache
+def periodo_vendas():
+    """Primeiro e último dia com vendas, ou (None, None) se não houver nenhuma."""
+    conn = conectar_leitura()
+    # Em subconsultas separadas cada uma lê só uma ponta do índice;
+    # juntas no mesmo SELECT, o SQLite varre a tabela inteira
+    inicio, fim = conn.execute("""
+        SELECT (SELECT MIN(dia) FROM vendas_diarias), (SELECT MAX(dia) FROM vendas_diarias)
+    """).fetchone()
+    conn.close()
+    if inicio is None:
+        return None, None
+    return pd.Timestamp(inicio).date(), pd.Timestamp(fim).date()
+
+@cronometrado
+@em_cache
+def kpis_periodo(data_inicio, data_fim):
+    """Faturamento, lucro, margem e ticket médio do período (datas inclusivas)."""
+    conn = conectar_leitura()
+    faturamento, lucro, num_vendas = conn.execute("""
+        SELECT
+            COALESCE(SUM(faturamento), 0),
+            COALESCE(SUM(lucro), 0),
+            COALESCE(SUM(num_vendas), 0)
+        FROM vendas_diarias
+        WHERE dia BETWEEN ? AND ?
+    """, (str(data_inicio), str(data_fim))).fetchone()
+    conn.close()
+
+    return {
+        'faturamento': faturamento,
+        'lucro': lucro,
+        'margem': (lucro / faturamento * 100) if faturamento > 0 else 0,
+        'ticket_medio': (faturamento / num_vendas) if num_vendas > 0 else 0,
+        'num_vendas': num_vendas,
+    }
+
+@cronometrado
+@em_cache
+def serie_diaria(data_inicio, data_fim):
+    """Faturamento por dia e acumulado no período."""
+    conn = conectar_leitura()
+    df = pd.read_sql_query("""
+        SELECT dia as data_venda, SUM(faturamento) as faturamento
+        FROM vendas_diarias
+        WHERE dia BETWEEN ? AND ?
+        GROUP BY dia
+        ORDER BY dia
+    """, conn, params=(str(data_inicio), str(data_fim)))
+    conn.close()
+    df['faturamento_acumulado'] = df['faturamento'].cumsum()
+    return df
+
+# Métrica do ranking -> coluna em totais_produto / vendas_diarias
+METRICAS_RANKING = {
+    'quantidade': 'unidades',
+    'faturamento': 'faturamento',
+    'lucro': 'lucro',
+}
+
+def _coluna_metrica(metrica):
+    if metrica not in METRICAS_RANKING:
+        raise ValueError(f"Métrica inválida: {metrica} (use {', '.join(METRICAS_RANKING)}).")
+    return METRICAS_RANKING[metrica]
+
+@cronometrado
+@em_cache
+def top_produtos(limite=10, metrica='quantidade'):
+    """
+    Ranking do histórico inteiro pelos totais acumulados (totais_produto):
+    com o índice da métrica, lê só `limite` linhas, seja qual for o volume.
+    """
+    coluna = _coluna_metrica(metrica)
+    conn = conectar_leitura()
+    df = pd.read_sql_query(f"""
+        SELECT
+            t.produto_id,
+            p.nome as produto,
+            p.sku,
+            t.unidades as quantidade,
+            t.faturamento,
+            t.lucro
+        FROM totais_produto t
+        JOIN produtos p ON p.id = t.produto_id
+        ORDER BY t.{coluna} DESC
+        LIMIT ?
+    """, conn, params=(-1 if limite is None else limite,))
+    conn.close()
+    return df
+
+@cronometrado
+@em_cache
+def ranking_produtos(data_inicio, data_fim, limite=None, metrica='quantidade'):
+    """
+    Produtos do período ordenados pela métrica (quantidade, faturamento ou
+    lucro), do maior para o menor. Se o período cobre todas as vendas, usa os
+    totais acumulados; senão, agrupa o resumo diário do período.
+    """
+    coluna = _coluna_metrica(metrica)
+    primeiro, ultimo = periodo_vendas()
+    if primeiro is not None and (str(data_inicio) <= str(primeiro)
+                                 and str(data_fim) >= str(ultimo)):
+        return top_produtos(limite, metrica)
+
+    conn = conectar_leitura()
+    df = pd.read_sql_query(f"""
+        SELECT
+            r.produto_id,
+            p.nome as produto,
+            p.sku,
+            SUM(r.unidades) as quantidade,
+            SUM(r.faturamento) as faturamento,
+            SUM(r.lucro) as lucro
+        FROM vendas_diarias r
+        JOIN produtos p ON p.id = r.produto_id
+        WHERE r.dia BETWEEN ? AND ?
+        GROUP BY r.produto_id
+        ORDER BY SUM(r.{coluna}) DESC
+        LIMIT ?
+    """, conn, params=(str(data_inicio), str(data_fim), -1 if limite is None else limite))
+    conn.close()
+    return df
+
+# ============================================
+# DADOS PARA GRÁFICOS (tamanho limitado)
+# ============================================
+# O payload do Plotly cresce com o número de pontos/fatias: estas consultas
+# devolvem no máximo N+1 linhas (top N + "Outros") ou MAX_PONTOS_SERIE
+# pontos, seja qual for o tamanho do catálogo ou do histórico.
+
+ROTULO_OUTROS = 'Outros'
+MAX_PONTOS_SERIE = 120
+
+# Agrupamento da série, do mais fino para o mais grosso: (nome, expressão SQL do início do período)
+GRANULARIDADES = [
+    ('dia', "dia"),
+    ('semana', "date(dia, '-6 days', 'weekday 1')"),
+    ('mes', "strftime('%Y-%m-01', dia)"),
+    ('ano', "strftime('%Y-01-01', dia)"),
+]
+
+def _linha_outros(top, total, colunas):
+    """Linha "Outros" = total menos o que já está no top (None se não sobrar nada)."""
+    restante = {c: (total[c] or 0) - top[c].sum() for c in colunas}
+    if all(abs(v) < 1e-9 for v in restante.values()):
+        return None
+    return {'produto_id': None, 'produto': ROTULO_OUTROS, **restante}
+
+@cronometrado
+@em_cache
+def ranking_com_outros(data_inicio, data_fim, limite=10, metrica='quantidade'):
+    """Top `limite` do ranking mais uma linha "Outros" com o restante do período."""
+    top = ranking_produtos(data_inicio, data_fim, limite, metrica)
+    primeiro, ultimo = periodo_vendas()
+    conn = conectar_leitura()
+    if primeiro is not None and (str(data_inicio) <= str(primeiro)
+                                 and str(data_fim) >= str(ultimo)):
+        cursor = conn.execute("""
+            SELECT SUM(unidades) as quantidade, SUM(faturamento) as faturamento,
+                SUM(lucro) as lucro
+            FROM totais_produto
+        """)
+    else:
+        cursor = conn.execute("""
+            SELECT SUM(unidades) as quantidade, SUM(faturamento) as faturamento,
+                SUM(lucro) as lucro
+            FROM vendas_diarias
+            WHERE dia BETWEEN ? AND ?
+        """, (str(data_inicio), str(data_fim)))
+    total = dict(zip([c[0] for c in cursor.description], cursor.fetchone()))
+    conn.close()
+
+    outros = _linha_outros(top, total, ['quantidade', 'faturamento', 'lucro'])
+    if outros is not None:
+        top = pd.concat([top, pd.DataFrame([outros])], ignore_index=True)
+    return top
+
+@cronometrado
+@em_cache
+def composicao_estoque(limite=10):
+    """Os `limite` produtos com mais unidades em estoque e "Outros" com o resto."""
+    conn = conectar_leitura()
+    top = pd.read_sql_query("""
+        SELECT id as produto_id, nome as produto, quantidade
+        FROM produtos
+        WHERE quantidade > 0
+        ORDER BY quantidade DESC, id
+        LIMIT ?
+    """, conn, params=(limite,))
+    total = conn.execute(
+        "SELECT SUM(quantidade) as quantidade FROM produtos WHERE quantidade > 0"
+    ).fetchone()[0]
+    conn.close()
+
+    outros = _linha_outros(top, {'quantidade': total}, ['quantidade'])
+    if outros is not None:
+        top = pd.concat([top, pd.DataFrame([outros])], ignore_index=True)
+    return top
+
+@cronometrado
+@em_cache
+def serie_vendas(data_inicio, data_fim, max_pontos=MAX_PONTOS_SERIE):
+    """
+    Faturamento e acumulado no período, agregados no SQLite por dia, semana,
+    mês ou ano: a granularidade mais fina que caiba em `max_pontos`.
+    Retorna (DataFrame com data_venda/faturamento/faturamento_acumulado, granularidade).
+    Somas por período (e não amostragem de pontos) mantêm o total igual ao dos KPIs.
+    """
+    inicio = pd.Timestamp(str(data_inicio))
+    fim = pd.Timestamp(str(data_fim))
+    dias = max((fim - inicio).days + 1, 1)
+    pontos_estimados = {'dia': dias, 'semana': dias / 7 + 1,
+                        'mes': dias / 28 + 1, 'ano': dias / 365 + 1}
+
+    nome, expressao = GRANULARIDADES[-1]
+    for nome, expressao in GRANULARIDADES:
+        if pontos_estimados[nome] <= max_pontos:
+            break
+
+    conn = conectar_leitura()
+    df = pd.read_sql_query(f"""
+        SELECT {expressao} as data_venda, SUM(faturamento) as faturamento
+        FROM vendas_diarias
+        WHERE dia BETWEEN ? AND ?
+        GROUP BY 1
+        ORDER BY 1
+    """, conn, params=(str(data_inicio), str(data_fim)))
+    conn.close()
+    df['faturamento_acumulado'] = df['faturamento'].cumsum()
+    return df, nome
+
+# ============================================
+# HISTÓRICO DE VENDAS (paginação por chave)
+# ============================================
+
+def _nomes_produtos(conn, ids):
+    ids = sorted({int(i) for i in ids})
+    if not ids:
+        return {}
+    return dict(conn.execute(
+        "SELECT id, nome FROM produtos WHERE id IN (%s)" % ','.join('?' * len(ids)), ids
+    ).fetchall())
+
+@cronometrado
+@em_cache
+def historico_vendas(tamanho_pagina=20, apos=None, produto_id=None,
+                     data_inicio=None, data_fim=None):
+    """
+    Uma página do histórico, da venda mais recente para a mais antiga.
+    `apos` é o cursor (data_venda, venda_id) da última linha da página anterior;
+    a página seguinte começa logo depois dele, usando o índice de data_venda
+    em vez de OFFSET. Retorna (DataFrame, cursor da próxima página ou None).
+
+    As vendas arquivadas em Parquet (arquivo_vendas.py) entram na mesma
+    ordem; só são lidas quando a página não se completa com as do SQLite.
+    """
+    data_ate = None
+    if data_fim is not None:
+        data_ate = str(pd.Timestamp(data_fim).date() + timedelta(days=1))
+
+    condicoes = []
+    params = []
+    if apos is not None:
+        condicoes.append("(v.data_venda, v.id) < (?, ?)")
+        params.extend(apos)
+    if produto_id is not None:
+        condicoes.append("v.produto_id = ?")
+        params.append(int(produto_id))
+    if data_inicio is not None:
+        condicoes.append("v.data_venda >= ?")
+        params.append(str(data_inicio))
+    if data_ate is not None:
+        condicoes.append("v.data_venda < ?")
+        params.append(data_ate)
+    where = ("WHERE " + " AND ".join(condicoes)) if condicoes else ""
+
+    conn = conectar_leitura()
+    # Uma linha a mais só para saber se existe próxima página
+    df = pd.read_sql_query(f"""
+        SELECT v.id as venda_id, p.id as produto_id, v.data_venda, 
+            p.nome as Produto, v.quantidade as Qtd, v.valor_total as Total
+        FROM vendas v
+        JOIN produtos p ON v.produto_id = p.id
+        {where}
+        ORDER BY v.data_venda DESC, v.id DESC
+        LIMIT ?
+    """, conn, params=params + [tamanho_pagina + 1])
+
+    # Página cheia: do arquivo só importam linhas acima da última quente
+    # (normalmente nenhuma, porque o arquivo só tem meses mais antigos)
+    depois_de = None
+    if len(df) > tamanho_pagina:
+        depois_de = (df['data_venda'].iloc[-1], int(df['venda_id'].iloc[-1]))
+    import arquivo_vendas  # pyarrow.parquet só para quem lê o histórico (não o PDV)
+    frias = arquivo_vendas.ler_vendas_arquivadas(
+        ['id', 'produto_id', 'data_venda', 'quantidade', 'valor_total'],
+        apos, produto_id, None if data_inicio is None else str(data_inicio),
+        data_ate, depois_de, tamanho_pagina + 1
+    )
+    if not frias.empty:
+        nomes = _nomes_produtos(conn, frias['produto_id'])
+        frias = pd.DataFrame({
+            'venda_id': frias['id'].astype('int64'),
+            'produto_id': frias['produto_id'].astype('int64'),
+            'data_venda': frias['data_venda'],
+            'Produto': frias['produto_id'].map(nomes),
+            'Qtd': frias['quantidade'],
+            'Total': frias['valor_total'],
+        }).dropna(subset=['Produto'])
+        df = pd.concat([d for d in (df, frias) if not d.empty], ignore_index=True).sort_values(
+            ['data_venda', 'venda_id'], ascending=False, kind='stable'
+        ).iloc[:tamanho_pagina + 1].reset_index(drop=True)
+    conn.close()
+
+    proximo = None
+    if len(df) > tamanho_pagina:
+        df = df.iloc[:tamanho_pagina]
+        ultima = df.iloc[-1]
+        proximo = (ultima['data_venda'], int(ultima['venda_id']))
+    return df, proximo
+
+@cronometrado
+def buscar_venda(venda_id):
+    """
+    Dados atuais de uma venda (sem cache), ou None se não existir mais.
+    Vendas do arquivo frio vêm com 'arquivada': True.
+    """
+    conn = conectar_leitura()
+    linha = conn.execute("""
+        SELECT v.id, v.produto_id, p.nome, v.quantidade, v.valor_total, v.data_venda
+        FROM vendas v
+        JOIN produtos p ON v.produto_id = p.id
+        WHERE v.id = ?
+    """, (int(venda_id),)).fetchone()
+    arquivada = False
+    if linha is None:
+        import arquivo_vendas
+        fria = arquivo_vendas.venda_arquivada(venda_id)
+        nomes = _nomes_produtos(conn, [fria['produto_id']]) if fria else {}
+        if fria and int(fria['produto_id']) in nomes:
+            linha = (int(fria['id']), int(fria['produto_id']), nomes[int(fria['produto_id'])],
+                     int(fria['quantidade']), float(fria['valor_total']), fria['data_venda'])
+            arquivada = True
+    conn.close()
+    if linha is None:
+        return None
+    return dict(zip(
+        ['venda_id', 'produto_id', 'produto', 'quantidade', 'valor_total', 'data_venda',
+         'arquivada'],
+        linha + (arquivada,)
+    ))
@@ -0,0 +1,357 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+import database
+import lojas
+import relatorios
+
+# ============================================
+# CAMADA DE SERVIÇOS
+# ============================================
+# Regras de negócio independentes da interface. O app Streamlit e a API HTTP
+# (api.py) chamam só estas funções; operações que podem falhar seguem o padrão
+# do database.py e retornam (sucesso, mensagem[, dados]).
+# catalogo e backup (e o pyarrow.parquet que eles trazem) são importados só
+# nas funções que os usam: o terminal de caixa não carrega nenhum dos dois.
+
+CONFERIR_BANCOS_A_CADA = 3600  # segundos
+
+_bancos_conferidos = {}  # banco -> time.monotonic() da última conferência
+_lock_inicializacao = threading.Lock()
+
+def _conferencia_vencida(caminho, agora):
+    ultima = _bancos_conferidos.get(caminho)
+    return ultima is None or agora - ultima >= CONFERIR_BANCOS_A_CADA
+
+def inicializar():
+    """
+    Migra cada loja e cria o snapshot de estoque se estiver vencido: uma vez
+    por processo e por banco, e de novo só depois de CONFERIR_BANCOS_A_CADA
+    (o banco pode ter sido trocado por outro processo). Nos reruns do app
+    sobra só a listagem das lojas.
+    """
+    agora = time.monotonic()
+    # Toda loja migrada: os relatórios da rede leem todos os bancos
+    for caminho in lojas.listar_lojas().values():
+        if not _conferencia_vencida(caminho, agora):
+            continue
+        with _lock_inicializacao, database.usando_banco(caminho):
+            if not _conferencia_vencida(caminho, agora):
+                continue  # outra sessão conferiu enquanto esta esperava
+            database.criar_tabelas()
+            database.snapshot_estoque_se_necessario()
+            _bancos_conferidos[caminho] = agora
+
+# ============================================
+# LOJAS (um banco por loja)
+# ============================================
+
+def listar_lojas():
+    return list(lojas.listar_lojas())
+
+def selecionar_loja(nome):
+    """A thread atual (rerun do app) passa a ler e gravar no banco da loja."""
+    database.selecionar_banco(lojas.listar_lojas()[nome])
+
+def usando_loja(nome):
+    """Bloco `with` no banco da loja; ValueError se ela não existir."""
+    caminho = lojas.listar_lojas().get(nome)
+    if caminho is None:
+        raise ValueError(f"Loja não encontrada: {nome}")
+    return database.usando_banco(caminho)
+
+def criar_loja(nome):
+    try:
+        lojas.criar_loja(nome)
+    except (ValueError, OSError) as e:
+        return False, str(e)
+    return True, f"Loja '{nome.strip()}' criada!"
+
+def periodo_rede():
+    return lojas.periodo_rede()
+
+def kpis_rede(inicio, fim):
+    return lojas.kpis_rede(inicio, fim)
+
+def serie_rede(inicio, fim, max_pontos=relatorios.MAX_PONTOS_SERIE):
+    return lojas.serie_rede(inicio, fim, max_pontos)
+
+def ranking_rede(inicio, fim, limite=10, metrica='quantidade'):
+    return lojas.ranking_rede(inicio, fim, limite, metrica)
+
+# ============================================
+# PRODUTOS E ESTOQUE
+# ============================================
+
+def listar_produtos():
+    return relatorios.listar_produtos()
+
+def cadastrar_produto(nome, marca='', quantidade=0, preco_custo=0.0, preco_venda=0.0,
+                      sku=None):
+    nome = (nome or '').strip()
+    if not nome:
+        return False, "Nome do produto é obrigatório!", None
+    if quantidade < 0 or preco_custo < 0 or preco_venda < 0:
+        return False, "Quantidade e preços não podem ser negativos!", None
+
+    sku = (sku or '').strip() or None
+    try:
+        novo_id = database.cadastrar_produto(
+            nome, marca or '', int(quantidade), float(preco_custo), float(preco_venda), sku
+        )
+    except sqlite3.IntegrityError:
+        return False, f"Já existe um produto com o código {sku}!", None
+    return True, f"Produto '{nome}' cadastrado com sucesso!", novo_id
+
+def buscar_produtos(termo, limite=10):
+    return relatorios.buscar_produtos(termo, limite)
+
+def buscar_produto(produto_id):
+    return relatorios.buscar_produto(produto_id)
+
+def registrar_entrada(produto_id, quantidade, preco_custo):
+    if quantidade <= 0:
+        return False, "A quantidade da entrada deve ser positiva!"
+    return database.registrar_entrada_estoque(int(produto_id), int(quantidade), float(preco_custo))
+
+def importar_catalogo(arquivo, formato=None, separador=',', progresso=None):
+    """Importação em lotes (ver catalogo.py). Retorna (sucesso, msg, resultado)."""
+    import catalogo
+    try:
+        resultado = catalogo.importar_produtos(arquivo, formato, separador, progresso)
+    except (ValueError, OSError) as e:
+        return False, f"Não foi possível ler o arquivo: {e}", None
+    msg = (f"{resultado['lidas']} linha(s): {resultado['inseridos']} produto(s) novo(s), "
+           f"{resultado['atualizados']} atualizado(s), {resultado['total_erros']} com erro.")
+    return resultado['total_erros'] == 0, msg, resultado
+
+def exportar_catalogo(destino, formato=None):
+    import catalogo
+    return catalogo.exportar_produtos(destino, formato)
+
+def estoque_em(produto_id, data):
+    return relatorios.estoque_em(produto_id, data)
+
+def inventario_em(data):
+    return relatorios.inventario_em(data)
+
+def metodo_custo():
+    return database.metodo_custo()
+
+def definir_metodo_custo(metodo):
+    if metodo not in database.METODOS_CUSTO:
+        return False, f"Método de custo inválido: {metodo}"
+    database.definir_metodo_custo(metodo)
+    return True, "Método de custo atualizado! Vale para as próximas vendas."
+
+COLUNAS_EDITAVEIS = ['nome', 'marca', 'quantidade', 'preco_custo', 'preco_venda', 'sku']
+COLUNAS_NUMERICAS = ['quantidade', 'preco_custo', 'preco_venda']
+
+def _validar_edicao(editado, alteradas):
+    """
+    Confere o editor antes de gravar: nome, estoque e preços preenchidos nas
+    linhas alteradas, e nenhum SKU repetido na tabela. ValueError com o
+    primeiro problema encontrado.
+    """
+    for pid, linha in editado[alteradas].iterrows():
+        nome = linha['nome'].strip() if isinstance(linha['nome'], str) else ''
+        if not nome:
+            raise ValueError(f"Produto #{pid}: o nome é obrigatório!")
+        rotulo = f"'{nome}'"
+        numeros = pd.to_numeric(linha[COLUNAS_NUMERICAS], errors='coerce')
+        if numeros.isna().any():
+            raise ValueError(f"Produto {rotulo}: preencha estoque, custo e preço de venda!")
+        if (numeros < 0).any():
+            raise ValueError(f"Produto {rotulo}: quantidade e preços não podem ser negativos!")
+        if numeros['quantidade'] % 1:
+            raise ValueError(f"Produto {rotulo}: o estoque deve ser um número inteiro!")
+
+    skus = editado['sku'].dropna().astype(str).str.strip()
+    skus = skus[skus != '']
+    repetidos = skus[skus.duplicated(keep=False)]
+    if not repetidos.empty:
+        sku = repetidos.iloc[0]
+        nomes = editado.loc[repetidos.index[repetidos == sku], 'nome']
+        raise ValueError(
+            f"O código {sku} está em mais de um produto: {', '.join(map(str, nomes))}."
+        )
+
+def calcular_alteracoes_estoque(df_original, df_editado):
+    """
+    Compara o editor com o catálogo carregado (de uma vez, alinhando por id)
+    e devolve só o que mudou: (linhas alteradas, entradas de estoque, resumo).
+    ValueError se uma linha alterada estiver incompleta ou houver SKU repetido.
+    """
+    original = df_original.set_index('id')[COLUNAS_EDITAVEIS]
+    editado = df_editado.set_index('id')[COLUNAS_EDITAVEIS]
+    original = original.loc[editado.index]
+    # SKU vazio é o mesmo que não ter SKU
+    original['sku'] = original['sku'].mask(original['sku'] == '')
+    editado['sku'] = editado['sku'].mask(editado['sku'] == '')
+
+    # NaN == NaN é falso, então células vazias dos dois lados contam como iguais
+    diferente = editado.ne(original) & ~(editado.isna() & original.isna())
+    linhas = diferente.any(axis=1)
+    if not linhas.any():
+        return [], [], []
+    _validar_edicao(editado, linhas)
+
+    editado = editado[linhas]
+    original = original[linhas]
+    diferente = diferente[linhas]
+
+    # Estoque e custo só vão para o banco se mudaram na tabela: o estoque como
+    # diferença (a tabela pode estar velha), o custo como valor (None = manter)
+    diferenca = (editado['quantidade'] - original['quantidade']).where(
+        diferente['quantidade'], 0
+    )
+    custo_editado = editado['preco_custo'].where(diferente['preco_custo'])
+    alteracoes = [
+        (r.nome.strip(), r.marca if pd.notna(r.marca) else '', int(qtd),
+         float(custo) if pd.notna(custo) else None, float(r.preco_venda),
+         str(r.sku).strip() if pd.notna(r.sku) else None, int(pid))
+        for pid, r, qtd, custo in zip(
+            editado.index, editado.itertuples(index=False), diferenca, custo_editado
+        )
+    ]
+
+    # Aumento de quantidade vira COMPRA ao custo editado (as camadas são
+    # reavaliadas para ele) ou, sem edição de custo, ao custo atual do produto
+    compras = diferenca > 0
+    entradas = [
+        (int(pid), int(qtd), float(custo) if pd.notna(custo) else None)
+        for pid, qtd, custo in zip(
+            diferenca.index[compras], diferenca[compras], custo_editado[compras]
+        )
+    ]
+
+    resumo = [
+        {'id': int(pid), 'produto': nome,
+         'campos': [c for c, mudou in zip(COLUNAS_EDITAVEIS, flags) if mudou]}
+        for pid, nome, flags in zip(
+            editado.index, editado['nome'], diferente.itertuples(index=False)
+        )
+    ]
+    return alteracoes, entradas, resumo
+
+def salvar_estoque_editado(df_original, df_editado):
+    """
+    Grava as diferenças do editor de estoque.
+    Retorna (sucesso, mensagem, entradas, resumo).
+    """
+    try:
+        alteracoes, entradas, resumo = calcular_alteracoes_estoque(df_original, df_editado)
+    except ValueError as e:
+        return False, str(e), [], []
+    try:
+        sucesso, msg = database.salvar_alteracoes_estoque(alteracoes, entradas)
+    except sqlite3.IntegrityError as e:
+        # Um SKU gravado por outra sessão depois que a tabela foi carregada
+        if 'sku' in str(e):
+            return False, "Há códigos de barras (SKU) repetidos entre os produtos.", [], []
+        return False, f"Alteração recusada pelo banco: {e}", [], []
+    if not sucesso:
+        return False, msg, [], []
+    return True, msg, entradas, resumo
+
+# ============================================
+# VENDAS
+# ============================================
+
+def precificar_itens(itens):
+    """
+    Completa o valor_total de itens (produto_id, quantidade[, valor_total])
+    com o preço de venda do catálogo quando ele não vier informado.
+    """
+    sem_valor = [item[0] for item in itens if len(item) < 3 or item[2] is None]
+    # Só os produtos sem valor, e não o catálogo inteiro
+    precos = relatorios.precos_venda(sem_valor) if sem_valor else {}
+    completos = []
+    for item in itens:
+        produto_id, quantidade = int(item[0]), int(item[1])
+        valor = item[2] if len(item) > 2 else None
+        if valor is None:
+            if produto_id not in precos:
+                valor = 0.0  # fechar_venda acusa o produto inexistente
+            else:
+                valor = precos[produto_id] * quantidade
+        completos.append((produto_id, quantidade, float(valor)))
+    return completos
+
+def fechar_venda(itens):
+    itens = precificar_itens(itens)
+    if any(qtd <= 0 for _, qtd, _ in itens):
+        return False, "Todas as quantidades devem ser positivas!", []
+    return database.fechar_venda(itens)
+
+def estornar_venda(venda_id):
+    venda = relatorios.buscar_venda(venda_id)
+    if venda is None:
+        return False, "Venda não encontrada (já estornada?)."
+    if venda['arquivada']:
+        return False, "Venda arquivada: o estorno só vale para vendas ainda no banco."
+    return database.estornar_venda_db(
+        venda['venda_id'], venda['produto_id'], venda['quantidade']
+    )
+
+def buscar_venda(venda_id):
+    return relatorios.buscar_venda(venda_id)
+
+def historico_vendas(tamanho_pagina=20, apos=None, produto_id=None,
+                     data_inicio=None, data_fim=None):
+    return relatorios.historico_vendas(
+        tamanho_pagina, apos, produto_id, data_inicio, data_fim
+    )
+
+# ============================================
+# RELATÓRIOS
+# ============================================
+
+def periodo_vendas():
+    return relatorios.periodo_vendas()
+
+def kpis_periodo(data_inicio, data_fim):
+    return relatorios.kpis_periodo(data_inicio, data_fim)
+
+def serie_diaria(data_inicio, data_fim):
+    return relatorios.serie_diaria(data_inicio, data_fim)
+
+def ranking_produtos(data_inicio, data_fim, limite=None, metrica='quantidade'):
+    return relatorios.ranking_produtos(data_inicio, data_fim, limite, metrica)
+
+def top_produtos(limite=10, metrica='quantidade'):
+    return relatorios.top_produtos(limite, metrica)
+
+# Versões de tamanho limitado, para gráficos
+
+def serie_vendas(data_inicio, data_fim, max_pontos=relatorios.MAX_PONTOS_SERIE):
+    return relatorios.serie_vendas(data_inicio, data_fim, max_pontos)
+
+def ranking_com_outros(data_inicio, data_fim, limite=10, metrica='quantidade'):
+    return relatorios.ranking_com_outros(data_inicio, data_fim, limite, metrica)
+
+def composicao_estoque(limite=10):
+    return relatorios.composicao_estoque(limite)
+
+# ============================================
+# BACKUP
+# ============================================
+
+def fazer_backup():
+    """Backup online do banco da loja (ver backup.py). Retorna (sucesso, msg, relatório)."""
+    import backup
+    try:
+        relatorio = backup.fazer_backup()
+    except (ValueError, OSError, sqlite3.Error) as e:
+        return False, f"Backup não concluído: {e}", None
+    msg = (f"Backup salvo em {os.path.basename(relatorio['arquivo'])} "
+           f"({relatorio['bytes'] / 1e6:.1f} MB em {relatorio['segundos']:.2f} s).")
+    return True, msg, relatorio
+
+def listar_backups():
+    import backup
+    return pd.DataFrame(backup.listar_backups(), columns=['arquivo', 'bytes', 'criado_em'])
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    """Banco novo e migrado em tmp_path, com escritor e conexões próprios."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, 'CAMINHO_DB', str(tmp_path / 'gestao.db'))
+    database.criar_tabelas()
+    yield database.CAMINHO_DB
+    database.fechar_conexoes()
@@ -0,0 +1,65 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import api
+import database
+
+
+@pytest.fixture
+def servidor(banco):
+    servidor = api.ServidorAPI(('127.0.0.1', 0), workers=2)
+    thread = threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield servidor.server_address[1]
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _pedir(porta, metodo, caminho, corpo=None):
+    conn = http.client.HTTPConnection('127.0.0.1', porta, timeout=10)
+    dados = corpo if isinstance(corpo, bytes) else (
+        None if corpo is None else json.dumps(corpo).encode()
+    )
+    conn.request(metodo, caminho, body=dados)
+    resposta = conn.getresponse()
+    resultado = resposta.status, json.loads(resposta.read())
+    conn.close()
+    return resultado
+
+
+@pytest.mark.parametrize('metodo, caminho, corpo', [
+    ('POST', '/produtos', {'nome': 123}),
+    ('POST', '/produtos', {'nome': 'Cola', 'sku': ['789']}),
+    ('POST', '/produtos', {'nome': 'Cola', 'quantidade': 'muitas'}),
+    ('POST', '/produtos', b'{"nome": "\xff"}'),
+    ('POST', '/vendas', {'itens': [{'produto_id': 'um', 'quantidade': 1}]}),
+    ('GET', '/vendas?fim=xx', None),
+    ('GET', '/vendas?inicio=2024-13-01', None),
+    ('GET', '/vendas?apos_data=ontem&apos_id=1', None),
+    ('GET', '/vendas?tamanho=-1', None),
+    ('GET', '/relatorios/kpis?inicio=xx', None),
+    ('GET', '/estoque/posicao?data=amanha', None),
+])
+def test_entrada_invalida_responde_400(servidor, metodo, caminho, corpo):
+    status, dados = _pedir(servidor, metodo, caminho, corpo)
+    assert status == 400, dados
+    assert 'erro' in dados
+
+
+def test_venda_sem_valor_usa_preco_do_catalogo(servidor):
+    status, dados = _pedir(servidor, 'POST', '/produtos',
+                           {'nome': 'Cola', 'quantidade': 5, 'preco_custo': 2, 'preco_venda': 4.5})
+    assert status == 201
+    produto_id = dados['id']
+    database.cadastrar_produto('Outro', '', 5, 1.0, 99.0)
+
+    status, dados = _pedir(servidor, 'POST', '/vendas',
+                           {'itens': [{'produto_id': produto_id, 'quantidade': 2}]})
+    assert status == 201 and dados['sucesso']
+
+    status, dados = _pedir(servidor, 'GET', f'/vendas?produto_id={produto_id}&fim=2200-01-01')
+    assert status == 200
+    assert [(v['Qtd'], v['Total']) for v in dados['vendas']] == [(2, 9.0)]
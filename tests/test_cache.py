@@ -0,0 +1,36 @@
+import sqlite3
+
+import database
+import relatorios
+from cache import cache_consultas
+
+
+def test_escrita_do_app_invalida_o_cache(banco):
+    database.cadastrar_produto('Caneta', '', 5, 1.0, 2.0)
+    assert len(relatorios.listar_produtos()) == 1
+    acertos = cache_consultas.acertos
+    assert len(relatorios.listar_produtos()) == 1
+    assert cache_consultas.acertos == acertos + 1
+
+    database.cadastrar_produto('Lápis', '', 5, 1.0, 2.0)
+    assert len(relatorios.listar_produtos()) == 2
+
+
+def test_escrita_de_outro_processo_invalida_o_cache(banco):
+    assert relatorios.listar_produtos().empty
+    # Outra conexão, fora do escritor e do contador deste processo
+    externa = sqlite3.connect(banco)
+    externa.execute(
+        "INSERT INTO produtos (nome, marca, quantidade, preco_custo, preco_venda) "
+        "VALUES ('Externo', '', 1, 1.0, 2.0)"
+    )
+    externa.commit()
+    externa.close()
+    assert list(relatorios.listar_produtos()['nome']) == ['Externo']
+
+
+def test_resultado_em_cache_nao_e_alterado_por_quem_recebe(banco):
+    database.cadastrar_produto('Caneta', '', 5, 1.0, 2.0)
+    df = relatorios.listar_produtos()
+    df.loc[0, 'nome'] = 'Estragado'
+    assert relatorios.listar_produtos().loc[0, 'nome'] == 'Caneta'
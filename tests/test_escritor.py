@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import database
+
+
+def _inserir(cursor, nome):
+    cursor.execute(
+        "INSERT INTO produtos (nome, marca, quantidade, preco_custo, preco_venda) "
+        "VALUES (?, '', 0, 1.0, 2.0)", (nome,)
+    )
+    return cursor.lastrowid
+
+
+def _nomes():
+    conn = database.conectar_leitura()
+    nomes = [linha[0] for linha in conn.execute("SELECT nome FROM produtos ORDER BY id")]
+    conn.close()
+    return nomes
+
+
+def test_escritas_concorrentes_gravam_todas(banco):
+    ids = []
+    threads = [
+        threading.Thread(target=lambda i=i: ids.append(database.cadastrar_produto(
+            f'Produto {i}', '', 1, 1.0, 2.0)))
+        for i in range(40)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 40
+    conn = database.conectar_leitura()
+    assert conn.execute("SELECT COUNT(*), SUM(quantidade) FROM produtos").fetchone() == (40, 40)
+    assert conn.execute("SELECT SUM(quantidade) FROM movimentacoes").fetchone()[0] == 40
+    conn.close()
+
+
+def test_erro_e_desfazer_nao_levam_os_outros_comandos(banco):
+    def falha(cursor):
+        _inserir(cursor, 'Falhou')
+        raise ValueError("comando com defeito")
+
+    def desfaz(cursor):
+        _inserir(cursor, 'Desfeito')
+        raise database.Desfazer('resultado do desfeito')
+
+    # Os três no mesmo lote: o escritor está preso num exclusivo enquanto chegam
+    liberar = threading.Event()
+    bloqueio = threading.Thread(target=database.escrever_exclusivo,
+                                args=(lambda conn: liberar.wait(5),))
+    bloqueio.start()
+    time.sleep(0.05)
+    respostas = {}
+
+    def enviar(nome, comando, *args):
+        try:
+            respostas[nome] = database.escrever(comando, *args)
+        except Exception as e:
+            respostas[nome] = e
+
+    threads = [threading.Thread(target=enviar, args=a) for a in (
+        ('falha', falha), ('desfaz', desfaz), ('ok', _inserir, 'Gravado'),
+    )]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    liberar.set()
+    for thread in threads + [bloqueio]:
+        thread.join()
+
+    assert isinstance(respostas['falha'], ValueError)
+    assert respostas['desfaz'] == 'resultado do desfeito'
+    assert isinstance(respostas['ok'], int)
+    assert _nomes() == ['Gravado']
+
+
+def test_escritor_que_cai_e_recriado(banco, monkeypatch):
+    database.parar_escritores()
+    abrir = database._abrir
+
+    def banco_que_nao_abre(caminho, somente_leitura):
+        raise sqlite3.OperationalError("disco sumiu")
+
+    monkeypatch.setattr(database, '_abrir', banco_que_nao_abre)
+    with pytest.raises(sqlite3.OperationalError, match="disco sumiu"):
+        database.escrever(_inserir, 'Perdido')
+
+    monkeypatch.setattr(database, '_abrir', abrir)
+    database.escrever(_inserir, 'Depois')
+    assert _nomes() == ['Depois']
+
+
+def test_comando_que_esperou_demais_nao_roda(banco, monkeypatch):
+    monkeypatch.setattr(database, 'ESPERA_MAXIMA_ESCRITA', 0.1)
+    liberar = threading.Event()
+    bloqueio = threading.Thread(target=database.escrever_exclusivo,
+                                args=(lambda conn: liberar.wait(5),))
+    bloqueio.start()
+    time.sleep(0.05)
+
+    with pytest.raises(sqlite3.OperationalError, match="nada foi gravado"):
+        database.escrever(_inserir, 'Atrasado')
+    liberar.set()
+    bloqueio.join()
+
+    database.escrever(_inserir, 'Em dia')
+    assert _nomes() == ['Em dia']
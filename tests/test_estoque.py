@@ -0,0 +1,160 @@
+import database
+import servicos
+
+
+def _camadas(conn, produto_id):
+    return [tuple(linha) for linha in conn.execute(
+        "SELECT quantidade, custo_unitario FROM camadas_custo "
+        "WHERE produto_id = ? AND quantidade > 0 ORDER BY id", (produto_id,)
+    )]
+
+
+def test_editor_quantidade_e_custo_juntos(banco):
+    produto_id = database.cadastrar_produto('Caneta', 'X', 10, 1.75, 3.0)
+    original = servicos.listar_produtos()
+    editado = original.copy()
+    editado.loc[editado['id'] == produto_id, ['quantidade', 'preco_custo']] = [15, 4.0]
+
+    sucesso, _, entradas, _ = servicos.salvar_estoque_editado(original, editado)
+
+    assert sucesso
+    assert entradas == [(produto_id, 5, 4.0)]
+    conn = database.conectar_leitura()
+    assert conn.execute(
+        "SELECT quantidade, preco_custo FROM produtos WHERE id = ?", (produto_id,)
+    ).fetchone() == (15, 4.0)
+    # Todas as camadas ao custo editado, somando o estoque
+    camadas = _camadas(conn, produto_id)
+    assert {custo for _, custo in camadas} == {4.0}
+    assert sum(qtd for qtd, _ in camadas) == 15
+    # O razão continua batendo com o estoque
+    assert conn.execute(
+        "SELECT SUM(quantidade) FROM movimentacoes WHERE produto_id = ?", (produto_id,)
+    ).fetchone()[0] == 15
+    conn.close()
+
+    sucesso, _, _ = database.fechar_venda([(produto_id, 12, 36.0)])
+    assert sucesso
+    conn = database.conectar_leitura()
+    assert conn.execute("SELECT custo_total FROM vendas").fetchone()[0] == 48.0
+    conn.close()
+
+
+def test_editor_reduz_quantidade_e_muda_custo(banco):
+    produto_id = database.cadastrar_produto('Lápis', '', 10, 2.0, 3.0)
+    original = servicos.listar_produtos()
+    editado = original.copy()
+    editado.loc[editado['id'] == produto_id, ['quantidade', 'preco_custo']] = [4, 2.5]
+
+    sucesso, _, entradas, _ = servicos.salvar_estoque_editado(original, editado)
+
+    assert sucesso and entradas == []
+    conn = database.conectar_leitura()
+    assert _camadas(conn, produto_id) == [(4, 2.5)]
+    conn.close()
+
+
+def _editar(produto_id, **valores):
+    original = servicos.listar_produtos()
+    editado = original.copy().astype(object)
+    for coluna, valor in valores.items():
+        editado.loc[editado['id'] == produto_id, coluna] = valor
+    return servicos.salvar_estoque_editado(original, editado)
+
+
+def test_editor_recusa_linhas_incompletas(banco):
+    produto_id = database.cadastrar_produto('Caderno', '', 5, 8.0, 12.0, '789')
+    database.cadastrar_produto('Borracha', '', 5, 1.0, 2.0, '790')
+
+    sucesso, msg, _, _ = _editar(produto_id, nome='  ')
+    assert not sucesso and 'nome' in msg
+    sucesso, msg, _, _ = _editar(produto_id, quantidade=None)
+    assert not sucesso and 'preencha' in msg
+    sucesso, msg, _, _ = _editar(produto_id, preco_venda=-1.0)
+    assert not sucesso and 'negativos' in msg
+    sucesso, msg, _, _ = _editar(produto_id, sku='790')
+    assert not sucesso and '790' in msg and 'Borracha' in msg
+
+    conn = database.conectar_leitura()
+    assert conn.execute(
+        "SELECT nome, quantidade, preco_venda, sku FROM produtos WHERE id = ?", (produto_id,)
+    ).fetchone() == ('Caderno', 5, 12.0, '789')
+    conn.close()
+
+
+def test_editor_aberto_nao_desfaz_vendas_do_pdv(banco):
+    produto_id = database.cadastrar_produto('Régua', '', 10, 2.0, 5.0)
+    original = servicos.listar_produtos()
+    # O PDV vende com a tabela já aberta
+    sucesso, _, _ = database.fechar_venda([(produto_id, 3, 15.0)])
+    assert sucesso
+
+    editado = original.copy()
+    editado.loc[editado['id'] == produto_id, 'preco_venda'] = 6.0
+    sucesso, _, entradas, _ = servicos.salvar_estoque_editado(original, editado)
+
+    assert sucesso and entradas == []
+    conn = database.conectar_leitura()
+    assert conn.execute(
+        "SELECT quantidade, preco_custo, preco_venda FROM produtos WHERE id = ?", (produto_id,)
+    ).fetchone() == (7, 2.0, 6.0)
+    assert conn.execute(
+        "SELECT COUNT(*) FROM movimentacoes WHERE tipo = 'AJUSTE'"
+    ).fetchone()[0] == 0
+    assert conn.execute(
+        "SELECT SUM(quantidade) FROM movimentacoes WHERE produto_id = ?", (produto_id,)
+    ).fetchone()[0] == 7
+    assert sum(qtd for qtd, _ in _camadas(conn, produto_id)) == 7
+    conn.close()
+
+    # Baixa maior que o que sobrou: recusa em vez de deixar o estoque negativo
+    editado.loc[editado['id'] == produto_id, 'quantidade'] = 2
+    sucesso, msg, _, _ = servicos.salvar_estoque_editado(original, editado)
+    assert not sucesso and 'Recarregue' in msg
+    conn = database.conectar_leitura()
+    assert conn.execute(
+        "SELECT quantidade FROM produtos WHERE id = ?", (produto_id,)
+    ).fetchone()[0] == 7
+    conn.close()
+
+
+def _valor_das_camadas(conn, produto_id):
+    return conn.execute(
+        "SELECT SUM(quantidade * custo_unitario) FROM camadas_custo WHERE produto_id = ?",
+        (produto_id,)
+    ).fetchone()[0]
+
+
+def test_posicao_valorizada_pelas_camadas(banco):
+    import relatorios
+    produto_id = database.cadastrar_produto('Tinta', '', 10, 2.0, 9.0)
+    database.registrar_entrada_estoque(produto_id, 10, 4.0)
+    database.definir_metodo_custo('FIFO')
+    assert database.fechar_venda([(produto_id, 5, 45.0)])[0]
+    dia = '2200-01-01'
+
+    conn = database.conectar_leitura()
+    # 5 a 2,00 e 10 a 4,00 (e não 15 ao custo da última venda, 2,00)
+    assert _valor_das_camadas(conn, produto_id) == 50.0
+    posicao = relatorios.inventario_em(dia).set_index('produto_id').loc[produto_id]
+    assert posicao['quantidade'] == 15
+    assert round(posicao['valor'], 6) == 50.0
+    estoque = relatorios.estoque_em(produto_id, dia)
+    assert round(estoque['quantidade'] * estoque['custo_unitario'], 6) == 50.0
+    conn.close()
+
+    # O snapshot guarda o mesmo custo, e a edição de custo (sem mexer na
+    # quantidade) entra na posição a partir dela
+    assert database.registrar_snapshot_estoque() is not None
+    assert round(relatorios.inventario_em(dia)['valor'].sum(), 6) == 50.0
+    original = servicos.listar_produtos()
+    editado = original.copy()
+    editado.loc[editado['id'] == produto_id, 'preco_custo'] = 3.5
+    assert servicos.salvar_estoque_editado(original, editado)[0]
+    conn = database.conectar_leitura()
+    assert _valor_das_camadas(conn, produto_id) == 52.5
+    assert round(relatorios.inventario_em(dia)['valor'].sum(), 6) == 52.5
+    assert conn.execute(
+        "SELECT SUM(quantidade) FROM movimentacoes WHERE produto_id = ?", (produto_id,)
+    ).fetchone()[0] == 15
+    conn.close()
@@ -0,0 +1,31 @@
+import pytest
+
+import database
+import instrumentacao
+
+
+@pytest.fixture
+def instrumentado(banco):
+    instrumentacao.ativar(True)
+    yield
+    instrumentacao.ativar(False)
+
+
+def test_sql_do_escritor_entra_na_execucao_de_quem_pediu(instrumentado):
+    execucao = instrumentacao.iniciar_execucao('rerun de teste')
+
+    database.cadastrar_produto('Caneta', '', 10, 1.0, 2.0)
+
+    sql = [e['nome'] for e in execucao['eventos'] if e['tipo'] == 'sql']
+    assert any(s.startswith('INSERT INTO movimentacoes') for s in sql)
+    assert 'BEGIN IMMEDIATE' in sql and 'COMMIT' in sql
+    # O SQL fica dentro do helper que esperou pelo escritor
+    helper = next(e for e in execucao['eventos']
+                  if e['nome'] == 'database.cadastrar_produto')
+    insert = next(e for e in execucao['eventos']
+                  if e['tipo'] == 'sql' and e['nome'].startswith('INSERT INTO movimentacoes'))
+    assert insert['nivel'] == helper['nivel'] + 1
+    # Na execução própria do escritor sobram só os PRAGMAs de abrir a conexão
+    do_escritor = [e['nome'] for x in instrumentacao.execucoes()
+                   if x['rotulo'].startswith('thread escritor') for e in x['eventos']]
+    assert all(nome.startswith('PRAGMA') for nome in do_escritor)
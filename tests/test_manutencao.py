@@ -0,0 +1,93 @@
+import threading
+import time
+
+import arquivo_vendas
+import backup
+import database
+
+
+def _resumo(conn):
+    return conn.execute(
+        "SELECT dia, produto_id, faturamento, custo, unidades, num_vendas "
+        "FROM vendas_diarias ORDER BY dia, produto_id"
+    ).fetchall()
+
+
+def _vender_em(produto_id, datas):
+    for data in datas:
+        assert database.fechar_venda([(produto_id, 1, 5.0)])[0]
+    # Espalha as vendas por meses diferentes, como num histórico real
+    def redatar(cursor):
+        cursor.execute("SELECT id FROM vendas ORDER BY id DESC LIMIT ?", (len(datas),))
+        ids = [linha[0] for linha in cursor.fetchall()]
+        cursor.executemany("UPDATE vendas SET data_venda = ? WHERE id = ?",
+                           zip(datas, reversed(ids)))
+    database.escrever(redatar)
+
+
+def test_reconstrucao_e_arquivo_mantem_o_resumo(banco):
+    produto_id = database.cadastrar_produto('Caneta', '', 100, 2.0, 5.0)
+    _vender_em(produto_id, ['2023-11-05 10:00:00', '2023-12-31 23:59:59',
+                            '2024-01-01 00:00:00', '2024-01-15 12:00:00'])
+    assert database.reconstruir_vendas_diarias() == 4
+
+    conn = database.conectar_leitura()
+    esperado = _resumo(conn)
+    conn.close()
+    assert [linha[0] for linha in esperado] == ['2023-11-05', '2023-12-31',
+                                                '2024-01-01', '2024-01-15']
+
+    assert arquivo_vendas.arquivar_vendas('2024-01-01') == {'2023-11': 1, '2023-12': 1}
+    # Lixo no resumo: a reconstrução refaz tudo, com os meses arquivados
+    database.escrever(lambda cursor: cursor.execute(
+        "INSERT INTO vendas_diarias (dia, produto_id, faturamento, custo, lucro, unidades, "
+        "num_vendas) VALUES ('2022-01-01', ?, 1, 1, 0, 1, 1)", (produto_id,)
+    ))
+    database.reconstruir_vendas_diarias()
+
+    conn = database.conectar_leitura()
+    assert _resumo(conn) == esperado
+    assert conn.execute("SELECT COUNT(*) FROM vendas").fetchone()[0] == 2
+    assert conn.execute(
+        "SELECT unidades, num_vendas FROM totais_produto WHERE produto_id = ?", (produto_id,)
+    ).fetchone() == (4, 4)
+    conn.close()
+
+
+def test_escrita_espera_a_manutencao_exclusiva(banco):
+    produto_id = database.cadastrar_produto('Caneta', '', 10, 2.0, 5.0)
+    ordem = []
+
+    def manutencao(conn):
+        conn.execute("BEGIN IMMEDIATE")
+        time.sleep(0.3)
+        conn.commit()
+        ordem.append('manutencao')
+
+    thread = threading.Thread(target=database.escrever_exclusivo, args=(manutencao,))
+    thread.start()
+    time.sleep(0.05)
+    sucesso, _, _ = database.fechar_venda([(produto_id, 1, 5.0)])
+    ordem.append('venda')
+    thread.join()
+
+    assert sucesso
+    assert ordem == ['manutencao', 'venda']
+
+
+def test_restaurar_com_o_escritor_no_ar(banco):
+    produto_id = database.cadastrar_produto('Caneta', '', 10, 2.0, 5.0)
+    copia = backup.fazer_backup(pausa=0)['arquivo']
+    assert database.fechar_venda([(produto_id, 3, 15.0)])[0]
+
+    anterior = backup.restaurar(copia)
+
+    conn = database.conectar_leitura()
+    assert conn.execute("SELECT COUNT(*) FROM vendas").fetchone()[0] == 0
+    assert conn.execute(
+        "SELECT quantidade FROM produtos WHERE id = ?", (produto_id,)
+    ).fetchone()[0] == 10
+    conn.close()
+    assert backup.verificar_integridade(anterior) == []
+    # O escritor segue gravando no banco restaurado
+    assert database.fechar_venda([(produto_id, 1, 5.0)])[0]
@@ -0,0 +1,81 @@
+import sqlite3
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def banco_antigo(tmp_path, monkeypatch):
+    """Banco no formato da primeira versão do app (sem user_version), com dados."""
+    monkeypatch.chdir(tmp_path)
+    caminho = str(tmp_path / 'antigo.db')
+    monkeypatch.setattr(database, 'CAMINHO_DB', caminho)
+    conn = sqlite3.connect(caminho)
+    conn.executescript('''
+        CREATE TABLE produtos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            quantidade INTEGER NOT NULL,
+            preco_custo REAL NOT NULL,
+            preco_venda REAL NOT NULL
+        );
+        CREATE TABLE vendas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            valor_total REAL NOT NULL,
+            data_venda DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE movimentacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER,
+            tipo TEXT,
+            quantidade INTEGER,
+            preco_custo_na_epoca REAL,
+            data_movimento DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO produtos (nome, quantidade, preco_custo, preco_venda) VALUES
+            ('Caneta', 7, 1.5, 3.0), ('Caderno', 0, 8.0, 15.0);
+        INSERT INTO vendas (produto_id, quantidade, valor_total, data_venda) VALUES
+            (1, 2, 6.0, '2024-03-01 10:00:00'), (2, 1, 15.0, '2024-03-02 11:00:00');
+        INSERT INTO movimentacoes (produto_id, tipo, quantidade, preco_custo_na_epoca,
+                                   data_movimento)
+            VALUES (1, 'COMPRA', 9, 1.5, '2024-02-01 09:00:00');
+    ''')
+    conn.close()
+    yield caminho
+    database.fechar_conexoes()
+
+
+def test_banco_antigo_migra_ate_a_versao_atual(banco_antigo):
+    database.criar_tabelas()
+
+    conn = database.conectar_leitura()
+    assert database.versao_schema(conn) == len(database.MIGRACOES)
+    # Razão e camadas batem com o estoque de cada produto
+    assert conn.execute('''
+        SELECT COUNT(*) FROM produtos p
+        WHERE quantidade <> (SELECT COALESCE(SUM(quantidade), 0)
+                             FROM movimentacoes WHERE produto_id = p.id)
+           OR quantidade <> (SELECT COALESCE(SUM(quantidade), 0)
+                             FROM camadas_custo WHERE produto_id = p.id)
+    ''').fetchone()[0] == 0
+    assert conn.execute(
+        "SELECT COUNT(*) FROM movimentacoes WHERE custo_estoque IS NULL"
+    ).fetchone()[0] == 0
+    # Resumo diário e totais refeitos a partir das vendas antigas
+    assert conn.execute(
+        "SELECT SUM(faturamento), SUM(unidades) FROM vendas_diarias"
+    ).fetchone() == (21.0, 3)
+    assert conn.execute(
+        "SELECT custo_total FROM vendas WHERE produto_id = 1"
+    ).fetchone()[0] == 3.0
+    indices = {linha[1] for linha in conn.execute("PRAGMA index_list(vendas)")}
+    assert 'idx_vendas_produto_data' in indices
+    conn.close()
+
+
+def test_migracoes_nao_rodam_de_novo(banco):
+    assert database.versao_schema() == len(database.MIGRACOES)
+    assert database.aplicar_migracoes() == 0
@@ -0,0 +1,34 @@
+import database
+import relatorios
+
+
+def test_historico_paginado_com_filtro_de_produto(banco):
+    caneta = database.cadastrar_produto('Caneta', '', 100, 1.0, 2.0)
+    lapis = database.cadastrar_produto('Lápis', '', 100, 1.0, 2.0)
+    # Vários pedidos no mesmo segundo: o cursor desempata pelo id
+    for i in range(7):
+        assert database.fechar_venda([(caneta, 1, 2.0 * (i + 1)), (lapis, 1, 1.0)])[0]
+
+    vistas, apos = [], None
+    while True:
+        pagina, apos = relatorios.historico_vendas(3, apos, produto_id=caneta)
+        assert len(pagina) <= 3
+        vistas.extend(pagina['venda_id'])
+        if apos is None:
+            break
+
+    conn = database.conectar_leitura()
+    esperadas = [linha[0] for linha in conn.execute(
+        "SELECT id FROM vendas WHERE produto_id = ? ORDER BY data_venda DESC, id DESC",
+        (caneta,)
+    )]
+    indices = {linha[1] for linha in conn.execute("PRAGMA index_list(vendas)")}
+    plano = ' '.join(linha[3] for linha in conn.execute('''
+        EXPLAIN QUERY PLAN
+        SELECT id FROM vendas WHERE produto_id = ? AND (data_venda, id) < (?, ?)
+        ORDER BY data_venda DESC, id DESC LIMIT 4
+    ''', (caneta, '9999', 10**9)))
+    conn.close()
+    assert vistas == esperadas and len(vistas) == 7
+    assert 'idx_vendas_produto_data' in indices and 'idx_vendas_produto' not in indices
+    assert 'TEMP B-TREE' not in plano
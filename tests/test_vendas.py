@@ -0,0 +1,21 @@
+import database
+
+
+def test_pedido_cancelado_nao_marca_linhas_como_vendidas(banco):
+    caneta = database.cadastrar_produto('Caneta', '', 10, 1.0, 2.0)
+    lapis = database.cadastrar_produto('Lápis', '', 1, 1.0, 2.0)
+
+    sucesso, msg, resultados = database.fechar_venda([(caneta, 2, 4.0), (lapis, 5, 10.0)])
+
+    assert not sucesso and 'sem estoque' in msg
+    assert [r['sucesso'] for r in resultados] == [False, False]
+    assert [r['venda_id'] for r in resultados] == [None, None]
+    assert 'cancelado' in resultados[0]['mensagem']
+    assert 'Estoque insuficiente' in resultados[1]['mensagem']
+    conn = database.conectar_leitura()
+    assert conn.execute("SELECT COUNT(*) FROM vendas").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM pedidos").fetchone()[0] == 0
+    assert conn.execute(
+        "SELECT quantidade FROM produtos WHERE id = ?", (caneta,)
+    ).fetchone()[0] == 10
+    conn.close()